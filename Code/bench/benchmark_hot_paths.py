@@ -0,0 +1,349 @@
+# benchmark_hot_paths.py: the per-call cost of the scoring and constraint hot paths (TimeSlot.overlaps, the constraint
+#                         functions, TimetablingCSP.nconflicts, forward_checking, the fitness functions and the GA's
+#                         recombine and mutate), on fixed-seed fixtures built from comp01, comp07 and toy_prob.
+#
+#                         Every benchmark has a reference implementation (the straightforward form of the function,
+#                         e.g. the constraint functions called one by one, or the dict-based GA operators of the
+#                         original code) and the faster ones the solvers use; before anything is timed the results of
+#                         every implementation are checked against the reference on all the cases (an AssertionError
+#                         names the one that disagrees). So a new implementation is added as one more entry, and it
+#                         is checked as well as timed. test_hot_paths.py runs the same checks as pytest tests (and the
+#                         timings with pytest-benchmark).
+#
+#                         The time of a call is the best of the repeats of a loop over all the cases, over the number
+#                         of cases.
+#
+#                         usage: python benchmark_hot_paths.py [-r repeats] [-o results.json] [-b baseline.json]
+#                                                              [data file ...]
+#                                (default: 5 repeats on comp01, comp07 and toy_prob; -o saves the times, and -b shows
+#                                the speedup over saved ones, e.g. from before a change)
+
+
+# import standard packages
+import json
+import os
+import random
+import sys
+import timeit
+from collections import OrderedDict
+from itertools import chain, islice
+import numpy as np
+
+# set the path and import our code
+sys.path.append("../aima")
+sys.path.append("../utils")
+sys.path.append("../csp")
+sys.path.append("../ga")
+from bitset_csp import BitsetTimetablingCSP, bitset_forward_checking
+from csp_utils import constraint_different_values, constraint_different_timeslots, forward_checking
+from itc_ga_framework import init_population_encoded, recombine, mutate
+from itc_instance import get_instance
+from solve_itc_baseline_csp import set_up_csp, set_up_compact_csp
+from timeslot_csp import _compute_overlap
+from timetabling_csp import TimetablingCSP
+from verify_solution import fitness_function, fitness_function_encoded, population_fitness
+
+SEED = 0
+FILES = ['../../Data/ITC-2007/comp01.ctt.txt', '../../Data/ITC-2007/comp07.ctt.txt',
+         '../../Data/ITC-2007/toy_prob.ctt.txt']
+
+# number of cases of each kind
+N_PAIRS = 5000
+N_CONFLICTS = 1000
+N_FORWARD = 50
+N_INDIVIDUALS = 200
+
+# -------------------------------------------------------------------------------------
+# reference implementations
+
+def reference_fail_constraints(csp, A, a, B, b):
+    # the constraint functions one by one, as TimetablingCSP.fail_constraints does without the kernel
+    return not all(c(A, a, B, b, csp.curricula) for c in csp.constraints)
+
+def reference_nconflicts(csp, var, val, assignment):
+    # every other assigned course, as AIMA's CSP.nconflicts with every course a neighbor of every other one
+    return sum(1 for v, b in assignment.items() if v != var and reference_fail_constraints(csp, var, val, v, b))
+
+def reference_forward_checking(csp, var, value, assignment, others):
+    # (True, {course: values pruned}) for the unassigned courses in others, or (False,) if a domain is wiped out
+    pruned = {}
+    for B in others:
+        if B not in assignment and B != var:
+            live = list(csp.choices(B))
+            removed = frozenset(b for b in live if reference_fail_constraints(csp, var, value, B, b))
+            if len(removed) == len(live):
+                return (False,)
+            if removed:
+                pruned[B] = removed
+    return True, pruned
+
+def reference_recombine(x, y):
+    # the GA's crossover on OrderedDict individuals, before they became arrays
+    n = len(x)
+    c = random.randrange(0, n)
+    return OrderedDict(chain(islice(x.items(), c), islice(y.items(), c, len(y))))
+
+def reference_mutate(class_set, domains, pmut):
+    # the GA's mutation on OrderedDict individuals, before they became arrays
+    if random.uniform(0, 1) >= pmut:
+        return class_set
+    class_index = random.randint(0, len(class_set) - 1)
+    class_name = list(class_set)[class_index]
+    new_gene = {class_name: random.choice(domains[class_name])}
+    return OrderedDict(chain(islice(class_set.items(), class_index), new_gene.items(),
+                             islice(class_set.items(), class_index + 1, len(class_set))))
+
+# -------------------------------------------------------------------------------------
+def forward_checking_effect(inference, csp, var, value, assignment, checkpoint, restore):
+    # what an inference function pruned, in the form of reference_forward_checking, with the pruning undone
+    before = {B: set(csp.choices(B)) for B in csp.variables if B not in assignment and B != var}
+    mark = checkpoint()
+    ok = inference(csp, var, value, assignment, mark)
+    after = {B: set(csp.choices(B)) for B in before}
+    restore(mark)
+    if not ok:
+        return (False,)
+    return True, {B: frozenset(before[B] - after[B]) for B in before if before[B] != after[B]}
+
+def make_benchmarks(file_name, seed=SEED):
+    """ The benchmarks on one ITC data file: a list of (name, cases, implementations), where implementations is a
+        list of (name, run, check): run(cases) is timed, and check(cases) (run if None) returns the results, which
+        must be the same as those of the first (reference) implementation
+    """
+    rng = random.Random(seed)
+    np.random.seed(seed)
+    instance = get_instance(file_name)
+    problem = instance.problem
+    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = instance.as_tuple()
+    variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
+    names = list(variables)
+
+    # the (room, TimeSlot) CSP with the compiled kernel, and without it
+    kernel_csp = TimetablingCSP(variables, domains, constraints, curricula)
+    plain_csp = TimetablingCSP(variables, domains, constraints, curricula)
+    plain_csp.kernel = None
+    # the CompactProblem CSP and its bitset form
+    c_variables, c_domains, c_constraints, c_curricula, c_time_slots, problem = set_up_compact_csp(file_name)
+    compact_csp = TimetablingCSP(c_variables, c_domains, c_constraints, c_curricula, problem=problem)
+    bitset_csp = BitsetTimetablingCSP(c_variables, c_domains, c_constraints, c_curricula, problem)
+
+    def random_value(var):
+        return domains[var][rng.randrange(len(domains[var]))]
+
+    # half of the courses assigned at random (not necessarily consistently)
+    assignment = {v: random_value(v) for v in rng.sample(names, len(names) // 2)}
+    encoded_assignment = {v: problem.encode(*val) for v, val in assignment.items()}
+    unassigned = [v for v in names if v not in assignment]
+
+    benchmarks = []
+
+    # TimeSlot.overlaps
+    slots = list(problem.time_slots)
+    cases = []
+    for _ in range(N_PAIRS):
+        a, b = rng.choice(slots), rng.choice(slots)
+        cases.append((a, b, problem.slot_index[a], problem.slot_index[b]))
+    overlap_rows = problem.slot_overlap_rows
+    benchmarks.append(('TimeSlot.overlaps', cases, [
+        ('_compute_overlap', lambda cases: [_compute_overlap(a, b) for a, b, i, j in cases], None),
+        ('TimeSlot.overlaps', lambda cases: [a.overlaps(b) for a, b, i, j in cases], None),
+        ('slot_overlap_rows', lambda cases: [overlap_rows[i][j] for a, b, i, j in cases], None)]))
+
+    # the constraints, on pairs of courses: half of them curriculum neighbors
+    cases = []
+    for _ in range(N_PAIRS):
+        A = rng.choice(names)
+        neighbors = kernel_csp.neighbors[A]
+        B = rng.choice(neighbors) if neighbors and rng.random() < 0.5 else rng.choice(names)
+        if B == A:
+            continue
+        a, b = random_value(A), random_value(B)
+        cases.append((A, a, B, b, problem.encode(*a), problem.encode(*b)))
+    benchmarks.append(('constraint_different_values', cases, [
+        ('(room, TimeSlot)', lambda cases: [constraint_different_values(A, a, B, b, curricula)
+                                            for A, a, B, b, ea, eb in cases], None),
+        ('CompactProblem', lambda cases: [problem.constraint_different_values(A, ea, B, eb, curricula)
+                                          for A, a, B, b, ea, eb in cases], None)]))
+    benchmarks.append(('constraint_different_timeslots', cases, [
+        ('(room, TimeSlot)', lambda cases: [constraint_different_timeslots(A, a, B, b, curricula)
+                                            for A, a, B, b, ea, eb in cases], None),
+        ('CompactProblem', lambda cases: [problem.constraint_different_timeslots(A, ea, B, eb, curricula)
+                                          for A, a, B, b, ea, eb in cases], None)]))
+    benchmarks.append(('fail_constraints', cases, [
+        ('constraint functions', lambda cases: [reference_fail_constraints(kernel_csp, A, a, B, b)
+                                                for A, a, B, b, ea, eb in cases], None),
+        ('ConflictKernel', lambda cases: [kernel_csp.fail_constraints(A, a, B, b)
+                                          for A, a, B, b, ea, eb in cases], None),
+        ('ConflictKernel (ints)', lambda cases: [compact_csp.fail_constraints(A, ea, B, eb)
+                                                 for A, a, B, b, ea, eb in cases], None)]))
+
+    # nconflicts of an unassigned course against the half assignment
+    cases = []
+    for _ in range(N_CONFLICTS):
+        var = rng.choice(unassigned)
+        val = random_value(var)
+        cases.append((var, val, problem.encode(*val)))
+    benchmarks.append(('TimetablingCSP.nconflicts', cases, [
+        ('all pairs', lambda cases: [reference_nconflicts(kernel_csp, var, val, assignment)
+                                     for var, val, e in cases], None),
+        ('no kernel', lambda cases: [plain_csp.nconflicts(var, val, assignment) for var, val, e in cases], None),
+        ('ConflictKernel', lambda cases: [kernel_csp.nconflicts(var, val, assignment) for var, val, e in cases],
+         None),
+        ('ConflictKernel (ints)', lambda cases: [compact_csp.nconflicts(var, e, encoded_assignment)
+                                                 for var, val, e in cases], None)]))
+
+    # forward_checking from the half assignment (pruning the curriculum neighbors), and the bitset version
+    # (which prunes every unassigned course); the timed loops undo the pruning after each call
+    cases = []
+    for _ in range(N_FORWARD):
+        var = rng.choice(unassigned)
+        val = random_value(var)
+        cases.append((var, val, problem.encode(*val)))
+    kernel_csp.support_pruning()
+    plain_csp.support_pruning()
+
+    def run_forward_checking(csp):
+        def run(cases):
+            results = []
+            for var, val, e in cases:
+                mark = csp.checkpoint()
+                results.append(forward_checking(csp, var, val, assignment, mark))
+                csp.restore(mark)
+            return results
+        return run
+
+    def check_forward_checking(csp):
+        return lambda cases: [forward_checking_effect(forward_checking, csp, var, val, assignment, csp.checkpoint,
+                                                      csp.restore) for var, val, e in cases]
+
+    benchmarks.append(('forward_checking', cases, [
+        ('constraint functions', lambda cases: [reference_forward_checking(plain_csp, var, val, assignment,
+                                                                           plain_csp.neighbors[var])
+                                                for var, val, e in cases], None),
+        ('no kernel', run_forward_checking(plain_csp), check_forward_checking(plain_csp)),
+        ('ConflictKernel', run_forward_checking(kernel_csp), check_forward_checking(kernel_csp))]))
+
+    def run_bitset(cases):
+        results = []
+        for var, val, e in cases:
+            removals = []
+            results.append(bitset_forward_checking(bitset_csp, var, e, encoded_assignment, removals))
+            bitset_csp.restore(removals)
+        return results
+
+    def check_bitset(cases):
+        results = []
+        for var, val, e in cases:
+            effect = forward_checking_effect(bitset_forward_checking, bitset_csp, var, e, encoded_assignment, list,
+                                             bitset_csp.restore)
+            if effect[0]:
+                effect = True, {B: frozenset(problem.decode(b) for b in values) for B, values in effect[1].items()}
+            results.append(effect)
+        return results
+
+    benchmarks.append(('bitset_forward_checking', cases, [
+        ('constraint functions', lambda cases: [reference_forward_checking(plain_csp, var, val, assignment, names)
+                                                for var, val, e in cases], None),
+        ('bitsets', run_bitset, check_bitset)]))
+
+    # scoring: one individual at a time against the whole population at once
+    population = init_population_encoded(N_INDIVIDUALS, problem)
+    dicts = [problem.decode_solution(row) for row in population]
+    benchmarks.append(('fitness_function', list(range(N_INDIVIDUALS)), [
+        ('dict', lambda cases: [fitness_function(courses, rooms, curricula, dicts[k]) for k in cases], None),
+        ('encoded', lambda cases: [fitness_function_encoded(problem, population[k]) for k in cases], None),
+        ('population_fitness', lambda cases: population_fitness(problem, population[cases]).tolist(), None)]))
+
+    # the GA operators, from the same random state for every implementation; mutate with pmut = 1 so each call
+    # mutates (the arrays are copied first, as the children are in place)
+    pairs = [(rng.randrange(N_INDIVIDUALS), rng.randrange(N_INDIVIDUALS)) for _ in range(N_CONFLICTS)]
+    children = np.empty((len(pairs), problem.n_courses), dtype=np.int64)
+
+    def seeded(run):
+        def seeded_run(cases):
+            random.seed(seed)
+            return run(cases)
+        return seeded_run
+
+    def run_recombine(cases):
+        for k, (i, j) in enumerate(cases):
+            recombine(population[i], population[j], children[k])
+        return children.tolist()
+
+    def run_reference_recombine(cases):
+        return [problem.encode_solution(reference_recombine(dicts[i], dicts[j])).tolist() for i, j in cases]
+
+    benchmarks.append(('recombine', pairs, [
+        ('OrderedDict', seeded(run_reference_recombine), None),
+        ('array', seeded(run_recombine), None)]))
+
+    course_domains = [problem.domain_values(c) for c in problem.course_names]
+    dict_domains = {c: [problem.decode(v) for v in course_domains[i]] for i, c in enumerate(problem.course_names)}
+    rows = [i for i, j in pairs]
+
+    def run_mutate(cases):
+        mutants = population[cases]
+        for child in mutants:
+            mutate(child, course_domains, 1.0)
+        return mutants.tolist()
+
+    def run_reference_mutate(cases):
+        return [problem.encode_solution(reference_mutate(dicts[i], dict_domains, 1.0)).tolist() for i in cases]
+
+    benchmarks.append(('mutate', rows, [
+        ('OrderedDict', seeded(run_reference_mutate), None),
+        ('array', seeded(run_mutate), None)]))
+
+    return benchmarks
+
+# -------------------------------------------------------------------------------------
+def check_benchmark(name, cases, implementations):
+    """ Asserts every implementation gives the reference (first) one's results"""
+    reference_name, run, check = implementations[0]
+    expected = (check or run)(cases)
+    for impl_name, run, check in implementations[1:]:
+        results = (check or run)(cases)
+        assert results == expected, '%s: %s disagrees with %s' % (name, impl_name, reference_name)
+
+def time_benchmark(cases, implementations, repeats=5):
+    """ {implementation name: seconds per case}"""
+    return {impl_name: min(timeit.repeat(lambda: run(cases), number=1, repeat=repeats)) / len(cases)
+            for impl_name, run, check in implementations}
+
+# -------------------------------------------------------------------------------------
+def main_func(file_names, repeats=5, output_file=None, baseline_file=None):
+
+    baseline = {}
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print('%-10s %-32s %-22s %12s %9s %9s' % ('instance', 'function', 'implementation', 'us / call', 'speedup',
+                                              'baseline'))
+    for file_name in file_names:
+        instance = os.path.basename(file_name).replace('.ctt.txt', '')
+        for name, cases, implementations in make_benchmarks(file_name):
+            check_benchmark(name, cases, implementations)
+            times = time_benchmark(cases, implementations, repeats)
+            reference = times[implementations[0][0]]
+            for impl_name, t in times.items():
+                key = '%s/%s/%s' % (instance, name, impl_name)
+                results[key] = t
+                before = ('%9.2f' % (baseline[key] / t)) if key in baseline else '%9s' % '-'
+                print('%-10s %-32s %-22s %12.3f %9.2f %s' % (instance, name, impl_name, t * 1e6, reference / t,
+                                                             before))
+    if output_file:
+        with open(output_file, 'w') as f:
+            json.dump(results, f, indent=1)
+    return results
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {'-r': '5', '-o': None, '-b': None}
+    while args and args[0] in options:
+        options[args[0]] = args[1]
+        args = args[2:]
+
+    main_func(args or FILES, int(options['-r']), options['-o'], options['-b'])
@@ -0,0 +1,251 @@
+# benchmark_parser.py: compare the streaming ITC parser (parse_itc_data_file / read_itc_data_file) against the original
+#                      fixed-offset parser (read_itc_data_file_fixed_offsets, below) on every ITC-2007 data file,
+#                      checking both return the same data, then time the streaming parser on a generated multi-MB
+#                      instance and report the peak memory of both parsers on it.
+#
+#                      usage: python benchmark_parser.py [data dir] [repeats] [synthetic courses]
+
+
+# import standard packages
+import glob
+import os
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+# set the path and import our code
+sys.path.append("../utils")
+from read_itc_data_file import parse_itc_data_file, read_itc_data_file
+
+# -------------------------------------------------------------------------------------
+def read_itc_data_file_fixed_offsets(file_name):
+    # the original parser (from read_itc_data_file.py): it assumes the sections start at fixed offsets computed from
+    # the header counts, and exits on malformed input; kept here as the reference to check and time the streaming one
+    # against
+
+    with open(file_name, 'r') as f:
+        all_lines = f.readlines()
+    # print(all_lines)
+
+    # Let's grab info from each section
+    # Header format:
+    #   Name: ToyExample
+    #   Courses: 4
+    #   Rooms: 2
+    #   Days: 5
+    #   Periods_per_day: 4
+    #   Curricula: 2
+    #   Constraints: 8
+
+    # Name
+    words = all_lines[0].split()
+    if words[0] == 'Name:':
+        data_name = words[1]
+
+    # Courses
+    words = all_lines[1].split()
+    if words[0] == 'Courses:':
+        num_courses = int(words[1])
+
+    # Rooms
+    words = all_lines[2].split()
+    if words[0] == 'Rooms:':
+        num_rooms = int(words[1])
+
+    # Days
+    words = all_lines[3].split()
+    if words[0] == 'Days:':
+        num_days = int(words[1])
+
+    # Periods_per_day
+    words = all_lines[4].split()
+    if words[0] == 'Periods_per_day:':
+        periods_per_day = int(words[1])
+
+    # Curricula
+    words = all_lines[5].split()
+    if words[0] == 'Curricula:':
+        num_curricula = int(words[1])
+
+    # Constraints
+    words = all_lines[6].split()
+    if words[0] == 'Constraints:':
+        num_constraints = int(words[1])
+
+    # print('name:', data_name)
+    # print('courses:', num_courses)
+    # print('rooms:', num_rooms)
+    # print('days:', num_days)
+    # print('periods_per_day:', periods_per_day)
+    # print('curricula:', num_curricula)
+    # print('constraints:', num_constraints)
+
+    # assume for now that the header section is static and the start lines for other sections is based on the
+    # numbers provided in the header
+    course_section_start = 8 # line 9 in a text editor, but the array indexing starts at 0
+    room_section_start = course_section_start + num_courses + 2
+    curricula_section_start = room_section_start + num_rooms + 2
+    unavail_section_start = curricula_section_start + num_curricula + 2
+
+    # Courses Section
+    # COURSES: course id, teacher id, (num days to schedule on, num lectures to be scheduled)?, max number of students
+    # SceCosC Ocra 3 3 30
+    # ArcTec Indaco 3 2 42
+    # TecCos Rosa 5 4 40
+    # Geotec Scarlatti 5 4 18
+
+    words = all_lines[course_section_start].split()
+    if words[0] != 'COURSES:':
+        print('Error parsing COURSES section')
+        sys.exit()
+
+    courses = {}
+    for i in range(num_courses):
+        words = all_lines[course_section_start+i+1].split()
+        courses[words[0]] = [words[1], int(words[2]), int(words[3]), int(words[4])]
+    # print('courses:', courses)
+
+    # Rooms Section
+    # ROOMS: room name, capacity
+    # A 32
+    # B 50
+
+    words = all_lines[room_section_start].split()
+    if words[0] != 'ROOMS:':
+        print('Error parsing ROOMS section')
+        sys.exit()
+
+    rooms = {}
+    for i in range(num_rooms):
+        words = all_lines[room_section_start+i+1].split()
+        rooms[words[0]] = int(words[1])
+    # print('rooms:', rooms)
+
+    # Curricula Section
+    # CURRICULA:
+    # Cur1 3 SceCosC ArcTec TecCos
+    # Cur2 2 TecCos Geotec
+
+    words = all_lines[curricula_section_start].split()
+    if words[0] != 'CURRICULA:':
+        print('Error parsing CURRICULA section')
+        sys.exit()
+
+    curricula = {}
+    for i in range(num_curricula):
+        words = all_lines[curricula_section_start+i+1].split()
+        # num_courses_in_curricula = int(words[1])
+        the_courses = words[2:]
+        curricula[words[0]] = the_courses
+    # print('curricula:', curricula)
+
+    # Unavailability Constraints Section
+    # UNAVAILABILITY_CONSTRAINTS:
+    # TecCos 2 0
+    # TecCos 2 1
+    # TecCos 3 2
+    # TecCos 3 3
+    # ArcTec 4 0
+    # ArcTec 4 1
+    # ArcTec 4 2
+    # ArcTec 4 3
+
+    words = all_lines[unavail_section_start].split()
+    if words[0] != 'UNAVAILABILITY_CONSTRAINTS:':
+        print('Error parsing UNAVAILABILITY_CONSTRAINTS section')
+        sys.exit()
+
+    unavail_contraints = {}
+    for i in range(num_constraints):
+        words = all_lines[unavail_section_start+i+1].split()
+        if words[0] not in unavail_contraints:
+            unavail_contraints[words[0]] = [(int(words[1]), int(words[2]))]
+        else:
+            unavail_contraints[words[0]].append((int(words[1]), int(words[2])))
+    # print('unavail_contraints:', unavail_contraints)
+
+    return courses, rooms, num_days, periods_per_day, unavail_contraints, curricula
+
+# -------------------------------------------------------------------------------------
+def write_synthetic_instance(file_name, num_courses, num_rooms=200, num_days=5, periods_per_day=6, seed=0):
+    """ Write a random, well formed ITC data file with num_courses courses (about 100 bytes / course)"""
+    rng = random.Random(seed)
+    course_names = ['c%06d' % i for i in range(num_courses)]
+    curricula = []
+    for i in range(num_courses // 4):
+        curricula.append(('q%06d' % i, rng.sample(course_names, rng.randint(2, 8))))
+    unavail = [(c, rng.randrange(num_days), rng.randrange(periods_per_day))
+               for c in course_names for _ in range(rng.randint(0, 4))]
+
+    with open(file_name, 'w') as f:
+        f.write('Name: Synthetic%d\nCourses: %d\nRooms: %d\nDays: %d\nPeriods_per_day: %d\nCurricula: %d\n'
+                'Constraints: %d\n\n' % (num_courses, num_courses, num_rooms, num_days, periods_per_day,
+                                         len(curricula), len(unavail)))
+        f.write('COURSES:\n')
+        for c in course_names:
+            f.write('%s t%04d %d %d %d\n' % (c, rng.randrange(num_courses // 3 + 1), rng.randint(1, 6),
+                                             rng.randint(1, 5), rng.randint(5, 300)))
+        f.write('\nROOMS:\n')
+        for r in range(num_rooms):
+            f.write('r%04d\t%d\n' % (r, rng.randint(20, 400)))
+        f.write('\nCURRICULA:\n')
+        for q, members in curricula:
+            f.write('%s  %d %s\n' % (q, len(members), ' '.join(members)))
+        f.write('\nUNAVAILABILITY_CONSTRAINTS:\n')
+        for c, day, period in unavail:
+            f.write('%s %d %d\n' % (c, day, period))
+        f.write('\nEND.\n')
+
+# -------------------------------------------------------------------------------------
+def peak_memory(func, *args):
+    # peak bytes allocated while func(*args) runs, including its result
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak
+
+# -------------------------------------------------------------------------------------
+def main_func(data_dir, repeats=20, synthetic_courses=100000):
+
+    print('%-22s %12s %12s %8s' % ('file', 'old (ms)', 'new (ms)', 'speedup'))
+    total_old = total_new = 0.0
+    for file_name in sorted(glob.glob(os.path.join(data_dir, '*.ctt.txt'))):
+        assert read_itc_data_file(file_name) == read_itc_data_file_fixed_offsets(file_name), file_name
+        old = min(timeit.repeat(lambda: read_itc_data_file_fixed_offsets(file_name), number=1, repeat=repeats))
+        new = min(timeit.repeat(lambda: read_itc_data_file(file_name), number=1, repeat=repeats))
+        total_old += old
+        total_new += new
+        print('%-22s %12.3f %12.3f %8.2f' % (os.path.basename(file_name), old * 1e3, new * 1e3, old / new))
+    print('%-22s %12.3f %12.3f %8.2f' % ('total', total_old * 1e3, total_new * 1e3, total_old / total_new))
+
+    # a large generated instance
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, 'synthetic.ctt.txt')
+        write_synthetic_instance(file_name, synthetic_courses)
+        size = os.path.getsize(file_name)
+        print('\nsynthetic instance: %d courses, %.1f MB' % (synthetic_courses, size / 1e6))
+
+        assert read_itc_data_file(file_name) == read_itc_data_file_fixed_offsets(file_name)
+        for name, func in [('old (dicts)', read_itc_data_file_fixed_offsets), ('new (dicts)', read_itc_data_file),
+                           ('new (arrays)', parse_itc_data_file)]:
+            t = min(timeit.repeat(lambda: func(file_name), number=1, repeat=3))
+            print('%-14s %8.3f s   peak memory %7.1f MB' % (name, t, peak_memory(func, file_name) / 1e6))
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+
+    data_dir = '../../Data/ITC-2007'
+    repeats = 20
+    synthetic_courses = 100000
+    if len(sys.argv) > 1:
+        data_dir = sys.argv[1]
+    if len(sys.argv) > 2:
+        repeats = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        synthetic_courses = int(sys.argv[3])
+
+    main_func(data_dir, repeats, synthetic_courses)
@@ -0,0 +1,300 @@
+# benchmark_solvers.py: run every solver on every ITC-2007 instance with several seeds and record how each run went,
+#                       so runs can be compared across commits.
+#
+#                       The solvers are the portfolio ones (see solve_itc_portfolio.py) and 'lectures' (restart_search
+#                       on the lecture-level CSP, see lectures.py). Each run gets a fresh interpreter (a spawned
+#                       process), so the parse / setup cost and the memory are its own, and gives one record:
+#
+#                           solver, instance, seed   the run
+#                           status             'solved', 'unsolved' (out of time, or gave up), 'timeout' (killed
+#                                              after max_time + GRACE seconds) or 'error'
+#                           wall, cpu          seconds of the whole run (setup, search and scoring), in the run's
+#                                              process
+#                           peak_rss_mb        the peak resident memory of the run's process
+#                           time_to_feasible   seconds to the first timetable with no hard violation (every solver
+#                                              stops at its first one, so this is its wall time if it solved it)
+#                           score              the course-level fitness (see verify_solution.py), or for 'lectures'
+#                                              the ITC fitness, -(HARD_WEIGHT * hard + soft), with itc_hard and
+#                                              itc_soft (see itc_scorer.py)
+#                           conflicts          the hard constraints of the CSP the timetable breaks (see
+#                                              verify_solution.population_csp_conflicts; 0 is feasible), for the
+#                                              course-level solvers; a score of 0 alone doesn't make it feasible
+#                           nassigns, num_unassigns, restarts, fails, nogoods   for the backtracking solvers
+#                           steps, generations, evaluations                     for the local search, GA and random
+#
+#                       The records go to a JSON file (with the commit, machine and settings) and / or a CSV file. Given
+#                       the JSON file of an earlier run, the medians over the seeds of every (solver, instance) are
+#                       compared with it, and wall / cpu / peak_rss_mb more than threshold (a fraction) worse, or a
+#                       lower solved rate, are flagged as regressions (and the exit status is 1). Changes smaller than
+#                       NOISE are not flagged.
+#
+#                       usage: python benchmark_solvers.py [-s solver,solver,...] [-n seeds] [-t max seconds]
+#                                                          [-o results.json] [-csv results.csv] [-b baseline.json]
+#                                                          [-r threshold] [data file or directory ...]
+#                              (default: every solver, 3 seeds, 60 seconds, the comp*.ctt.txt in ../../Data/ITC-2007,
+#                              threshold 0.2)
+
+
+# import standard packages
+import csv
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+# set the path and import our code
+sys.path.append("../aima")
+sys.path.append("../utils")
+sys.path.append("../csp")
+sys.path.append("../ga")
+from conflict_directed import restart_search
+from itc_instance import get_instance
+from itc_scorer import ITCScorer, HARD_COMPONENTS, SOFT_COMPONENTS
+from lectures import LectureTimetablingCSP, lecture_forward_checking, lecture_value_order
+from solve_itc_baseline_csp import set_up_lecture_csp
+from solve_itc_portfolio import SOLVERS
+from verify_solution import fitness_function_encoded, count_csp_conflicts
+
+# seconds a run gets beyond max_time to stop and report before it is killed
+GRACE = 30
+
+# the search counters a record has (None if the solver doesn't count it)
+COUNTERS = ('nassigns', 'num_unassigns', 'restarts', 'fails', 'nogoods', 'steps', 'generations', 'evaluations')
+
+FIELDS = (('solver', 'instance', 'seed', 'status', 'wall', 'cpu', 'peak_rss_mb', 'time_to_feasible', 'score',
+           'conflicts', 'itc_hard', 'itc_soft') + COUNTERS + ('error',))
+
+# the metrics compared with the baseline (lower is better), and the smallest change of each that counts (the runs
+# that take a few milliseconds would flag on noise otherwise)
+METRICS = ('wall', 'cpu', 'peak_rss_mb')
+NOISE = {'wall': 0.05, 'cpu': 0.05, 'peak_rss_mb': 1.0}
+
+# -------------------------------------------------------------------------------------
+def solve_lectures(file_name, seed, max_time, stop, stats=None):
+    # restart_search on the lecture-level CSP, as solve_itc_baseline_csp.solve_lectures; returns the ITC encoded
+    # lectures (see itc_scorer.py)
+    variables, domains, constraints, groups, time_slots, rooms, students = set_up_lecture_csp(file_name)
+    my_problem = LectureTimetablingCSP(variables, domains, constraints, groups, rooms, students)
+    solution, search_stats = restart_search(my_problem, order_domain_values=lecture_value_order,
+                                            inference=lecture_forward_checking, restarts='luby', max_time=max_time,
+                                            seed=seed, stop=stop)
+    if stats is not None:
+        stats.update(nassigns=my_problem.nassigns, num_unassigns=my_problem.num_unassigns,
+                     restarts=search_stats['restarts'], fails=search_stats['fails'], nogoods=search_stats['nogoods'])
+    if solution is None:
+        return None
+    return ITCScorer(file_name).encode_solution(solution)
+
+BENCH_SOLVERS = dict(SOLVERS, lectures=solve_lectures)
+
+# -------------------------------------------------------------------------------------
+def run_one(solver, file_name, seed, max_time, conn):
+    """Runs one solver (in its own process) and sends its record through conn"""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    record = dict.fromkeys(FIELDS)
+    record.update(solver=solver, instance=os.path.basename(file_name).replace('.ctt.txt', ''), seed=seed)
+    stats = {}
+    # the GA only stops through the event, so every solver gets one that is set at max_time
+    stop = threading.Event()
+    timer_thread = threading.Timer(max_time, stop.set)
+    timer_thread.daemon = True
+    timer_thread.start()
+    try:
+        values = BENCH_SOLVERS[solver](file_name, seed, max_time, stop, stats)
+        elapsed = time.perf_counter() - wall_start
+        if values is None:
+            feasible = False
+        elif solver == 'lectures':
+            scorer = ITCScorer(file_name)
+            breakdown = scorer.evaluate(values)
+            record['itc_hard'] = sum(breakdown[k] for k in HARD_COMPONENTS)
+            record['itc_soft'] = sum(breakdown[k] for k in SOFT_COMPONENTS)
+            record['score'] = scorer.fitness(None, breakdown)
+            feasible = record['itc_hard'] == 0
+        else:
+            problem = get_instance(file_name).problem
+            record['score'] = float(fitness_function_encoded(problem, values))
+            record['conflicts'] = count_csp_conflicts(problem, values)
+            feasible = record['conflicts'] == 0
+        record['status'] = 'solved' if feasible else 'unsolved'
+        record['time_to_feasible'] = elapsed if feasible else None
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = repr(e)
+    timer_thread.cancel()
+    for k in COUNTERS:
+        if k in stats:
+            record[k] = int(stats[k])
+    record['wall'] = time.perf_counter() - wall_start
+    record['cpu'] = time.process_time() - cpu_start
+    # ru_maxrss is in kB on Linux (bytes on macOS)
+    scale = 1 if sys.platform == 'darwin' else 1024
+    record['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    conn.send(record)
+    conn.close()
+
+def run_benchmark(file_names, solvers=None, seeds=(1, 2, 3), max_time=60, verbose=True):
+    """ Runs every solver with every seed on every file, one run at a time (so they don't compete for the CPU), each
+        in a fresh process
+
+    :param file_names:  paths to the ITC data files
+    :param solvers:  names of the solvers to run (all of BENCH_SOLVERS if None)
+    :param seeds:  the seeds to run each solver with
+    :param max_time:  seconds each run gets
+    :param verbose:  print each record as it comes in
+    :return:  list of the records (dicts with the FIELDS)
+    """
+    solvers = list(BENCH_SOLVERS) if solvers is None else list(solvers)
+    for solver in solvers:
+        if solver not in BENCH_SOLVERS:
+            raise ValueError('unknown solver %r, use some of %s' % (solver, ', '.join(BENCH_SOLVERS)))
+    context = multiprocessing.get_context('spawn')
+    records = []
+    if verbose:
+        print_header()
+    for file_name in file_names:
+        for solver in solvers:
+            for seed in seeds:
+                receiver, sender = context.Pipe(duplex=False)
+                worker = context.Process(target=run_one, args=(solver, file_name, seed, max_time, sender))
+                worker.start()
+                sender.close()
+                if receiver.poll(max_time + GRACE):
+                    record = receiver.recv()
+                else:
+                    record = dict.fromkeys(FIELDS)
+                    record.update(solver=solver, instance=os.path.basename(file_name).replace('.ctt.txt', ''),
+                                  seed=seed, status='timeout', wall=max_time + GRACE)
+                    worker.terminate()
+                worker.join()
+                receiver.close()
+                records.append(record)
+                if verbose:
+                    print_record(record)
+    return records
+
+# -------------------------------------------------------------------------------------
+def print_header():
+    print('%-14s %-12s %4s %-9s %8s %8s %8s %10s %12s %9s %10s' % ('solver', 'instance', 'seed', 'status', 'wall',
+                                                                  'cpu', 'rss MB', 'feasible', 'score', 'conflicts',
+                                                                  'nassigns'))
+
+def print_record(r):
+    def fmt(value, spec):
+        return '-' if value is None else spec % value
+    print('%-14s %-12s %4s %-9s %8s %8s %8s %10s %12s %9s %10s' % (r['solver'], r['instance'], r['seed'],
+                                                                  r['status'], fmt(r['wall'], '%.2f'),
+                                                                  fmt(r['cpu'], '%.2f'), fmt(r['peak_rss_mb'], '%.0f'),
+                                                                  fmt(r['time_to_feasible'], '%.2fs'),
+                                                                  fmt(r['score'], '%g'), fmt(r['conflicts'], '%d'),
+                                                                  fmt(r['nassigns'], '%d')))
+
+def git_commit():
+    # the commit the benchmark ran on (None outside a git checkout)
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_json(file_name, records, settings):
+    results = {'commit': git_commit(), 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'machine': platform.platform(), 'cpus': os.cpu_count(),
+               'settings': settings, 'runs': records}
+    with open(file_name, 'w') as f:
+        json.dump(results, f, indent=1)
+
+def write_csv(file_name, records):
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+
+# -------------------------------------------------------------------------------------
+def summarize(records):
+    """ {(solver, instance): {metric: median over the seeds, 'solved': fraction solved}}"""
+    groups = {}
+    for r in records:
+        groups.setdefault((r['solver'], r['instance']), []).append(r)
+    summary = {}
+    for key, runs in groups.items():
+        summary[key] = {'solved': sum(r['status'] == 'solved' for r in runs) / len(runs)}
+        for metric in METRICS:
+            values = [r[metric] for r in runs if r[metric] is not None]
+            summary[key][metric] = statistics.median(values) if values else None
+    return summary
+
+def find_regressions(records, baseline_records, threshold=0.2):
+    """ The (solver, instance) medians that got worse than in the baseline by more than threshold (a fraction), and
+        the ones that are solved less often
+
+    :return:  list of (solver, instance, metric, baseline value, new value)
+    """
+    new = summarize(records)
+    old = summarize(baseline_records)
+    regressions = []
+    for key in sorted(new.keys() & old.keys()):
+        if new[key]['solved'] < old[key]['solved']:
+            regressions.append(key + ('solved', old[key]['solved'], new[key]['solved']))
+        for metric in METRICS:
+            before, after = old[key][metric], new[key][metric]
+            if before is not None and after is not None and after > max(before * (1 + threshold),
+                                                                        before + NOISE[metric]):
+                regressions.append(key + (metric, before, after))
+    return regressions
+
+# -------------------------------------------------------------------------------------
+def main_func(paths, solvers=None, n_seeds=3, max_time=60, output_file=None, csv_file=None, baseline_file=None,
+              threshold=0.2):
+
+    file_names = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_names.extend(sorted(glob.glob(os.path.join(path, 'comp*.ctt.txt'))))
+        else:
+            file_names.append(path)
+    seeds = list(range(1, n_seeds + 1))
+
+    records = run_benchmark(file_names, solvers, seeds, max_time)
+    settings = {'files': file_names, 'solvers': solvers or list(BENCH_SOLVERS), 'seeds': seeds,
+                'max_time': max_time}
+    if output_file:
+        write_json(output_file, records, settings)
+    if csv_file:
+        write_csv(csv_file, records)
+
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(records, baseline['runs'], threshold)
+        print('\ncompared with %s (commit %s), threshold %g%%:' % (baseline_file, baseline.get('commit'),
+                                                                   100 * threshold))
+        for solver, instance, metric, before, after in regressions:
+            print('  REGRESSION %-14s %-12s %-12s %10.4g -> %10.4g' % (solver, instance, metric, before, after))
+        if not regressions:
+            print('  no regressions')
+        return records, regressions
+    return records, []
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {'-s': None, '-n': '3', '-t': '60', '-o': None, '-csv': None, '-b': None, '-r': '0.2'}
+    while args and args[0] in options:
+        options[args[0]] = args[1]
+        args = args[2:]
+
+    records, regressions = main_func(args or ['../../Data/ITC-2007'],
+                                     options['-s'].split(',') if options['-s'] else None, int(options['-n']),
+                                     float(options['-t']), options['-o'], options['-csv'], options['-b'],
+                                     float(options['-r']))
+    sys.exit(1 if regressions else 0)
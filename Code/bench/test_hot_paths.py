@@ -0,0 +1,61 @@
+# test_hot_paths.py: the benchmarks of benchmark_hot_paths.py as pytest tests: one test per benchmark and instance
+#                    that checks every implementation gives the reference one's results, and (with pytest-benchmark
+#                    installed) one timing per implementation, grouped by benchmark and instance. The timings are of
+#                    the loop over all the cases, not per call as in benchmark_hot_paths.py.
+#
+#                    usage: python -m pytest test_hot_paths.py --benchmark-skip   (only the checks; the timings are
+#                                                                                   skipped anyway without
+#                                                                                   pytest-benchmark)
+#                           python -m pytest test_hot_paths.py --benchmark-only   (only the timings)
+
+# import standard packages
+import os
+import sys
+import pytest
+
+# set the path and import our code
+HERE = os.path.dirname(os.path.abspath(__file__))
+for directory in ["../aima", "../utils", "../csp", "../ga"]:
+    sys.path.append(os.path.join(HERE, directory))
+from benchmark_hot_paths import FILES, make_benchmarks, check_benchmark
+
+try:
+    import pytest_benchmark
+except ImportError:
+    pytest_benchmark = None
+
+# the benchmarks are built once per instance (it is cheap) and shared by the tests
+_BENCHMARKS = {}
+
+# -------------------------------------------------------------------------------------
+def get_benchmarks(file_name):
+    """ make_benchmarks(file_name), built the first time"""
+    if file_name not in _BENCHMARKS:
+        _BENCHMARKS[file_name] = make_benchmarks(os.path.join(HERE, file_name))
+    return _BENCHMARKS[file_name]
+
+def instance_name(file_name):
+    return os.path.basename(file_name).replace('.ctt.txt', '')
+
+CHECKS = [(file_name, name) for file_name in FILES for name, cases, implementations in get_benchmarks(file_name)]
+TIMINGS = [(file_name, name, impl_name) for file_name in FILES
+           for name, cases, implementations in get_benchmarks(file_name) for impl_name, run, check in implementations]
+
+def find_benchmark(file_name, name):
+    return next(benchmark for benchmark in get_benchmarks(file_name) if benchmark[0] == name)
+
+# -------------------------------------------------------------------------------------
+@pytest.mark.parametrize('file_name, name', CHECKS,
+                         ids=['%s-%s' % (instance_name(file_name), name) for file_name, name in CHECKS])
+def test_implementations_agree(file_name, name):
+    check_benchmark(*find_benchmark(file_name, name))
+
+@pytest.mark.skipif(pytest_benchmark is None, reason='needs pytest-benchmark')
+@pytest.mark.parametrize('file_name, name, impl_name', TIMINGS,
+                         ids=['%s-%s-%s' % (instance_name(file_name), name, impl_name)
+                              for file_name, name, impl_name in TIMINGS])
+def test_timing(benchmark, file_name, name, impl_name):
+    name, cases, implementations = find_benchmark(file_name, name)
+    run = next(run for impl_name_, run, check in implementations if impl_name_ == impl_name)
+    benchmark.group = '%s %s' % (instance_name(file_name), name)
+    benchmark.pedantic(run, args=(cases,), rounds=5, iterations=1)
@@ -3,72 +3,150 @@
 #                            its domain and then scoring the assignment. This is repeated for N (default=500) trials
 #                            and the average is taken as the (negative of the) complexity score
 #
+#                            The random assignments are drawn as one int matrix (see CompactProblem.random_assignments)
+#                            a batch at a time and scored with population_components, so a file takes milliseconds
+#                            rather than seconds; sampling stops early once the confidence interval of the mean is
+#                            tight enough.
+#
+#                            usage: python compute_itc_complexity.py [max samples] [relative tolerance] [itc]
+#                                   (itc: also sample lecture-level assignments and score them with the ITC
+#                                   components, see itc_scorer.py; and stats, progress[=seconds] or profile[=file]
+#                                   anywhere, see instrumentation.py)
 
 
 # import standard packages
+import glob
 import matplotlib.pyplot as plt
 import numpy as np
+import statistics
 import sys
+from timeit import default_timer as timer
 
 # set the path and import our code
 sys.path.append("../aima")
 sys.path.append("../utils")
-from solve_itc_baseline_csp import set_up_csp
-from verify_solution import verify_solution
-
-# -------------------------------------------------------------------------------------
-def measure_complexity(file_name):
-
-    # Read in the ITC data file and do the pre-process necessary to convert the raw data into
-    # variables, domains and constraints
-    variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
-    N = 500
-    scores = []
-    output = []
-    for i in range(N):
-        # create a random solution
-        solution = {}
-        for v in variables:
-            # randomly choose an assignment from this variable's domain
-            ind = np.random.choice(len(domains[v]))
-            solution[v] = domains[v][ind]
-
-        # score it
-        solved, solution_score = verify_solution(file_name, solution, verbose=False)
-        # print(solution_score)
+from instrumentation import from_args, get_instrumentation
+from itc_instance import load_instance
+from itc_scorer import ITCScorer, COMPONENTS
+from verify_solution import population_components, HARD_CONSTRAINT_PENALTY, SOFT_CONSTRAINT_PENALTY
 
-        scores.append(solution_score)
-
-
-    print('file: ', file_name, ' mean:', np.mean(scores), np.std(scores))
-    file = file_name.replace('../../Data/ITC-2007/', '')
-    file = file.replace('.ctt.txt', '')
-    output = (file, np.mean(scores), np.std(scores))
+PERCENTILES = (5, 25, 50, 75, 95)
 
+# -------------------------------------------------------------------------------------
+def summarize(samples, confidence=0.95):
+    """ mean, std, percentiles and the (normal approximation) confidence interval of the mean of samples"""
+    samples = np.asarray(samples, dtype=np.float64)
+    n = len(samples)
+    mean = float(samples.mean())
+    std = float(samples.std(ddof=1)) if n > 1 else 0.0
+    half_width = statistics.NormalDist().inv_cdf(0.5 + confidence / 2) * std / np.sqrt(n)
+    return {'n': n, 'mean': mean, 'std': std, 'ci': (mean - half_width, mean + half_width),
+            'percentiles': dict(zip(PERCENTILES, np.percentile(samples, PERCENTILES).tolist()))}
+
+def measure_complexity(file_name, n=500, batch=100, rel_tol=0.05, confidence=0.95, seed=None, itc=False,
+                       verbose=True, instrument=None):
+    """ Scores random assignments of an instance, batch at a time, until n have been scored or the confidence
+        interval of the mean score is within rel_tol of the mean (after at least 2 batches)
+
+    :param file_name:  path to the ITC data file
+    :param n:  maximum number of random assignments
+    :param batch:  number of assignments drawn and scored at a time
+    :param rel_tol:  stop early once the half width of the confidence interval is at most rel_tol * |mean| (None to
+                     always score n)
+    :param confidence:  confidence level of the intervals
+    :param seed:  random seed
+    :param itc:  also score n random lecture-level assignments (every room and ITC period equally likely) with
+                 the ITC components (see itc_scorer.py), reported as 'itc'
+    :param verbose:  print a line for the file
+    :param instrument:  an Instrumentation to count the assignments drawn and scored through (see instrumentation.py)
+    :return:  dict with the file (name without the path and extension), the summary of the scores (n, mean, std,
+              ci, percentiles, see summarize), components {name: summary} of the counts behind the score
+              (capacity, room_slot, curricula), time, and 'itc' {component: summary} if itc
+    """
+    start = timer()
+    instrument = get_instrumentation(instrument)
+    with instrument:
+        rng = np.random.default_rng(seed)
+        with instrument.timer('setup'):
+            problem = load_instance(file_name).problem
+
+        counts = {'capacity': [], 'room_slot': [], 'curricula': []}
+        scores = []
+        num_scored = 0
+        while num_scored < n:
+            size = min(batch, n - num_scored)
+            with instrument.timer('sampling'):
+                population = problem.random_assignments(size, rng)
+            with instrument.timer('scoring'):
+                capacity_fails, room_slot_fails, curricula_fails, incomplete = population_components(problem,
+                                                                                                     population)
+            instrument.count('random_assignments', size)
+            instrument.count('fitness_evaluations', size)
+            counts['capacity'].append(capacity_fails)
+            counts['room_slot'].append(room_slot_fails)
+            counts['curricula'].append(curricula_fails)
+            scores.append(0.0 - (HARD_CONSTRAINT_PENALTY * (capacity_fails + room_slot_fails) +
+                                 SOFT_CONSTRAINT_PENALTY * curricula_fails))
+            num_scored += size
+            if rel_tol is not None and len(scores) >= 2:
+                summary = summarize(np.concatenate(scores), confidence)
+                if (summary['ci'][1] - summary['ci'][0]) / 2 <= rel_tol * abs(summary['mean']):
+                    break
+
+        output = summarize(np.concatenate(scores), confidence)
+        output['file'] = file_name.replace('\\', '/').split('/')[-1].replace('.ctt.txt', '')
+        output['components'] = {k: summarize(np.concatenate(v), confidence) for k, v in counts.items()}
+
+        if itc:
+            with instrument.timer('itc scoring'):
+                scorer = ITCScorer(file_name)
+                breakdown = scorer.evaluate(rng.integers(0, scorer.n_values, size=(n, scorer.n_lectures)))
+            instrument.count('itc_fitness_evaluations', n)
+            output['itc'] = {k: summarize(breakdown[k], confidence) for k in COMPONENTS}
+    output['time'] = timer() - start
+
+    if verbose:
+        half_width = (output['ci'][1] - output['ci'][0]) / 2
+        print('file: ', output['file'], ' mean: %.3f +- %.3f' % (output['mean'], half_width),
+              ' std: %.3f' % output['std'], ' n:', output['n'], ' (%.3fs)' % output['time'])
     return output
 
 # -------------------------------------------------------------------------------------
 if __name__ == "__main__":
+    sys.argv, instrument = from_args(sys.argv)
+    n = 500
+    rel_tol = 0.05
+    itc = False
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        rel_tol = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        itc = sys.argv[3] == 'itc'
 
     outptut = []
-    for i in range(9):
-        file_name = '../../Data/ITC-2007/comp0%s.ctt.txt' % (i+1)
-        out = measure_complexity(file_name)
+    for file_name in sorted(glob.glob('../../Data/ITC-2007/comp[0-9][0-9].ctt.txt')):
+        out = measure_complexity(file_name, n=n, rel_tol=rel_tol, seed=0, itc=itc, instrument=instrument)
         outptut.append(out)
-
-    for i in range(9,21):
-        file_name = '../../Data/ITC-2007/comp%s.ctt.txt' % (i+1)
-        out = measure_complexity(file_name)
-        outptut.append(out)
-
-    print(outptut)
+    if instrument is not None:
+        instrument.report()
+
+    # the breakdown behind the means
+    print('%-8s %10s %10s %10s %10s' % ('file', 'capacity', 'room_slot', 'curricula', 'p5..p95'))
+    for out in outptut:
+        print('%-8s %10.2f %10.2f %10.2f %10s' % (out['file'], out['components']['capacity']['mean'],
+                                                out['components']['room_slot']['mean'],
+                                                out['components']['curricula']['mean'],
+                                                '%g..%g' % (out['percentiles'][5], out['percentiles'][95])))
+        if itc:
+            print('         ITC:', ', '.join('%s %.1f' % (k, s['mean']) for k, s in out['itc'].items()))
 
     # bar plot this thing the easy way
     labels = []
     scores = []
     for i in outptut:
-        labels.append(i[0])
-        scores.append(-1.0*i[1])
+        labels.append(i['file'])
+        scores.append(-1.0*i['mean'])
 
     pos = range(len(scores))
     plt.bar(pos, scores)
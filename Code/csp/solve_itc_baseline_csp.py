@@ -21,44 +21,33 @@ sys.path.append("../utils")
 import csp
 
 # import our code (in the same directory as this file)
-from csp_utils import forward_checking, constraint_different_values, constraint_different_timeslots
+from bitset_csp import BitsetTimetablingCSP, bitset_forward_checking, bitset_mac
+from csp_utils import backtracking_search, forward_checking
+from csp_utils import constraint_different_values, constraint_different_timeslots
 from csp_utils import display_solution, display_solution_in_table
+from compact_problem import set_up_attribute_domains
+from conflict_directed import restart_search
+from instrumentation import count_csp_calls, from_args, get_instrumentation
+from itc_instance import get_instance
+from itc_scorer import ITCScorer, HARD_COMPONENTS, SOFT_COMPONENTS
+from lectures import LectureTimetablingCSP, lecture_forward_checking, lecture_groups, \
+    lecture_value_order, lecture_variables
+from product_domain import ProductDomain
 from read_itc_data_file import read_itc_data_file
 from timetabling_csp import TimetablingCSP
-from timeslot_csp import TimeSlot
-from verify_solution import verify_solution
+from timeslot_csp import TimeSlot, define_all_timeslots, define_itc_timeslots, itc_timeslot
+from verify_solution import verify_solution, verify_lecture_solution
 
 
 # USE_ONE_DAY_CLASSES = True
 
-# -------------------------------------------------------------------------------------
-def define_all_timeslots():
-    days2 = [['M', 'W'], ['T', 'R']]
-    days1 = ['M', 'T', 'W', 'R', 'F']
-    times2_start = [700, 830, 1000, 1130, 1300, 1430, 1600, 1730, 1900]  # these are 1:15 minute classes
-    times2_stop = [815, 945, 1115, 1245, 1415, 1545, 1715, 1845, 2015]
-    # start and stop for one-day classes, evening times first
-    times1_start = [1600, 1900, 700, 1000, 1300]  # these are 2:50 minute classes
-    times1_stop = [1850, 2150, 950, 1250, 1550]
-
-    # build a list of all the time periods we could use in this order:
-    # use all 2-day ones first, then add single-day evening, then add single day day-time) ???
-    all_timeslots = []
-    for d in days2:
-        for start, stop in zip(times2_start, times2_stop):
-            all_timeslots.append(TimeSlot(d, start, stop))
-    for d in days1:
-        for start, stop in zip(times1_start, times1_stop):
-            all_timeslots.append(TimeSlot(d, start, stop))
-
-    return all_timeslots
-
 # -------------------------------------------------------------------------------------
 def set_up_csp(file_name, verbose=False):
     # Read in the ITC data file and do the pre-process necessary to convert the raw data into
     # variables, domains and constraints ... we might want to reuse this chunk of code
 
-    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = read_itc_data_file(file_name)
+    # (file_name can also be an ITCInstance; either way the file is only parsed once, see itc_instance.py)
+    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = get_instance(file_name).as_tuple()
 
     # ITC data has days and time slots as separate items, but for us it makes a lot more sense to map to a combo
     # print('courses:', courses)
@@ -68,78 +57,10 @@ def set_up_csp(file_name, verbose=False):
     # print('unavail_constraints:', unavail_constraints)
     # print('curricula:',curricula)
 
-    # -------------------------------------------------------------------------------------
-    # data pre-processing steps:
-    #   - convert the course day (in integer) and time-slot (also an integer) into a TimeSlot instance
-    #   - do the same with the unavailability constraints
-
-    # convert the day and time values into a TimeSlot instance
-    # options: we can have 1-day per week classes, 2-day per week classes (MW or TR), 3-days per week (MWF)
-    #          for now we will just have 2-day per week and we will add in 1-day per week if the problem space
-    #          gets too large
-
-    # get all the available timeslots
-    all_timeslots = define_all_timeslots()
-
-    # sanity check: make sure the number of courses is not greater than the number of available timeslots * # rooms
-    # day-time slots * number of rooms
-    if len(courses) > len(all_timeslots) * len(rooms):
-        print('Error: too many courses for the combination of day-times and rooms')
-        sys.exit()
-
-    # select the needed number of timeslots
-    time_slots = all_timeslots[:periods_per_day * num_days]
-
-    # note: the input problem files sometimes have 6 days allowed for instruction, but we are only scheduling courses
-    #       during 5 days; this is an issue when a course has an unavailability on day 5 or 6; the solution for now is
-    #       to just ignore those unavailability constraints
-
-    # setting up the blocked timeslots is a bit of a mess ... the problem files use integers for day and for time
-    # in order to be cooler and more clever, we mapped that to MW or TR or M at some actual time ... so we need to take
-    # the day number and the time number into a single number and then block that timeslot
-    blocked_timeslots = {} # use a dict; key = course, value = list of TimeSlot items
-    for c in unavail_constraints:
-        blocked_timeslots[c] = []
-        for item in unavail_constraints[c]:
-            day = item[0]
-            time = item[1]
-            ts_number = day * (num_days-1) + time
-            # sometimes we have an issue when we are adjusting the problem to make it harder that we have blocked
-            # timeslots that refer to a day or time that is not in our set, so skip those
-            if ts_number >= len(time_slots):
-                continue
-            blocked_timeslots[c].append(time_slots[ts_number])
-
-    '''
-    # convert the unavailability constraints into TimeSlot instances
-    # unavail_constraints is a dict with entries like: 'c0025': [(2, 2), (2, 3) ... ]
-    blocked_timeslots = {} # use a dict; key = course, value = list of TimeSlot items
-    for c in unavail_constraints:
-        blocked_timeslots[c] = []
-        for item in unavail_constraints[c]:
-            # item is a tuple of (day number, time period number)
-            if item[0] >= len(days1):
-                continue
-            this_day = days1[item[0]]
-            the_days = []
-            # need to handle this carefully since our time slots are MW, TR and maybe M->F
-            # so if the blocked day is W, then we need to block both W and MW ...
-            for d in days2:
-                if this_day in d:
-                    the_days.append(d)
-
-            # get start and stop times for the specified time slot
-            time_num = item[1]
-            start = times2_start[time_num]
-            stop = times2_stop[time_num]
-            for d in the_days:
-                blocked_timeslots[c].append(TimeSlot(d, start, stop))
-    '''
-    if (verbose):
-        print('blocked_timeslots:')
-        for b in blocked_timeslots:
-            print(b, ':', blocked_timeslots[b])
-
+    # convert the day / time values into TimeSlot instances and apply the unary constraints (room capacity and
+    # unavailability) to get the domains of each variable attribute (see compact_problem.py)
+    time_slots, room_domains, day_time_domains = set_up_attribute_domains(courses, rooms, num_days, periods_per_day,
+                                                                          unavail_constraints, verbose)
 
     # -------------------------------------------------------------------------------------
     # variables: a dict; key: variable name; value: tuple (list???) of a the values assigned to each variable attribute
@@ -149,76 +70,19 @@ def set_up_csp(file_name, verbose=False):
     for c in courses:
         variables[c] = (None, None)
 
-    # -------------------------------------------------------------------------------------
-    # apply the unary constraints; since they only constrain one attribute of a variable we will do that to limit the
-    # domains of some variable attributes before constructing the Timetabling CSP problem
-
-    # apply unary constraints based on room capacities
-    # each course has a max number of students (element 3 in the list), each room has a max capacity
-    # first let's make a list or dict of the domains
-    room_violation = {}
-    for c in courses:
-        max_students = courses[c][3]
-        # now look at all the rooms and see where we have a violation
-        for r in rooms:
-            if rooms[r] < max_students:
-                if c not in room_violation:
-                    room_violation[c] = [r]
-                else:
-                    room_violation[c].append(r)
-
-    # now create the domain set for the 'Rooms' attribute for each variable
-    room_domain_all = list(rooms.keys())
-    room_domains = {}
-    for v in variables:
-        if v in room_violation:
-            room_domains[v] = [r for r in room_domain_all if r not in room_violation[v]]
-        else:
-            room_domains[v] = room_domain_all
-    if (verbose):
-        print('room_domains:', room_domains)
-
-    # now create the domain set for the 'Day-Time' attribute for each variable,
-    # taking into account the blocked time slots for any course
-    day_time_domains = {}
-    for v in variables:
-        if v in blocked_timeslots:
-            # walk through all the available time slots and keep all that are not included
-            # in the set of blocked time slots for this variable
-            day_time_domains[v] = []
-            for ts in time_slots:
-                good = True
-                for tb in blocked_timeslots[v]:
-                    if ts == tb:
-                        good = False
-                if good:
-                    day_time_domains[v].append(ts)
-        else:
-            # this variable has now unavailable time slots, so add them all to the domain
-            day_time_domains[v] = time_slots
-
-    if (verbose):
-        print('day_time_domains:')
-        for dt in day_time_domains:
-            print(dt, day_time_domains[dt])
-
     # -------------------------------------------------------------------------------------
     # domains: a dict; key: variable name; value: list of a tuple of possible assignments for each variable attribute
     # for now, all courses have the same domains
 
-    # for the current approach, we need to create the cartesian product of all the domains of each attribute
-    # this is not going to be very feasible for larger problems
+    # for the current approach, we need the cartesian product of all the domains of each attribute; a ProductDomain
+    # gives the (room, TimeSlot) values of the product without building it (see product_domain.py)
     domains = {}
     for x in variables:
-        attr_prod = []
-        for r in room_domains[x]:
-            for dt in day_time_domains[x]:
-                attr_prod.append((r, dt))
-        domains[x] = attr_prod
+        domains[x] = ProductDomain(room_domains[x], day_time_domains[x])
 
     if (verbose):
         for d in domains:
-              print('domain for:', d, ':', domains[d])
+              print('domain for:', d, ':', list(domains[d]))
 
     # -------------------------------------------------------------------------------------
     # constraints   A list of functions f(A, a, B, b) that returns true if two variables A, B satisfy the constraint
@@ -230,14 +94,80 @@ def set_up_csp(file_name, verbose=False):
     return variables, domains, constraints, curricula, time_slots
 
 # -------------------------------------------------------------------------------------
-def main_func(file_name, output_file=None):
+def set_up_compact_csp(file_name, verbose=False):
+    # same as set_up_csp, but the values are the ints of the CompactProblem (room_id * n_slots + slot_id) instead
+    # of (room, TimeSlot) tuples, so we never build the cartesian product of tuples; use problem.decode_solution()
+    # to get back a solution that can be displayed / verified
+    problem = get_instance(file_name).problem
+
+    variables = {}
+    for c in problem.course_names:
+        variables[c] = (None, None)
+
+    domains = problem.domain_lists()
+    constraints = [problem.constraint_different_values, problem.constraint_different_timeslots]
+
+    return variables, domains, constraints, problem.curricula, problem.time_slots, problem
+
+# -------------------------------------------------------------------------------------
+def set_up_lecture_csp(file_name, verbose=False):
+    # same as set_up_csp, but with one variable per lecture (courses[c][1] of them for course c, see lectures.py);
+    # the curricula returned are the lecture groups (curricula, courses and teachers) whose lectures must be at
+    # different timeslots, and rooms / students ({course: number of students}) are for LectureTimetablingCSP
+    #
+    # the timeslots are the ITC periods rather than the MW / TR style TimeSlots of set_up_attribute_domains: those
+    # overlap each other, so a room only has 18 slots that don't
+    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = get_instance(file_name).as_tuple()
+    time_slots = define_itc_timeslots(num_days, periods_per_day)
+    # room capacity is a soft constraint in ITC-2007 (and comp01, say, has only two rooms big enough for most of its
+    # 160 lectures), so every room is in the domain; lecture_value_order tries the rooms that fit first
+    room_domains = {c: sorted(rooms) for c in courses}
+    day_time_domains = {}
+    for c in courses:
+        unavailable = {itc_timeslot(day, period) for day, period in unavail_constraints.get(c, ())
+                       if day < num_days and period < periods_per_day}
+        day_time_domains[c] = [ts for ts in time_slots if ts not in unavailable]
+    if verbose:
+        print('room_domains:', room_domains)
+        print('day_time_domains:', day_time_domains)
+
+    # the lectures of a course all have the course's domain
+    variables = lecture_variables(courses)
+    domains = {}
+    for x in variables:
+        domains[x] = ProductDomain(room_domains[x.course], day_time_domains[x.course])
+
+    constraints = [constraint_different_values, constraint_different_timeslots]
+    groups = lecture_groups(courses, curricula, variables)
+
+    students = {c: courses[c][3] for c in courses}
+    return variables, domains, constraints, groups, time_slots, dict(rooms), students
+
+# -------------------------------------------------------------------------------------
+def main_func(file_name, output_file=None, compact=False, bitset=None, restarts=None, max_time=None, seed=None,
+              lectures=False, instrument=None):
+    # bitset: None, 'fc' or 'mac' to run backtracking (with mrv) on bitset domains with forward checking or MAC
+    # (see bitset_csp.py); this uses the compact problem
+    # restarts: None, 'luby' or 'geometric' to run restart_search instead (dom/wdeg ordering, occupancy_lcv values,
+    # forward checking unless bitset says otherwise, see conflict_directed.py), for at most max_time seconds
+    # lectures: schedule every lecture of every course (see set_up_lecture_csp); this runs restart_search ('luby'
+    # restarts unless restarts says otherwise) on the ITC periods
+    # instrument: an Instrumentation to report the setup and the search through (see instrumentation.py)
+    if lectures:
+        return solve_lectures(file_name, output_file, restarts or 'luby', max_time, seed, instrument)
+    compact = compact or bitset is not None
+    instrument = get_instrumentation(instrument)
 
     # Read in the ITC data file and do the pre-process necessary to convert the raw data into
     # variables, domains and constraints
-    variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
+    with instrument, instrument.timer('setup'):
+        if compact:
+            variables, domains, constraints, curricula, time_slots, problem = set_up_compact_csp(file_name)
+        else:
+            variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
 
     # set up the problem
-    my_problem = TimetablingCSP(variables, domains, constraints, curricula)
+    my_problem = TimetablingCSP(variables, domains, constraints, curricula, problem if compact else None)
 
     # try it with min_conflicts
     # print('Solving with min_conflicts')
@@ -248,7 +178,13 @@ def main_func(file_name, output_file=None):
     # sys.exit()
 
     # reset the problem
-    my_problem = TimetablingCSP(variables, domains, constraints, curricula)
+    my_problem = TimetablingCSP(variables, domains, constraints, curricula, problem if compact else None)
+    select_unassigned_variable = csp.first_unassigned_variable
+    inference = csp.no_inference
+    if bitset is not None:
+        my_problem = BitsetTimetablingCSP(variables, domains, constraints, curricula, problem)
+        select_unassigned_variable = csp.mrv
+        inference = bitset_mac if bitset == 'mac' else bitset_forward_checking
 
     # try it with backtracking_search
     # current options for backtracking_search:
@@ -256,12 +192,29 @@ def main_func(file_name, output_file=None):
     #   order_domain_values = [unordered_domain_values, lcv]
     #   inference = [no_inference, forward_checking, mac]
     #
-    print('Solving with backtracking_search')
-    start = timer()
-    solution = csp.backtracking_search(my_problem, select_unassigned_variable=csp.first_unassigned_variable,
-                                       order_domain_values=csp.unordered_domain_values,
-                                       inference=csp.no_inference)
-    end = timer()
+    #   (csp_utils.backtracking_search is the AIMA one with an explicit stack instead of recursion)
+    with instrument, instrument.timer('search'):
+        count_csp_calls(instrument, my_problem)
+        if restarts is not None:
+            print('Solving with restart_search (dom/wdeg, %s restarts)' % restarts)
+            if bitset is None:
+                inference = forward_checking
+            start = timer()
+            solution, stats = restart_search(my_problem, inference=inference, restarts=restarts, max_time=max_time,
+                                             seed=seed)
+            end = timer()
+            print('restarts: %d, fails: %d, nogoods: %d' % (stats['restarts'], stats['fails'], stats['nogoods']))
+        else:
+            print('Solving with backtracking_search')
+            start = timer()
+            solution = backtracking_search(my_problem, select_unassigned_variable=select_unassigned_variable,
+                                           order_domain_values=csp.unordered_domain_values,
+                                           inference=inference)
+            end = timer()
+
+    if solution and compact:
+        # back to {course: (room, TimeSlot)} for the display and the verifier
+        solution = problem.decode_solution(solution)
 
     if solution:
         # display_solution(solution)
@@ -294,17 +247,62 @@ def main_func(file_name, output_file=None):
     solved, solution_score = verify_solution(file_name, solution, verbose=True)
     print('Solution Verified:', solved, ', score:',solution_score)
     print('Solver time:', end - start)
+    instrument.report()
+
+# -------------------------------------------------------------------------------------
+def solve_lectures(file_name, output_file=None, restarts='luby', max_time=None, seed=None, instrument=None):
+    # lecture-level version of main_func
+    instrument = get_instrumentation(instrument)
+    with instrument, instrument.timer('setup'):
+        variables, domains, constraints, groups, time_slots, rooms, students = set_up_lecture_csp(file_name)
+        my_problem = LectureTimetablingCSP(variables, domains, constraints, groups, rooms, students)
+
+    print('Solving %d lectures with restart_search (dom/wdeg, %s restarts)' % (len(variables), restarts))
+    with instrument, instrument.timer('search'):
+        count_csp_calls(instrument, my_problem)
+        start = timer()
+        solution, stats = restart_search(my_problem, order_domain_values=lecture_value_order,
+                                         inference=lecture_forward_checking, restarts=restarts, max_time=max_time,
+                                         seed=seed)
+        end = timer()
+    print('restarts: %d, fails: %d, nogoods: %d' % (stats['restarts'], stats['fails'], stats['nogoods']))
+
+    if solution:
+        display_solution_in_table(solution, time_slots, output_file)
+    else:
+        print('*** NO SOLUTION RETURNED ***')
+        solution = {}
+
+    # run the verifier, and score the timetable with the full ITC objective
+    solved, solution_score = verify_lecture_solution(file_name, solution, verbose=True)
+    scorer = ITCScorer(file_name)
+    breakdown = scorer.evaluate(scorer.encode_solution(solution))
+    print('ITC hard:', ', '.join('%s %d' % (k, breakdown[k]) for k in HARD_COMPONENTS))
+    print('ITC soft:', ', '.join('%s %d' % (k, breakdown[k]) for k in SOFT_COMPONENTS),
+          '(total %d)' % scorer.soft(None, breakdown))
+    print('Solution Verified:', solved, ', score:',solution_score)
+    print('Solver time:', end - start)
+    instrument.report()
+    return solution
 
 # -------------------------------------------------------------------------------------
 if __name__ == "__main__":
-    if len(sys.argv)==2 and os.path.exists(sys.argv[1]):
+    # (and stats, progress[=seconds] or profile[=file] anywhere, see instrumentation.py)
+    sys.argv, instrument = from_args(sys.argv)
+    if len(sys.argv)>=2 and os.path.exists(sys.argv[1]):
         file_name = sys.argv[1]
     else:
         file_name = '../../Data/ITC-2007/comp01.ctt.txt'
+    # optionally 'fc' or 'mac' for backtracking on bitset domains ('list' for the usual domains), then
+    # 'luby' or 'geometric' for restart_search
+    bitset = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != 'list' else None
+    restarts = sys.argv[3] if len(sys.argv) > 3 else None
+    # and 'lectures' to schedule every lecture rather than one per course
+    lectures = len(sys.argv) > 4 and sys.argv[4] == 'lectures'
     # file_name = '../../Data/ITC-2007/toy_prob.ctt.txt'
 
     # if you want to generate an output file of the schedule
     # output_file = '/Users/brucks/Desktop/baseline_comp01.txt'
     output_file = None  # if not
 
-    main_func(file_name, output_file)
+    main_func(file_name, output_file, bitset=bitset, restarts=restarts, lectures=lectures, instrument=instrument)
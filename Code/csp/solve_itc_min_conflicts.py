@@ -0,0 +1,62 @@
+# solve_itc_min_conflicts.py: This python script solves an ITC-2007 Course Timetabling Problem as a CSP with
+#                             min-conflicts local search (see min_conflicts.py): start from a complete assignment and
+#                             keep moving a conflicted course to its least conflicting value, with a tabu list and a
+#                             bit of random walk, until there are no conflicts or the step / time budget runs out.
+#
+#                             usage: python solve_itc_min_conflicts.py [file] [max seconds] [seed]
+
+
+# import standard packages
+import os
+import sys
+
+# set the path and import our code
+sys.path.append("../aima")
+sys.path.append("../utils")
+from csp_utils import display_solution_in_table
+from itc_instance import get_instance
+from min_conflicts import min_conflicts
+from verify_solution import verify_solution
+
+# -------------------------------------------------------------------------------------
+def main_func(file_name, output_file=None, max_steps=100000, max_time=10, tabu_tenure=10, random_walk=0.02,
+              seed=None):
+
+    # Read in the ITC data file and set up the integer-encoded problem
+    instance = get_instance(file_name)
+    problem = instance.problem
+
+    print('Solving with min_conflicts')
+    values, n_conflicts, stats = min_conflicts(problem, max_steps=max_steps, max_time=max_time,
+                                               tabu_tenure=tabu_tenure, random_walk=random_walk, seed=seed)
+    print('conflicts: %d after %d steps (best at step %d)' % (n_conflicts, stats['steps'], stats['best_step']))
+
+    # back to {course: (room, TimeSlot)} for the display and the verifier
+    solution = problem.decode_solution(values)
+    if n_conflicts == 0:
+        display_solution_in_table(solution, problem.time_slots, output_file)
+    else:
+        print('*** NO SOLUTION FOUND ***')
+
+    # run the verifier
+    solved, solution_score = verify_solution(instance, solution, verbose=True)
+    print('Solution Verified:', solved, ', score:', solution_score)
+    print('Solver time:', stats['time'])
+    return solution if n_conflicts == 0 else None
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    file_name = '../../Data/ITC-2007/comp01.ctt.txt'
+    max_time = 10
+    seed = None
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        file_name = sys.argv[1]
+    if len(sys.argv) > 2:
+        max_time = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        seed = int(sys.argv[3])
+
+    # if you want to generate an output file of the schedule
+    output_file = None  # if not
+
+    main_func(file_name, output_file, max_time=max_time, seed=seed)
@@ -0,0 +1,286 @@
+# solve_itc_portfolio.py: This python script runs a portfolio of solvers on an ITC-2007 Course Timetabling Problem at
+#                         the same time: backtracking variants (see conflict_directed.py and bitset_csp.py),
+#                         min-conflicts, the GA and random restarts of min-conflicts, each with several seeds, in a
+#                         pool of worker processes. The first valid solution wins (or the one with the fewest
+#                         conflicts when the time is up); the other workers are told to stop through a shared event and hand in what they
+#                         have. A solution is valid if it meets the hard constraints of the CSP (see
+#                         verify_solution.population_csp_conflicts), not just if it scores 0.
+#
+#                         Every worker reports its time to solution, so the mix can be tuned.
+#
+#                         usage: python solve_itc_portfolio.py [file] [max seconds] [number of seeds] [workers]
+#                                                              [solver,solver,...]
+
+
+# import standard packages
+import multiprocessing
+import os
+import queue
+import random
+import sys
+from timeit import default_timer as timer
+import numpy as np
+
+# set the path and import our code
+sys.path.append("../aima")
+sys.path.append("../utils")
+sys.path.append("../ga")
+from bitset_csp import BitsetTimetablingCSP, bitset_forward_checking, bitset_mac
+from conflict_directed import restart_search
+from csp_utils import forward_checking, display_solution_in_table
+from itc_ga_framework import init_population_encoded, genetic_algorithm
+from itc_instance import get_instance
+from min_conflicts import min_conflicts
+from solve_itc_baseline_csp import set_up_csp, set_up_compact_csp
+from timetabling_csp import TimetablingCSP
+from verify_solution import verify_solution, fitness_function_encoded, count_csp_conflicts, population_csp_conflicts
+
+# -------------------------------------------------------------------------------------
+# the solvers: function(file_name, seed, max_time, stop, stats=None) that returns an encoded assignment (or None);
+# if stats is a dict the solver adds its search counters to it (see benchmark_solvers.py)
+
+def _search_stats(stats, my_problem, search_stats):
+    # the counters of a restart_search run
+    if stats is not None:
+        stats.update(nassigns=my_problem.nassigns, num_unassigns=my_problem.num_unassigns,
+                     restarts=search_stats['restarts'], fails=search_stats['fails'], nogoods=search_stats['nogoods'])
+
+def solve_backtracking(file_name, seed, max_time, stop, stats=None):
+    # restart_search (dom/wdeg, Luby restarts) with forward checking on the usual (room, TimeSlot) domains
+    variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
+    my_problem = TimetablingCSP(variables, domains, constraints, curricula)
+    solution, search_stats = restart_search(my_problem, inference=forward_checking, restarts='luby',
+                                            max_time=max_time, seed=seed, stop=stop)
+    _search_stats(stats, my_problem, search_stats)
+    if solution is None:
+        return None
+    return get_instance(file_name).problem.encode_solution(solution)
+
+def _solve_bitset(file_name, seed, max_time, stop, stats, inference, restarts):
+    variables, domains, constraints, curricula, time_slots, problem = set_up_compact_csp(file_name)
+    my_problem = BitsetTimetablingCSP(variables, domains, constraints, curricula, problem)
+    solution, search_stats = restart_search(my_problem, inference=inference, restarts=restarts, max_time=max_time,
+                                            seed=seed, stop=stop)
+    _search_stats(stats, my_problem, search_stats)
+    if solution is None:
+        return None
+    return problem.assignment_array(solution)
+
+def solve_bitset_fc(file_name, seed, max_time, stop, stats=None):
+    # restart_search with forward checking on bitset domains, Luby restarts
+    return _solve_bitset(file_name, seed, max_time, stop, stats, bitset_forward_checking, 'luby')
+
+def solve_bitset_mac(file_name, seed, max_time, stop, stats=None):
+    # restart_search with MAC on bitset domains, geometric restarts
+    return _solve_bitset(file_name, seed, max_time, stop, stats, bitset_mac, 'geometric')
+
+def solve_min_conflicts(file_name, seed, max_time, stop, stats=None):
+    problem = get_instance(file_name).problem
+    values, total, search_stats = min_conflicts(problem, max_steps=10 ** 9, max_time=max_time, seed=seed, stop=stop)
+    if stats is not None:
+        stats.update(steps=search_stats['steps'])
+    return values
+
+def solve_ga(file_name, seed, max_time, stop, stats=None, n_individuals=200, pmut=0.1):
+    # the GA runs until it finds a valid timetable (no CSP conflicts, the fitness is minus their number), the time is
+    # up or it is stopped
+    problem = get_instance(file_name).problem
+    random.seed(seed)
+    np.random.seed(seed)
+    population = init_population_encoded(n_individuals, problem)
+    course_domains = [problem.domain_values(c) for c in problem.course_names]
+    result, ga_stats = genetic_algorithm(population, lambda p: -population_csp_conflicts(problem, p), course_domains,
+                                         ngen=10 ** 9, f_thres=0, pmut=pmut, vectorized=True, stop=stop,
+                                         verbose=False, max_time=max_time)
+    if stats is not None:
+        stats.update(generations=len(ga_stats), evaluations=len(ga_stats) * n_individuals)
+    return result
+
+def solve_random(file_name, seed, max_time, stop, stats=None, restart_steps=2000):
+    # random restarts: short min-conflicts runs, each from a fresh random assignment, keeping the best
+    problem = get_instance(file_name).problem
+    rng = np.random.default_rng(seed)
+    start = timer()
+    best, best_total = None, None
+    restarts = steps = 0
+    while best_total is None or best_total > 0:
+        time_left = max_time - (timer() - start)
+        if (stop is not None and stop.is_set()) or time_left <= 0:
+            break
+        initial = problem.random_assignments(1, rng)[0]
+        values, total, search_stats = min_conflicts(problem, max_steps=restart_steps, max_time=time_left,
+                                                    seed=int(rng.integers(2 ** 31)), initial=initial, stop=stop)
+        restarts += 1
+        steps += search_stats['steps']
+        if best_total is None or total < best_total:
+            best, best_total = values, total
+    if stats is not None:
+        stats.update(restarts=restarts, steps=steps)
+    return best
+
+SOLVERS = {'backtracking': solve_backtracking,
+           'bitset-fc': solve_bitset_fc,
+           'bitset-mac': solve_bitset_mac,
+           'min-conflicts': solve_min_conflicts,
+           'ga': solve_ga,
+           'random': solve_random}
+
+# -------------------------------------------------------------------------------------
+def portfolio_worker(index, file_name, solver, seed, max_time, stop, results):
+    """Runs one solver (in its own process) and puts its report on results"""
+    start = timer()
+    report = {'worker': index, 'solver': solver, 'seed': seed, 'values': None, 'score': None, 'conflicts': None,
+              'solved': False, 'error': None}
+    try:
+        values = SOLVERS[solver](file_name, seed, max_time, stop)
+        if values is not None:
+            values = np.asarray(values, dtype=np.int64)
+            report['values'] = values
+            problem = get_instance(file_name).problem
+            report['score'] = fitness_function_encoded(problem, values)
+            report['conflicts'] = count_csp_conflicts(problem, values)
+            report['solved'] = report['conflicts'] == 0
+    except Exception as e:
+        report['error'] = repr(e)
+    report['time'] = timer() - start
+    results.put(report)
+
+def run_portfolio(file_name, solvers=None, seeds=(1,), max_time=60, n_workers=None, grace=5.0):
+    """ Runs every solver with every seed, at most n_workers at a time, until one finds a valid solution or max_time
+        is up; then the others are stopped (and terminated if they don't report back within grace seconds)
+
+    :param file_name:  path to the ITC data file
+    :param solvers:  names of the SOLVERS to run (all of them if None)
+    :param seeds:  the seeds to run each solver with
+    :param max_time:  wall-clock budget in seconds
+    :param n_workers:  number of worker processes (os.cpu_count() if None)
+    :param grace:  seconds the workers get to hand in their best so far once they are told to stop
+    :return:  (the winning report, or None if no worker returned an assignment, the list of all the reports); a
+              report is a dict with the worker, solver, seed, values (encoded assignment), score, conflicts (the CSP
+              constraints it breaks, see population_csp_conflicts), solved (no conflicts), time, time_to_solution
+              (None if it didn't solve it) and error
+    """
+    solvers = list(SOLVERS) if solvers is None else list(solvers)
+    for solver in solvers:
+        if solver not in SOLVERS:
+            raise ValueError('unknown solver %r, use some of %s' % (solver, ', '.join(SOLVERS)))
+    n_workers = n_workers or os.cpu_count()
+    # parse the file (and build the CompactProblem) once here so forked workers start with it
+    get_instance(file_name).problem
+
+    jobs = [(solver, seed) for seed in seeds for solver in solvers]
+    deadline = timer() + max_time
+    stop = multiprocessing.Event()
+    stop_time = None
+    results = multiprocessing.Queue()
+    running = {}
+    reports = []
+    winner = None
+    try:
+        while (jobs and stop_time is None) or running:
+            # start workers while there is room
+            while jobs and stop_time is None and len(running) < n_workers:
+                index = len(reports) + len(running)
+                solver, seed = jobs.pop(0)
+                worker = multiprocessing.Process(target=portfolio_worker,
+                                                 args=(index, file_name, solver, seed, deadline - timer(), stop,
+                                                       results))
+                worker.start()
+                running[index] = (worker, solver, seed, timer())
+
+            now = timer()
+            if stop_time is None and now > deadline:
+                stop.set()
+                stop_time = now
+            if stop_time is not None and now - stop_time > grace:
+                # give up on the workers that haven't reported back
+                for index, (worker, solver, seed, started) in running.items():
+                    worker.terminate()
+                    worker.join()
+                    reports.append({'worker': index, 'solver': solver, 'seed': seed, 'values': None, 'score': None,
+                                    'conflicts': None, 'solved': False, 'error': 'terminated', 'time': now - started,
+                                    'time_to_solution': None})
+                running.clear()
+                break
+
+            try:
+                report = results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            running.pop(report['worker'])[0].join()
+            report['time_to_solution'] = report['time'] if report['solved'] else None
+            reports.append(report)
+            if report['solved'] and winner is None:
+                # the first valid solution wins: tell the others to stop
+                winner = report
+                stop.set()
+                stop_time = timer()
+    finally:
+        stop.set()
+        for worker, solver, seed, started in running.values():
+            worker.terminate()
+
+    if winner is None:
+        scored = [r for r in reports if r['score'] is not None]
+        winner = max(scored, key=lambda r: (-r['conflicts'], r['score'])) if scored else None
+    reports.sort(key=lambda r: r['worker'])
+    return winner, reports
+
+def print_report(reports):
+    # one line per worker: how well and how fast it did
+    print('%-6s %-14s %-6s %-8s %-9s %-10s %-10s %s' % ('worker', 'solver', 'seed', 'score', 'conflicts', 'time',
+                                                        'to solve', 'note'))
+    for r in reports:
+        score = '-' if r['score'] is None else '%g' % r['score']
+        conflicts = '-' if r['conflicts'] is None else '%d' % r['conflicts']
+        to_solve = '-' if r['time_to_solution'] is None else '%.2fs' % r['time_to_solution']
+        print('%-6d %-14s %-6s %-8s %-9s %-10s %-10s %s' % (r['worker'], r['solver'], r['seed'], score, conflicts,
+                                                            '%.2fs' % r['time'], to_solve, r['error'] or ''))
+
+# -------------------------------------------------------------------------------------
+def main_func(file_name, output_file=None, max_time=60, n_seeds=1, n_workers=None, solvers=None):
+
+    print('Solving with a portfolio of %s, %d seed(s) each' % (', '.join(solvers or SOLVERS), n_seeds))
+    start = timer()
+    winner, reports = run_portfolio(file_name, solvers, seeds=range(1, n_seeds + 1), max_time=max_time,
+                                    n_workers=n_workers)
+    end = timer()
+    print_report(reports)
+    if winner is None:
+        print('*** NO SOLUTION RETURNED ***')
+        return None
+    print('winner: %s (seed %s), score %g' % (winner['solver'], winner['seed'], winner['score']))
+
+    # back to {course: (room, TimeSlot)} for the display and the verifier
+    instance = get_instance(file_name)
+    solution = instance.problem.decode_solution(winner['values'])
+    display_solution_in_table(solution, instance.problem.time_slots, output_file)
+
+    # run the verifier
+    solved, solution_score = verify_solution(instance, solution, verbose=True)
+    print('Solution Verified:', solved, ', score:', solution_score)
+    print('Solver time:', end - start)
+    return solution
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    file_name = '../../Data/ITC-2007/comp01.ctt.txt'
+    max_time = 60
+    n_seeds = 1
+    n_workers = None
+    solvers = None
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        file_name = sys.argv[1]
+    if len(sys.argv) > 2:
+        max_time = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        n_seeds = int(sys.argv[3])
+    if len(sys.argv) > 4:
+        n_workers = int(sys.argv[4])
+    if len(sys.argv) > 5:
+        solvers = sys.argv[5].split(',')
+
+    # if you want to generate an output file of the schedule
+    output_file = None  # if not
+
+    main_func(file_name, output_file, max_time, n_seeds, n_workers, solvers)
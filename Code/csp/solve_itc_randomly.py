@@ -14,26 +14,33 @@ import numpy as np
 import sys
 
 # set the path and import our code
+sys.path.append("../aima")
 sys.path.append("../utils")
 from csp_utils import display_solution, display_solution_in_table
+from instrumentation import from_args, get_instrumentation
 from solve_itc_baseline_csp import set_up_csp
 from verify_solution import verify_solution
 
 # -------------------------------------------------------------------------------------
-def main_func(file_name, output_file=None):
+def main_func(file_name, output_file=None, instrument=None):
+    # instrument: an Instrumentation to report the run through (see instrumentation.py)
+    instrument = get_instrumentation(instrument)
 
     # Read in the ITC data file and do the pre-process necessary to convert the raw data into
     # variables, domains and constraints
-    variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
+    with instrument, instrument.timer('setup'):
+        variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
 
     # -------------------------------------------------------------------------------------
     # generate a random solution, which should fail but will help for testing the verifier
     # np.random.seed(0)
-    solution = {}
-    for v in variables:
-        # randomly choose an assignment from this variable's domain
-        ind = np.random.choice(len(domains[v]))
-        solution[v] = domains[v][ind]
+    with instrument, instrument.timer('search'):
+        solution = {}
+        for v in variables:
+            # randomly choose an assignment from this variable's domain
+            ind = np.random.choice(len(domains[v]))
+            solution[v] = domains[v][ind]
+        instrument.count('random_assignments')
 
     if solution:
         # display_solution(solution)
@@ -42,11 +49,16 @@ def main_func(file_name, output_file=None):
         print('*** NO SOLUTION RETURNED ***')
 
     # run the verifier
-    solved, solution_score = verify_solution(file_name, solution, verbose=True)
+    with instrument, instrument.timer('verify'):
+        solved, solution_score = verify_solution(file_name, solution, verbose=True)
+        instrument.count('fitness_evaluations')
     print('Solution Verified:', solved, ', score:',solution_score)
+    instrument.report()
 
 # -------------------------------------------------------------------------------------
 if __name__ == "__main__":
+    # (stats, progress[=seconds] or profile[=file] on the command line, see instrumentation.py)
+    sys.argv, instrument = from_args(sys.argv)
     file_name = '../../Data/ITC-2007/comp03.ctt.txt'
     # file_name = '../../Data/ITC-2007/toy_prob.ctt.txt'
 
@@ -54,4 +66,4 @@ if __name__ == "__main__":
     # output_file = '/Users/brucks/Desktop/random_comp01.txt'
     output_file = None  # if not
 
-    main_func(file_name, output_file)
+    main_func(file_name, output_file, instrument)
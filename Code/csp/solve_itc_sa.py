@@ -0,0 +1,79 @@
+# solve_itc_sa.py: This python script solves an ITC-2007 Course Timetabling Problem with simulated annealing over the
+#                  Move (a course to a new room / timeslot) and Swap (two courses exchange assignments) neighbourhoods,
+#                  scoring each step with the delta evaluation of IncrementalScorer (see local_search.py).
+#
+#                  usage: python solve_itc_sa.py [file] [max seconds] [exp|geometric|linear] [seed] [checkpoint file]
+
+
+# import standard packages
+import os
+import sys
+
+# set the path and import our code
+sys.path.append("../aima")
+sys.path.append("../utils")
+from csp_utils import display_solution_in_table, write_solution
+from itc_instance import get_instance
+from local_search import simulated_annealing, make_schedule
+from verify_solution import verify_solution
+
+# default parameters of each cooling schedule
+SCHEDULES = {'exp': dict(k=2, lam=5e-5, limit=200000),
+             'geometric': dict(t0=2.0, alpha=0.999, steps_per_temp=10, t_min=1e-3),
+             'linear': dict(t0=2.0, limit=200000)}
+
+# -------------------------------------------------------------------------------------
+def save_checkpoint(problem, checkpoint_file):
+    # returns a checkpoint function for simulated_annealing that writes the best solution so far to checkpoint_file
+    def checkpoint(best_values, best_score, step, elapsed):
+        write_solution(problem.decode_solution(best_values), checkpoint_file)
+        print('checkpoint: score %g at step %d (%.1fs)' % (best_score, step, elapsed))
+    return checkpoint
+
+# -------------------------------------------------------------------------------------
+def main_func(file_name, output_file=None, max_time=60, schedule='exp', seed=None, checkpoint_file=None,
+              swap_prob=0.5, checkpoint_interval=5.0):
+
+    # Read in the ITC data file and set up the integer-encoded problem
+    instance = get_instance(file_name)
+    problem = instance.problem
+
+    print('Solving with simulated annealing (%s schedule)' % schedule)
+    checkpoint = save_checkpoint(problem, checkpoint_file) if checkpoint_file else None
+    values, score, stats = simulated_annealing(problem, make_schedule(schedule, **SCHEDULES[schedule]),
+                                               max_time=max_time, swap_prob=swap_prob, seed=seed,
+                                               checkpoint=checkpoint, checkpoint_interval=checkpoint_interval)
+    print('best score: %g after %d steps (best at step %d)' % (score, stats['steps'], stats['best_step']))
+
+    # back to {course: (room, TimeSlot)} for the display and the verifier
+    solution = problem.decode_solution(values)
+    display_solution_in_table(solution, problem.time_slots, output_file)
+
+    # run the verifier
+    solved, solution_score = verify_solution(instance, solution, verbose=True)
+    print('Solution Verified:', solved, ', score:', solution_score)
+    print('Solver time:', stats['time'])
+    return solution
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    file_name = '../../Data/ITC-2007/comp01.ctt.txt'
+    max_time = 60
+    schedule = 'exp'
+    seed = None
+    checkpoint_file = None
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        file_name = sys.argv[1]
+    if len(sys.argv) > 2:
+        max_time = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        schedule = sys.argv[3]
+    if len(sys.argv) > 4:
+        seed = int(sys.argv[4])
+    if len(sys.argv) > 5:
+        checkpoint_file = sys.argv[5]
+
+    # if you want to generate an output file of the schedule
+    output_file = None  # if not
+
+    main_func(file_name, output_file, max_time, schedule, seed, checkpoint_file)
@@ -0,0 +1,68 @@
+# solve_itc_tabu.py: This python script solves an ITC-2007 Course Timetabling Problem with tabu search over the
+#                    Move (a course to a new room / timeslot) and Swap (two courses exchange assignments)
+#                    neighbourhoods, scoring the candidates with the delta evaluation of IncrementalScorer (see
+#                    local_search.py).
+#
+#                    usage: python solve_itc_tabu.py [file] [max seconds] [tenure] [seed] [checkpoint file]
+
+
+# import standard packages
+import os
+import sys
+
+# set the path and import our code
+sys.path.append("../aima")
+sys.path.append("../utils")
+from csp_utils import display_solution_in_table
+from itc_instance import get_instance
+from local_search import tabu_search
+from solve_itc_sa import save_checkpoint
+from verify_solution import verify_solution
+
+# -------------------------------------------------------------------------------------
+def main_func(file_name, output_file=None, max_time=60, tenure=20, seed=None, checkpoint_file=None,
+              n_candidates=50, swap_prob=0.5, checkpoint_interval=5.0):
+
+    # Read in the ITC data file and set up the integer-encoded problem
+    instance = get_instance(file_name)
+    problem = instance.problem
+
+    print('Solving with tabu search (tenure %d)' % tenure)
+    checkpoint = save_checkpoint(problem, checkpoint_file) if checkpoint_file else None
+    values, score, stats = tabu_search(problem, tenure=tenure, n_candidates=n_candidates, max_time=max_time,
+                                       swap_prob=swap_prob, seed=seed, checkpoint=checkpoint,
+                                       checkpoint_interval=checkpoint_interval)
+    print('best score: %g after %d steps (best at step %d)' % (score, stats['steps'], stats['best_step']))
+
+    # back to {course: (room, TimeSlot)} for the display and the verifier
+    solution = problem.decode_solution(values)
+    display_solution_in_table(solution, problem.time_slots, output_file)
+
+    # run the verifier
+    solved, solution_score = verify_solution(instance, solution, verbose=True)
+    print('Solution Verified:', solved, ', score:', solution_score)
+    print('Solver time:', stats['time'])
+    return solution
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    file_name = '../../Data/ITC-2007/comp01.ctt.txt'
+    max_time = 60
+    tenure = 20
+    seed = None
+    checkpoint_file = None
+    if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
+        file_name = sys.argv[1]
+    if len(sys.argv) > 2:
+        max_time = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        tenure = int(sys.argv[3])
+    if len(sys.argv) > 4:
+        seed = int(sys.argv[4])
+    if len(sys.argv) > 5:
+        checkpoint_file = sys.argv[5]
+
+    # if you want to generate an output file of the schedule
+    output_file = None  # if not
+
+    main_func(file_name, output_file, max_time, tenure, seed, checkpoint_file)
@@ -3,12 +3,16 @@
 
 
 import sys
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
 from collections import deque
 from collections import OrderedDict 
+from timeit import default_timer as timer
 import numpy
-from itertools import islice, chain
 
 from utils import *
+from verify_solution import population_fitness
 
 def genetic_search(problem, ngen=1000, pmut=0.1, n=20):
     """Call genetic_algorithm on the appropriate parts of a problem.
@@ -25,69 +29,115 @@ def genetic_search(problem, ngen=1000, pmut=0.1, n=20):
 
 
 def genetic_algorithm(population, fitness_fn, domains,
- f_thres=None, ngen=1000, pmut=0.1):
-    """[Figure 4.8]"""
+ f_thres=None, ngen=1000, pmut=0.1, vectorized=False, stop=None, verbose=True, max_time=None):
+    """[Figure 4.8]
+    The individuals are fixed-order int arrays (one encoded value per course, in course id order, see
+    compact_problem.py) and population is a (individuals x courses) array of them, e.g. from init_population_encoded;
+    domains is a list (by course id) of the values allowed for each course. Each generation is bred into a second,
+    preallocated buffer with slice copies and in-place mutation, and the two buffers are swapped.
+    If vectorized is True, fitness_fn is called once per generation with the whole population and must return the
+    sequence of fitnesses (e.g. verify_solution.population_fitness) instead of being mapped over the individuals.
+    stop is an optional event (e.g. multiprocessing.Event): once it is set the GA returns the best of the current
+    generation, and so it does once max_time seconds (if given) have gone by. verbose=False turns off the
+    per-generation stats printout."""
+    def evaluate(population):
+        if vectorized:
+            return numpy.asarray(fitness_fn(population)).tolist()
+        return list(map(fitness_fn, population))
+
+    population = numpy.array(population, dtype=numpy.int64)
+    children = numpy.empty_like(population)
+
     stats = []
+    start = timer()
+    i = -1
     for i in range(ngen):
-        fitnesses = list(map(fitness_fn, population))
+        fitnesses = evaluate(population)
         maxfit=max(fitnesses)
         stats.append({'generation':i,'mean':mean(fitnesses),'max':maxfit,'min':min(fitnesses)})
-        print('Fitness Stats '+str(stats[-1]))
+        if verbose:
+            print('Fitness Stats '+str(stats[-1]))
         
-        if f_thres != None and maxfit >= f_thres:
-            return population[fitnesses.index(maxfit)], stats
+        if (f_thres != None and maxfit >= f_thres) or (stop is not None and stop.is_set()) or \
+                (max_time is not None and timer() - start > max_time):
+            return population[fitnesses.index(maxfit)].copy(), stats
         
-        population = [mutate(recombine(*select(2, population, fitnesses)), domains, pmut)
-                      for i in range(len(population))]
+        breed(population, fitnesses, domains, pmut, children)
+        population, children = children, population
 
     #Log final generation's stats
-    fitness = list(map(fitness_fn, population))
+    fitness = evaluate(population)
     maxfitness=max(fitness)
     stats.append({'generation':i+1,'mean':mean(fitness),'max':max(fitness),'min':min(fitness)})
-    print('Fitness Stats '+str(stats[-1]))
+    if verbose:
+        print('Fitness Stats '+str(stats[-1]))
     
-    return population[fitness.index(maxfitness)], stats
+    return population[fitness.index(maxfitness)].copy(), stats
+
+
+def breed(population, fitnesses, domains, pmut, children):
+    """Fills the preallocated children array (same shape as population) with the next generation: each child is a
+    crossover of two parents chosen in proportion to their fitness, then (maybe) mutated in place"""
+    sampler = weighted_sampler(range(len(population)), selection_weights(fitnesses))
+    for k in range(len(children)):
+        child = children[k]
+        recombine(population[sampler()], population[sampler()], child)
+        mutate(child, domains, pmut)
+    return children
 
 
 def init_population(pop_number, variables, domains):
-    """Initializes population for genetic algorithm
+    """Initializes population for genetic algorithm as dicts of {course: value} (in the order of variables); the
+    GA itself works on arrays, see init_population_encoded
     pop_number  :  Number of individuals in population
     gene_pool   :  List of possible values for individuals
     """
     population = []
     for i in range(pop_number):
-        new_individual = {}
+        new_individual = OrderedDict()
         for v in variables:
             # randomly choose an assignment from this variable's domain
             ind = np.random.choice(len(domains[v]))
             new_individual[v] = domains[v][ind]
-        population.append(OrderedDict(sorted(new_individual.items())) )
+        population.append(new_individual)
 
     return population
 
 
-def select(r, population, fitnesses):
-    
+def init_population_encoded(pop_number, problem):
+    """Initializes an encoded population, a (pop_number x courses) int array
+    pop_number  :  Number of individuals in population
+    problem     :  CompactProblem the individuals are encoded against
+    """
+    columns = [numpy.random.choice(problem.domain_values(c), pop_number) for c in problem.course_names]
+    return numpy.column_stack(columns).astype(numpy.int64)
+
+
+def selection_weights(fitnesses):
     #We need to normalize the fitness scores for the weighted_sampler function.
     minFitness = min(fitnesses)
     zeroAdjusted = list(map(lambda x : x + abs(minFitness), fitnesses))
     normalizationFactor = numpy.linalg.norm(zeroAdjusted)
     if normalizationFactor == 0:
-        normalFitnesses = zeroAdjusted
-    else:
-        normalFitnesses = zeroAdjusted/normalizationFactor
-    
-    sampler = weighted_sampler(population, normalFitnesses)
+        # every individual is as fit as the others, so pick uniformly
+        return [1] * len(fitnesses)
+    return zeroAdjusted/normalizationFactor
+
+
+def select(r, population, fitnesses):
+    sampler = weighted_sampler(population, selection_weights(fitnesses))
     return [sampler() for i in range(r)]
 
 
-def recombine(x, y):
+def recombine(x, y, child=None):
+    """One point crossover of two array individuals, written into child (a new array if not given)"""
     n = len(x)
     c = random.randrange(0, n)
-    return OrderedDict(
-        chain(
-            islice(x.items(), c),
-            islice(y.items(), c, len(y))))
+    if child is None:
+        child = numpy.empty_like(x)
+    child[:c] = x[:c]
+    child[c:] = y[c:]
+    return child
 
 
 def recombine_uniform(x, y):
@@ -101,19 +151,220 @@ def recombine_uniform(x, y):
     return ''.join(str(r) for r in result)
 
 def mutate(class_set, domains, pmut):
+    """Mutates the array individual class_set in place; domains is a list (by course id) of the allowed values"""
     if random.uniform(0, 1) >= pmut:
         return class_set
     
     class_index = random.randint(0, len(class_set)-1)
-    old_gene = list(class_set.items())[class_index]
-    class_name = old_gene[0]
-    new_gene = {class_name:random.choice(domains[class_name])}
-    
-    #print('Original: '+str(old_gene))
-    #print('Mutated: '+str(new_gene))
-    
-    return OrderedDict(
-        chain(
-            islice(class_set.items(), class_index),
-            new_gene.items(),
-            islice(class_set.items(), class_index + 1, len(class_set))))
\ No newline at end of file
+    class_set[class_index] = random.choice(domains[class_index])
+    return class_set
+
+
+# ______________________________________________________________________________
+# Island model: N sub-populations evolve in separate processes and every migration_interval generations each
+# island sends copies of its best individuals to its neighbours (the next island for a 'ring', every other island
+# for 'full'), where they replace the worst individuals. The problem arrays are put in shared memory once, so the
+# only thing that is pickled after start-up is the migrants.
+
+# the CompactProblem arrays the islands need to score and mutate individuals
+SHARED_PROBLEM_ARRAYS = ['capacity', 'enrollment', 'slot_overlap', 'domain_mask']
+
+
+def share_problem(problem):
+    """Copies the arrays the GA needs from a CompactProblem into shared memory.
+    Returns (blocks, spec): spec is what SharedProblem needs to attach to them, and the caller owns the blocks
+    (close and unlink them when the islands are done)."""
+    arrays = {name: getattr(problem, name) for name in SHARED_PROBLEM_ARRAYS}
+    arrays['pair_i'], arrays['pair_j'] = problem.curriculum_pairs
+    blocks = []
+    spec = {'n_courses': problem.n_courses, 'n_slots': problem.n_slots, 'arrays': {}}
+    for name, a in arrays.items():
+        a = numpy.ascontiguousarray(a)
+        block = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+        numpy.ndarray(a.shape, dtype=a.dtype, buffer=block.buf)[...] = a
+        blocks.append(block)
+        spec['arrays'][name] = (block.name, a.shape, a.dtype.str)
+    return blocks, spec
+
+
+class SharedProblem():
+    """The parts of a CompactProblem used by population_fitness() and mutate(), as views on the shared memory
+    made by share_problem()"""
+
+    def __init__(self, spec):
+        self.n_courses = spec['n_courses']
+        self.n_slots = spec['n_slots']
+        self.blocks = []
+        for name, (block_name, shape, dtype) in spec['arrays'].items():
+            block = shared_memory.SharedMemory(name=block_name)
+            self.blocks.append(block)
+            setattr(self, name, numpy.ndarray(shape, dtype=dtype, buffer=block.buf))
+        self.curriculum_pairs = (self.pair_i, self.pair_j)
+        self.domains = [numpy.flatnonzero(row) for row in self.domain_mask]
+
+
+def island_neighbors(n_islands, topology):
+    """Returns a list (by island) of the islands it sends migrants to"""
+    if topology == 'ring':
+        return [[(i + 1) % n_islands] if n_islands > 1 else [] for i in range(n_islands)]
+    if topology == 'full':
+        return [[j for j in range(n_islands) if j != i] for i in range(n_islands)]
+    raise ValueError('unknown island topology: %s' % topology)
+
+
+def migrate(population, fitnesses, n_migrants, inbox, outboxes, n_sources, stop):
+    """Sends the best n_migrants to every outbox and replaces the worst individuals with the ones received from the
+    n_sources islands that send to this one (gives up waiting if the stop event is set)"""
+    order = numpy.argsort(fitnesses)
+    migrants = population[order[-n_migrants:]].copy()
+    for outbox in outboxes:
+        outbox.put(migrants)
+
+    received = []
+    while len(received) < n_sources and not stop.is_set():
+        try:
+            received.append(inbox.get(timeout=0.1))
+        except queue.Empty:
+            continue
+    if received:
+        incoming = numpy.concatenate(received)[:len(population)]
+        population[order[:len(incoming)]] = incoming
+    return population
+
+
+def island_worker(index, spec, population, config, inbox, outboxes, n_sources, stop, results):
+    """Runs one island (in its own process) and puts (index, best individual, best fitness, stats, error) on results;
+    if it fails, error is the exception (repr) and the stop event is set so the other islands don't wait for its
+    migrants"""
+    try:
+        best, best_fitness, stats = run_island(index, spec, population, config, inbox, outboxes, n_sources, stop)
+    except Exception as e:
+        stop.set()
+        results.put((index, None, None, None, repr(e)))
+        return
+    results.put((index, best, best_fitness, stats, None))
+
+
+def run_island(index, spec, population, config, inbox, outboxes, n_sources, stop):
+    """The body of island_worker: evolves one island and returns (best individual, best fitness, stats)"""
+    for outbox in outboxes:
+        # don't hang on exit because of migrants that a finished island will never read
+        outbox.cancel_join_thread()
+    if config['seed'] is not None:
+        random.seed(config['seed'] + index)
+        numpy.random.seed(config['seed'] + index)
+    problem = SharedProblem(spec)
+    f_thres = config['f_thres']
+    interval = config['migration_interval']
+
+    population = numpy.array(population, dtype=numpy.int64)
+    children = numpy.empty_like(population)
+
+    stats = []
+    best, best_fitness = None, None
+    for i in range(config['ngen'] + 1):
+        fitnesses = population_fitness(problem, population)
+        maxfit = fitnesses.max()
+        stats.append({'generation': i, 'mean': float(fitnesses.mean()), 'max': float(maxfit),
+                      'min': float(fitnesses.min())})
+        if best_fitness is None or maxfit > best_fitness:
+            best, best_fitness = population[fitnesses.argmax()].copy(), float(maxfit)
+
+        if (f_thres != None and maxfit >= f_thres) or stop.is_set() or i == config['ngen']:
+            if f_thres != None and maxfit >= f_thres:
+                stop.set()
+            break
+
+        if interval and (i + 1) % interval == 0:
+            print('Island %d Fitness Stats %s' % (index, str(stats[-1])))
+            population = migrate(population, fitnesses, config['n_migrants'], inbox, outboxes, n_sources, stop)
+            fitnesses = population_fitness(problem, population)
+
+        breed(population, fitnesses, problem.domains, config['pmut'], children)
+        population, children = children, population
+
+    return best, best_fitness, stats
+
+
+def collect_island_results(workers, results, stop, poll=0.1, grace=1.0):
+    """Waits for the result of every island worker; if one fails (reports an error, or dies without a result) the
+    others are stopped and terminated and a RuntimeError is raised"""
+    island_results = {}
+    while len(island_results) < len(workers):
+        try:
+            index, best, best_fitness, stats, error = results.get(timeout=poll)
+        except queue.Empty:
+            dead = [i for i, w in enumerate(workers) if i not in island_results and w.exitcode is not None]
+            if not dead:
+                continue
+            # a result put just before the worker exited may still be on its way
+            try:
+                index, best, best_fitness, stats, error = results.get(timeout=grace)
+            except queue.Empty:
+                index, error = dead[0], 'exited with code %s' % workers[dead[0]].exitcode
+        if error is not None:
+            stop.set()
+            for w in workers:
+                w.terminate()
+                w.join()
+            raise RuntimeError('island %d failed: %s' % (index, error))
+        island_results[index] = (index, best, best_fitness, stats)
+    return [island_results[i] for i in range(len(workers))]
+
+
+def island_genetic_algorithm(problem, populations, f_thres=None, ngen=1000, pmut=0.1, migration_interval=25,
+                             n_migrants=2, topology='ring', seed=None):
+    """Island-model version of genetic_algorithm() over encoded individuals, one worker process per island
+    problem             :  CompactProblem the individuals are encoded against
+    populations         :  list of (individuals x courses) int arrays, one per island (see init_population_encoded)
+    migration_interval  :  generations between migrations (0 = no migration)
+    n_migrants          :  number of best individuals each island sends to each of its neighbours
+    topology            :  'ring' or 'full'
+    Returns the best individual (int array) and the per-generation stats combined over the islands; raises a
+    RuntimeError if an island fails (the other islands are stopped)."""
+    n_islands = len(populations)
+    destinations = island_neighbors(n_islands, topology)
+    n_sources = [sum(i in d for d in destinations) for i in range(n_islands)]
+    config = {'f_thres': f_thres, 'ngen': ngen, 'pmut': pmut, 'migration_interval': migration_interval,
+              'n_migrants': n_migrants, 'seed': seed}
+
+    blocks, spec = share_problem(problem)
+    try:
+        inboxes = [multiprocessing.Queue() for _ in range(n_islands)]
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        workers = [multiprocessing.Process(target=island_worker,
+                                           args=(i, spec, populations[i], config, inboxes[i],
+                                                 [inboxes[j] for j in destinations[i]], n_sources[i], stop, results))
+                   for i in range(n_islands)]
+        for w in workers:
+            w.start()
+        try:
+            island_results = collect_island_results(workers, results, stop)
+        finally:
+            stop.set()
+            for w in workers:
+                w.join(timeout=1.0)
+                if w.is_alive():
+                    w.terminate()
+                    w.join()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    index, best, best_fitness, _ = max(island_results, key=lambda r: r[2])
+
+    # combine the stats of the islands, generation by generation
+    all_stats = [r[3] for r in island_results]
+    stats = []
+    for g in range(min(len(s) for s in all_stats)):
+        stats.append({'generation': g,
+                      'mean': mean(s[g]['mean'] for s in all_stats),
+                      'max': max(s[g]['max'] for s in all_stats),
+                      'min': min(s[g]['min'] for s in all_stats)})
+    print('Fitness Stats '+str(stats[-1]))
+    print('Best individual from island %d, fitness %s' % (index, best_fitness))
+
+    return best, stats
+
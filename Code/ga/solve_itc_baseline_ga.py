@@ -25,16 +25,20 @@ sys.path.append("../ga")
 sys.path.append("../csp")
 import csp
 from itc_ga_framework import init_population, genetic_algorithm
+from itc_ga_framework import init_population_encoded, island_genetic_algorithm
 # import search
 
 # import our code (in the same directory as this file)
 from csp_utils import forward_checking, constraint_different_values, constraint_different_timeslots
 from csp_utils import display_solution, display_solution_in_table
 from read_itc_data_file import read_itc_data_file
+from instrumentation import from_args, get_instrumentation
+from itc_instance import load_instance
 from timetabling_csp import TimetablingCSP
 from timeslot_csp import TimeSlot
-from verify_solution import verify_solution, score_solution, fitness_function
-from solve_itc_baseline_csp import set_up_csp
+from verify_solution import verify_solution, score_solution, fitness_function, fitness_function_encoded
+from verify_solution import population_fitness
+from solve_itc_baseline_csp import set_up_csp, set_up_compact_csp
 
 import timeit
 
@@ -45,57 +49,104 @@ file_name = "'''+file_name+'''"
 from itc_ga_framework import init_population
 from solve_itc_baseline_ga import set_up_csp
 from verify_solution import score_solution
-variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
+from itc_instance import load_instance
+instance = load_instance(file_name)
+variables, domains, constraints, curricula, time_slots = set_up_csp(instance)
 population = init_population(100, variables, domains)'''
     TEST_CODE = '''
-list(map(lambda x: score_solution(file_name, x), population))'''
+list(map(lambda x: score_solution(instance, x), population))'''
     print(timeit.timeit(TEST_CODE,SETUP_CODE, number = 10))
     
     SETUP_CODE2 ='''
 file_name = "'''+file_name+'''"
 from itc_ga_framework import init_population
 from solve_itc_baseline_ga import set_up_csp
-from read_itc_data_file import read_itc_data_file
+from itc_instance import load_instance
 from verify_solution import fitness_function
-variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
-courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = read_itc_data_file(file_name)    
+instance = load_instance(file_name)
+variables, domains, constraints, curricula, time_slots = set_up_csp(instance)
+courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = instance.as_tuple()
 population = init_population(100, variables, domains)'''
     TEST_CODE2 = '''
 list(map(lambda x: fitness_function(courses, rooms, curricula, x), population))'''
     print(timeit.timeit(TEST_CODE2,SETUP_CODE2, number = 10))
     
-    variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
-    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = read_itc_data_file(file_name)
+    instance = load_instance(file_name)
+    variables, domains, constraints, curricula, time_slots = set_up_csp(instance)
+    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = instance.as_tuple()
     population = init_population(200, variables, domains)
     
-    fitnessOld = list(map(lambda x: score_solution(file_name, x), population))
+    fitnessOld = list(map(lambda x: score_solution(instance, x), population))
     print(sum(fitnessOld))
     
     fitnessNew = list(map(lambda x: fitness_function(courses, rooms, curricula, x), population))
     print(sum(fitnessNew))
     
     print(fitnessOld == fitnessNew)
+
+    # vectorized scoring of the whole (encoded) population against the one-at-a-time fitness_function
+    SETUP_CODE3 ='''
+file_name = "'''+file_name+'''"
+from itc_ga_framework import init_population
+from solve_itc_baseline_ga import set_up_compact_csp
+from verify_solution import population_fitness
+import numpy as np
+variables, domains, constraints, curricula, time_slots, problem = set_up_compact_csp(file_name)
+population = init_population(100, variables, domains)
+matrix = [problem.assignment_array(x) for x in population]'''
+    TEST_CODE3 = '''
+population_fitness(problem, [problem.assignment_array(x) for x in population])'''
+    TEST_CODE4 = '''
+population_fitness(problem, np.array(matrix))'''
+    print(timeit.timeit(TEST_CODE3,SETUP_CODE3, number = 10))
+    print(timeit.timeit(TEST_CODE4,SETUP_CODE3, number = 10))
+
+    variables, domains, constraints, curricula, time_slots, problem = set_up_compact_csp(file_name)
+    encoded = [problem.encode_solution(x) for x in population]
+    fitnessVectorized = population_fitness(problem, np.array(encoded)).tolist()
+    print(fitnessOld == fitnessVectorized)
     
     
-def main_func(file_name, output_file=None):
+def main_func(file_name, output_file=None, n_islands=0, migration_interval=25, topology='ring', instrument=None):
+    """ n_islands > 0 runs the island model with that many worker processes (N_Individuals are split across them),
+        migrating the best individuals every migration_interval generations over a 'ring' or 'full' topology;
+        instrument is an Instrumentation to report the run through (see instrumentation.py) """
     print ('Performing GA Analysis on '+file_name)
+    instrument = get_instrumentation(instrument)
     # Read in the ITC data file and do the pre-process necessary to convert the raw data into
     # variables, domains and constraints
-    variables, domains, constraints, curricula, time_slots = set_up_csp(file_name)
-    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = read_itc_data_file(file_name)
+    # the individuals are encoded as ints (room_id * n_slots + slot_id), see compact_problem.py
+    with instrument, instrument.timer('setup'):
+        variables, domains, constraints, curricula, time_slots, problem = set_up_compact_csp(file_name)
     
     N_Individuals=1000
     N_Generations=1000
     P_Mutation=.1
-    
-    population = init_population(N_Individuals, variables, domains)
+    N_Migrants=2
     
     start = timer()
-    result, stats = genetic_algorithm(population, lambda x: fitness_function(courses, rooms, curricula, x), domains, ngen=N_Generations, f_thres=0, pmut=P_Mutation)
+    with instrument, instrument.timer('search'):
+        if n_islands > 0:
+            populations = [init_population_encoded(N_Individuals // n_islands, problem) for i in range(n_islands)]
+            result, stats = island_genetic_algorithm(problem, populations, ngen=N_Generations, f_thres=0,
+                                                     pmut=P_Mutation, migration_interval=migration_interval,
+                                                     n_migrants=N_Migrants, topology=topology)
+            # (the islands run in other processes, so only the totals can be counted)
+            instrument.count('generations', len(stats))
+            instrument.count('fitness_evaluations', len(stats) * N_Individuals)
+        else:
+            population = init_population_encoded(N_Individuals, problem)
+            course_domains = [domains[c] for c in problem.course_names]
+            # genetic_algorithm scores a generation with one call
+            fitness = instrument.counted(lambda p: population_fitness(problem, p), 'fitness_evaluations', weight=len)
+            fitness = instrument.counted(fitness, 'generations')
+            result, stats = genetic_algorithm(population, fitness, course_domains, ngen=N_Generations, f_thres=0,
+                                              pmut=P_Mutation, vectorized=True)
     end = timer()
     print('GA took {:.1f} seconds'.format(end - start)) # Time in seconds, e.g. 5.38091952400282
+    instrument.report()
 
-    display_solution_in_table(result, time_slots, output_file)
+    display_solution_in_table(problem.decode_solution(result), time_slots, output_file)
     
     df = pd.DataFrame(stats)
     fig = plt.figure(1)
@@ -111,20 +162,29 @@ def main_func(file_name, output_file=None):
 
 # -------------------------------------------------------------------------------------
 if __name__ == "__main__":
-    
+    # (and stats, progress[=seconds] or profile[=file] anywhere, see instrumentation.py)
+    sys.argv, instrument = from_args(sys.argv)
+
     # if you want to generate an output file of the schedule
     # output_file = '/Users/brucks/Desktop/baseline_comp01.txt'
     output_file = None  # if not
     
     if len(sys.argv)==2 and os.path.exists(sys.argv[1]):
         file_name = sys.argv[1]
-        main_func(file_name, output_file)
-    elif (sys.argv)==3 and os.path.exists(sys.argv[1]) and sys.argv[2] == 'test':
+        main_func(file_name, output_file, instrument=instrument)
+    elif len(sys.argv)==3 and os.path.exists(sys.argv[1]) and sys.argv[2] == 'test':
         file_name = sys.argv[1]
         perf_test(file_name)
+    elif len(sys.argv)>=3 and os.path.exists(sys.argv[1]) and sys.argv[2] == 'islands':
+        # solve_itc_baseline_ga.py <file> islands [n_islands] [migration_interval] [ring|full]
+        file_name = sys.argv[1]
+        n_islands = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+        migration_interval = int(sys.argv[4]) if len(sys.argv) > 4 else 25
+        topology = sys.argv[5] if len(sys.argv) > 5 else 'ring'
+        main_func(file_name, output_file, n_islands, migration_interval, topology, instrument)
     else:
         file_name = '../../Data/ITC-2007/comp01.ctt.txt'
-        main_func(file_name, output_file)
+        main_func(file_name, output_file, instrument=instrument)
 
     
 
@@ -0,0 +1,238 @@
+# batch_verify.py: verify and score a stream of lecture-level timetables for one ITC-2007 instance, in bulk.
+#
+#                  The instance is loaded (and the ITCScorer built) once per process, the solutions are parsed and
+#                  scored in chunks (one ITCScorer.evaluate() call on a 2D array per chunk) and the chunks are spread
+#                  over a pool of worker processes. Each solution gives one record:
+#
+#                      {"id": ..., "valid": true, "hard": 0, "soft": 1089, "Lectures": 0, "Conflicts": 0, ...}
+#
+#                  with the count of every component in itc_scorer.COMPONENTS (or "error" if it couldn't be read).
+#
+#                  The solutions can be
+#                      JSON lines   one solution per line, {"id": ..., "lectures": [[course, room, day, period], ...]}
+#                                   (the lines of an ITC .sol file) or {"id": ..., "values": [...]} (already encoded,
+#                                   see itc_scorer.py); the id is optional (the line number by default)
+#                      .sol files   the ITC-2007 solution format, one "course room day period" line per lecture; the
+#                                   id is the file name
+#
+#                  usage: python batch_verify.py [-j workers] [-o output.jsonl] instance_file solutions [solutions ...]
+#                         (solutions: .jsonl files, .sol files or - for JSON lines on stdin; the records go to the
+#                         output file or stdout, and a summary to stderr)
+
+# import standard packages
+import json
+import multiprocessing
+import os
+import sys
+from timeit import default_timer as timer
+import numpy as np
+
+# import our code (in the same directory as this file; itc_scorer needs the AIMA code through lectures.py)
+sys.path.append("../aima")
+from compact_problem import UNASSIGNED
+from itc_instance import get_instance
+from itc_scorer import ITCScorer, COMPONENTS, HARD_COMPONENTS, SOFT_COMPONENTS
+
+# number of solutions scored together
+CHUNK_SIZE = 256
+
+# -------------------------------------------------------------------------------------
+class BatchVerifier():
+    """Verifies and scores solutions for one instance
+        verify_items(items)     the records for a list of items (see below), scored with one evaluate() call
+        encode_lectures(rows)   the int values (by lecture id) of a list of (course, room, day, period) rows
+    An item is one unparsed solution: ('json', line number, line) or ('sol', id, text).
+    """
+
+    def __init__(self, instance):
+        """ Construct a BatchVerifier for an ITC data file (or its ITCInstance)"""
+        self.scorer = ITCScorer(get_instance(instance))
+        scorer = self.scorer
+        # the first lecture id and the number of lectures of each course (the lectures of a course are consecutive)
+        self.first_lecture = np.searchsorted(scorer.lecture_course, np.arange(scorer.n_courses))
+        self.num_lectures = np.bincount(scorer.lecture_course, minlength=scorer.n_courses)
+
+    def encode_lectures(self, rows):
+        """ Encode (course, room, day, period) rows: the k-th row of a course is its lecture k
+
+        :return:  (int array of values by lecture id, number of rows beyond the lectures of their course)
+        """
+        scorer = self.scorer
+        values = np.full(scorer.n_lectures, UNASSIGNED, dtype=np.int64)
+        if not rows:
+            return values, 0
+        courses, rooms, days, periods = zip(*rows)
+        try:
+            course_ids = np.array(list(map(scorer.course_index.__getitem__, courses)), dtype=np.int64)
+        except KeyError as e:
+            raise ValueError('unknown course %r' % e.args)
+        try:
+            room_ids = np.array(list(map(scorer.room_index.__getitem__, rooms)), dtype=np.int64)
+        except KeyError as e:
+            raise ValueError('unknown room %r' % e.args)
+        days = np.array(days).astype(np.int64)
+        periods = np.array(periods).astype(np.int64)
+        if ((days < 0) | (days >= scorer.n_days) | (periods < 0) | (periods >= scorer.periods_per_day)).any():
+            raise ValueError('a (day, period) out of range')
+
+        # number each row within its course: sort by course (stably, so the rows keep their order) and count from
+        # the first row of each course
+        order = np.argsort(course_ids, kind='stable')
+        sorted_ids = course_ids[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        group_size = np.diff(np.r_[group_start, len(order)])
+        k = np.arange(len(order)) - np.repeat(group_start, group_size)
+        keep = k < self.num_lectures[sorted_ids]
+        rows_kept = order[keep]
+        values[self.first_lecture[sorted_ids[keep]] + k[keep]] = (room_ids[rows_kept] * scorer.n_periods +
+                                                                   days[rows_kept] * scorer.periods_per_day +
+                                                                   periods[rows_kept])
+        return values, int(len(order) - keep.sum())
+
+    def _parse(self, item):
+        # (id, values, extra lectures) of an item
+        kind, key, text = item
+        if kind == 'sol':
+            rows = [line.split() for line in text.splitlines() if line.strip()]
+            for row in rows:
+                if len(row) != 4:
+                    raise ValueError('expected "course room day period", got %r' % ' '.join(row))
+            values, extra = self.encode_lectures(rows)
+            return key, values, extra
+        record = json.loads(text)
+        if not isinstance(record, dict):
+            raise ValueError('expected a JSON object, got %s' % type(record).__name__)
+        key = record.get('id', key)
+        if 'values' in record:
+            values = np.asarray(record['values'], dtype=np.int64)
+            if values.shape != (self.scorer.n_lectures,):
+                raise ValueError('expected %d values, got %d' % (self.scorer.n_lectures, values.size))
+            if ((values < UNASSIGNED) | (values >= self.scorer.n_values)).any():
+                raise ValueError('values out of range')
+            return key, values, 0
+        values, extra = self.encode_lectures(record['lectures'])
+        return key, values, extra
+
+    def verify_items(self, items):
+        """ The records for a list of items, in the same order"""
+        records = [None] * len(items)
+        parsed = []
+        for i, item in enumerate(items):
+            try:
+                parsed.append((i,) + self._parse(item))
+            except (ValueError, KeyError, TypeError) as e:
+                records[i] = {'id': item[1], 'valid': False, 'error': str(e)}
+        if parsed:
+            breakdown = self.scorer.evaluate(np.stack([values for i, key, values, extra in parsed]))
+            hard = sum(breakdown[k] for k in HARD_COMPONENTS)
+            soft = sum(breakdown[k] for k in SOFT_COMPONENTS)
+            columns = {k: breakdown[k].tolist() for k in COMPONENTS}
+            hard = hard.tolist()
+            soft = soft.tolist()
+            for row, (i, key, values, extra) in enumerate(parsed):
+                record = {'id': key, 'valid': hard[row] + extra == 0, 'hard': hard[row] + extra, 'soft': soft[row]}
+                for k in COMPONENTS:
+                    record[k] = columns[k][row]
+                # (lectures beyond the course's number count as wrong lectures too, as in the ITC validator)
+                record['Lectures'] += extra
+                records[i] = record
+        return records
+
+# -------------------------------------------------------------------------------------
+# the worker processes each build their BatchVerifier once
+
+_VERIFIER = None
+
+def _init_worker(instance):
+    global _VERIFIER
+    _VERIFIER = BatchVerifier(instance)
+
+def _verify_chunk(items):
+    return _VERIFIER.verify_items(items)
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def verify_stream(instance, items, n_workers=None, chunk_size=CHUNK_SIZE):
+    """ Verify a stream of solutions, n_workers processes at a time
+
+    :param instance:  path to the ITC data file (or its ITCInstance)
+    :param items:  iterable of unparsed solutions, see read_solutions
+    :param n_workers:  number of worker processes (os.cpu_count() if None, no pool if 1)
+    :param chunk_size:  number of solutions a worker scores at a time
+    :return:  generator of the records, in the order of the items
+    """
+    instance = get_instance(instance)
+    n_workers = n_workers or os.cpu_count()
+    if n_workers <= 1:
+        verifier = BatchVerifier(instance)
+        for chunk in _chunks(items, chunk_size):
+            yield from verifier.verify_items(chunk)
+        return
+    with multiprocessing.Pool(n_workers, initializer=_init_worker, initargs=(instance,)) as pool:
+        for records in pool.imap(_verify_chunk, _chunks(items, chunk_size), chunksize=4):
+            yield from records
+
+def verify_batch(instance, items, n_workers=None, chunk_size=CHUNK_SIZE):
+    """ verify_stream, as a list"""
+    return list(verify_stream(instance, items, n_workers, chunk_size))
+
+# -------------------------------------------------------------------------------------
+def read_solutions(paths):
+    """ The unparsed solutions in a list of files: JSON lines (.jsonl / .json, or - for stdin) or ITC .sol files"""
+    for path in paths:
+        if path == '-':
+            for number, line in enumerate(sys.stdin, 1):
+                if line.strip():
+                    yield 'json', 'stdin:%d' % number, line
+        elif path.endswith(('.jsonl', '.json')):
+            with open(path) as f:
+                for number, line in enumerate(f, 1):
+                    if line.strip():
+                        yield 'json', '%s:%d' % (os.path.basename(path), number), line
+        else:
+            with open(path) as f:
+                yield 'sol', os.path.basename(path), f.read()
+
+def main_func(instance_file, paths, output_file=None, n_workers=None):
+
+    start = timer()
+    out = open(output_file, 'w') if output_file else sys.stdout
+    n_solutions = n_valid = n_errors = 0
+    try:
+        for record in verify_stream(instance_file, read_solutions(paths), n_workers):
+            out.write(json.dumps(record) + '\n')
+            n_solutions += 1
+            n_valid += record['valid']
+            n_errors += 'error' in record
+    finally:
+        if output_file:
+            out.close()
+    elapsed = timer() - start
+    print('%d solutions, %d valid, %d unreadable in %.2fs (%.0f / minute)' %
+          (n_solutions, n_valid, n_errors, elapsed, 60 * n_solutions / max(elapsed, 1e-9)), file=sys.stderr)
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    n_workers = None
+    output_file = None
+    while args and args[0] in ('-j', '-o'):
+        if args[0] == '-j':
+            n_workers = int(args[1])
+        else:
+            output_file = args[1]
+        args = args[2:]
+    if len(args) < 2:
+        print('usage: python batch_verify.py [-j workers] [-o output.jsonl] instance_file solutions [solutions ...]',
+              file=sys.stderr)
+        sys.exit(1)
+
+    main_func(args[0], args[1:], output_file, n_workers)
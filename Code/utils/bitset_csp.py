@@ -0,0 +1,238 @@
+# bitset_csp.py: a TimetablingCSP whose current domains are bitsets (Python ints) over the integer values of a
+#                CompactProblem, with forward checking and MAC (AC3) working on whole words.
+#
+#                For each value v = (room r, slot s) we precompute which values another course can keep:
+#                    room_keep[v]        everything but room r at the slots overlapping s (two courses can't share
+#                                        a room at overlapping times)
+#                    curriculum_keep[v]  everything but the slots overlapping s, in any room (courses of a
+#                                        curriculum can't overlap)
+#                so forward checking is one AND per unassigned course, and pruning / restoring saves and puts back
+#                whole words: the "removals" list handed around by the AIMA backtracking_search is a trail of
+#                (course id, old word) entries.
+
+# import our code (in the same directory as this file)
+from timetabling_csp import TimetablingCSP
+
+# popcount: int.bit_count on python 3.10+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(word):
+        return bin(word).count('1')
+
+def iter_bits(word):
+    """The positions of the set bits of word, lowest first"""
+    while word:
+        low = word & -word
+        yield low.bit_length() - 1
+        word ^= low
+
+# -------------------------------------------------------------------------------------
+class BitDomain():
+    """A read-only view of one course's bitset domain that looks like the domain lists of the AIMA code (len, in,
+    iteration, indexing)"""
+    __slots__ = ('words', 'i')
+
+    def __init__(self, words, i):
+        self.words = words
+        self.i = i
+
+    def __len__(self):
+        return popcount(self.words[self.i])
+
+    def __bool__(self):
+        return self.words[self.i] != 0
+
+    def __contains__(self, value):
+        return value >= 0 and (self.words[self.i] >> value) & 1 == 1
+
+    def __iter__(self):
+        # iterates over a snapshot of the word, so the domain can change while iterating
+        return iter_bits(self.words[self.i])
+
+    def __getitem__(self, index):
+        for k, value in enumerate(self):
+            if k == index:
+                return value
+        raise IndexError('BitDomain index out of range')
+
+    def __repr__(self):
+        return 'BitDomain(%s)' % list(self)
+
+class BitDomains():
+    """curr_domains for a BitsetTimetablingCSP: curr_domains[var] is a BitDomain"""
+
+    def __init__(self, words, course_id):
+        self.words = words
+        self.course_id = course_id
+
+    def __getitem__(self, var):
+        return BitDomain(self.words, self.course_id[var])
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return iter(self.course_id)
+
+# -------------------------------------------------------------------------------------
+class BitsetTimetablingCSP(TimetablingCSP):
+    """A TimetablingCSP over the values of a CompactProblem (see set_up_compact_csp) with bitset domains
+        words[i]            the current domain of course i as a bitset (bit v set if value v is still possible)
+        room_keep[v], curriculum_keep[v]    the masks described above
+    Use it with bitset_forward_checking or bitset_mac as the inference of backtracking_search.
+    """
+
+    def __init__(self, variables, domains, constraints, curricula, problem):
+        """ Construct a BitsetTimetablingCSP problem."""
+        super().__init__(variables, domains, constraints, curricula, problem)
+        self.var_names = list(self.variables)
+        self.course_id = {v: i for i, v in enumerate(self.var_names)}
+        self.words = []
+        for v in self.var_names:
+            word = 0
+            for value in domains[v]:
+                word |= 1 << value
+            self.words.append(word)
+        self.curr_domains = BitDomains(self.words, self.course_id)
+
+        # kill masks, stored inverted ("keep") so pruning is a single AND
+        n_slots = problem.n_slots
+        full = (1 << problem.n_values) - 1
+        slot_kill = []
+        for s in range(n_slots):
+            kill = 0
+            for s2 in problem.overlapping_slots[s]:
+                kill |= 1 << s2
+            slot_kill.append(kill)
+        all_rooms = [0] * n_slots
+        for s in range(n_slots):
+            for r in range(problem.n_rooms):
+                all_rooms[s] |= slot_kill[s] << (r * n_slots)
+        self.room_keep = []
+        self.curriculum_keep = []
+        for value in range(problem.n_values):
+            r, s = divmod(value, n_slots)
+            self.room_keep.append(full & ~(slot_kill[s] << (r * n_slots)))
+            self.curriculum_keep.append(full & ~all_rooms[s])
+        # the largest number of values one value can rule out, for skipping arcs in AC3
+        self.max_room_kill = max(popcount(k) for k in slot_kill)
+        self.max_curriculum_kill = max(popcount(k) for k in all_rooms)
+
+        # curriculum neighbors by id
+        self.curriculum_neighbor_ids = []
+        for v in self.var_names:
+            members = set()
+            for q in curricula.values():
+                if v in q:
+                    members.update(self.course_id[c] for c in q if c in self.course_id)
+            members.discard(self.course_id[v])
+            self.curriculum_neighbor_ids.append(members)
+
+    # These are for constraint propagation
+    def support_pruning(self):
+        """The bitset domains always support pruning."""
+        pass
+
+    def suppose(self, var, value):
+        """Start accumulating inferences from assuming var=value; returns the trail of saved words."""
+        i = self.course_id[var]
+        removals = [(i, self.words[i])]
+        self.words[i] = 1 << value
+        return removals
+
+    def prune(self, var, value, removals):
+        """Rule out var=value."""
+        i = self.course_id[var]
+        if removals is not None:
+            removals.append((i, self.words[i]))
+        self.words[i] &= ~(1 << value)
+
+    def restore(self, removals):
+        """Undo a supposition and all inferences from it (put the saved words back, last saved first)."""
+        words = self.words
+        for i, word in reversed(removals):
+            words[i] = word
+
+    def choices(self, var):
+        """Return all values for var that aren't currently ruled out."""
+        return iter_bits(self.words[self.course_id[var]])
+
+    def infer_assignment(self):
+        """Return the partial assignment implied by the current inferences."""
+        return {v: self.words[i].bit_length() - 1 for i, v in enumerate(self.var_names)
+                if self.words[i] and self.words[i] & (self.words[i] - 1) == 0}
+
+# -------------------------------------------------------------------------------------
+def bitset_forward_checking(csp, var, value, assignment, removals):
+    """Prune the values of every unassigned course inconsistent with var=value (one AND per course)."""
+    i = csp.course_id[var]
+    words = csp.words
+    room_keep = csp.room_keep[value]
+    curriculum_keep = csp.curriculum_keep[value]
+    curriculum_neighbors = csp.curriculum_neighbor_ids[i]
+    for j, B in enumerate(csp.var_names):
+        if j == i or B in assignment:
+            continue
+        word = words[j]
+        new_word = word & (curriculum_keep if j in curriculum_neighbors else room_keep)
+        if new_word != word:
+            removals.append((j, word))
+            words[j] = new_word
+            if not new_word:
+                return False
+    return True
+
+def bitset_revise(csp, i, j, removals):
+    """Remove the values of course i that conflict with every value left for course j; return True if any were
+    removed."""
+    words = csp.words
+    dj = words[j]
+    # a value only rules out a few others, so if j has more values left than that, they all have support
+    max_kill = csp.max_curriculum_kill if j in csp.curriculum_neighbor_ids[i] else csp.max_room_kill
+    if popcount(dj) > max_kill:
+        return False
+    keep = csp.curriculum_keep if j in csp.curriculum_neighbor_ids[i] else csp.room_keep
+    word = words[i]
+    new_word = word
+    for x in iter_bits(word):
+        # values of j that are still possible with i=x (keep masks are symmetric)
+        if not (dj & keep[x]):
+            new_word &= ~(1 << x)
+    if new_word == word:
+        return False
+    if removals is not None:
+        removals.append((i, word))
+    words[i] = new_word
+    return True
+
+def bitset_AC3(csp, queue=None, removals=None):
+    """ AC3 over the bitset domains; queue is a set of (Xi, Xj) arcs (all pairs if None); returns (consistent,
+    number of arcs revised)"""
+    n = len(csp.var_names)
+    if queue is None:
+        arcs = {(i, j) for i in range(n) for j in range(n) if i != j}
+    else:
+        arcs = {(csp.course_id[Xi], csp.course_id[Xj]) for Xi, Xj in queue}
+    revisions = 0
+    while arcs:
+        i, j = arcs.pop()
+        revisions += 1
+        if bitset_revise(csp, i, j, removals):
+            if not csp.words[i]:
+                return False, revisions
+            # every course is a neighbor of every other one (by room)
+            for k in range(n):
+                if k != i and k != j:
+                    arcs.add((k, i))
+    return True, revisions
+
+def bitset_mac(csp, var, value, assignment, removals):
+    """Maintain arc consistency (forward check var=value, then AC3 on the arcs into var's neighbors)."""
+    mark = len(removals)
+    if not bitset_forward_checking(csp, var, value, assignment, removals):
+        return False
+    # only the courses forward checking changed can take support away from the others
+    changed = {csp.var_names[j] for j, word in removals[mark:]}
+    queue = {(X, Y) for Y in changed for X in csp.var_names if X != Y and X not in assignment}
+    return bitset_AC3(csp, queue, removals)[0]
@@ -0,0 +1,312 @@
+# compact_problem.py: an integer-encoded model of an ITC-2007 Course Timetabling Problem. Rooms, timeslots, courses
+#                     and curricula are mapped to dense integer ids and a (room, timeslot) assignment is stored as a
+#                     single int:
+#
+#                         value = room_id * n_slots + slot_id
+#
+#                     The domains are kept as a boolean numpy mask of shape (n_courses, n_values) instead of a list
+#                     of (room_name, TimeSlot) tuples per course, so the solvers, the verifier and the GA can all
+#                     work on ints and only decode back to (room_name, TimeSlot) at the API boundary (display, etc.)
+
+# import standard packages
+import sys
+import numpy as np
+
+# import our code (in the same directory as this file)
+from read_itc_data_file import read_itc_data_file
+from timeslot_csp import define_all_timeslots, overlap_matrix
+
+# marker used in assignment arrays for a course that has no value yet
+UNASSIGNED = -1
+
+# -------------------------------------------------------------------------------------
+def set_up_attribute_domains(courses, rooms, num_days, periods_per_day, unavail_constraints, verbose=False):
+    """ Applies the unary constraints (room capacity, unavailability) to get the per-course domain of each attribute
+
+    :param courses:  dict of courses from read_itc_data_file
+    :param rooms:  dict of rooms from read_itc_data_file
+    :param num_days:  number of days from read_itc_data_file
+    :param periods_per_day:  number of periods per day from read_itc_data_file
+    :param unavail_constraints:  dict of unavailability constraints from read_itc_data_file
+    :param verbose:  flag indicating you want to see a bunch of info printed out
+    :return:  time_slots (list): the TimeSlot instances used by this problem
+              room_domains (dict): key = course, value = list of room names the course fits in
+              day_time_domains (dict): key = course, value = list of TimeSlot instances that are not blocked
+    """
+
+    # -------------------------------------------------------------------------------------
+    # data pre-processing steps:
+    #   - convert the course day (in integer) and time-slot (also an integer) into a TimeSlot instance
+    #   - do the same with the unavailability constraints
+
+    # convert the day and time values into a TimeSlot instance
+    # options: we can have 1-day per week classes, 2-day per week classes (MW or TR), 3-days per week (MWF)
+    #          for now we will just have 2-day per week and we will add in 1-day per week if the problem space
+    #          gets too large
+
+    # get all the available timeslots
+    all_timeslots = define_all_timeslots()
+
+    # sanity check: make sure the number of courses is not greater than the number of available timeslots * # rooms
+    # day-time slots * number of rooms
+    if len(courses) > len(all_timeslots) * len(rooms):
+        print('Error: too many courses for the combination of day-times and rooms')
+        sys.exit()
+
+    # select the needed number of timeslots
+    time_slots = all_timeslots[:periods_per_day * num_days]
+
+    # note: the input problem files sometimes have 6 days allowed for instruction, but we are only scheduling courses
+    #       during 5 days; this is an issue when a course has an unavailability on day 5 or 6; the solution for now is
+    #       to just ignore those unavailability constraints
+
+    # setting up the blocked timeslots is a bit of a mess ... the problem files use integers for day and for time
+    # in order to be cooler and more clever, we mapped that to MW or TR or M at some actual time ... so we need to take
+    # the day number and the time number into a single number and then block that timeslot
+    blocked_timeslots = {} # use a dict; key = course, value = list of TimeSlot items
+    for c in unavail_constraints:
+        blocked_timeslots[c] = []
+        for item in unavail_constraints[c]:
+            day = item[0]
+            time = item[1]
+            ts_number = day * (num_days-1) + time
+            # sometimes we have an issue when we are adjusting the problem to make it harder that we have blocked
+            # timeslots that refer to a day or time that is not in our set, so skip those
+            if ts_number >= len(time_slots):
+                continue
+            blocked_timeslots[c].append(time_slots[ts_number])
+
+    if (verbose):
+        print('blocked_timeslots:')
+        for b in blocked_timeslots:
+            print(b, ':', blocked_timeslots[b])
+
+    # -------------------------------------------------------------------------------------
+    # apply the unary constraints; since they only constrain one attribute of a variable we will do that to limit the
+    # domains of some variable attributes before constructing the Timetabling CSP problem
+
+    # apply unary constraints based on room capacities
+    # each course has a max number of students (element 3 in the list), each room has a max capacity
+    # first let's make a list or dict of the domains
+    room_violation = {}
+    for c in courses:
+        max_students = courses[c][3]
+        # now look at all the rooms and see where we have a violation
+        for r in rooms:
+            if rooms[r] < max_students:
+                if c not in room_violation:
+                    room_violation[c] = [r]
+                else:
+                    room_violation[c].append(r)
+
+    # now create the domain set for the 'Rooms' attribute for each variable
+    room_domain_all = list(rooms.keys())
+    room_domains = {}
+    for v in courses:
+        if v in room_violation:
+            room_domains[v] = [r for r in room_domain_all if r not in room_violation[v]]
+        else:
+            room_domains[v] = room_domain_all
+    if (verbose):
+        print('room_domains:', room_domains)
+
+    # now create the domain set for the 'Day-Time' attribute for each variable,
+    # taking into account the blocked time slots for any course
+    day_time_domains = {}
+    for v in courses:
+        if v in blocked_timeslots:
+            # walk through all the available time slots and keep all that are not included
+            # in the set of blocked time slots for this variable
+            day_time_domains[v] = []
+            for ts in time_slots:
+                good = True
+                for tb in blocked_timeslots[v]:
+                    if ts == tb:
+                        good = False
+                if good:
+                    day_time_domains[v].append(ts)
+        else:
+            # this variable has now unavailable time slots, so add them all to the domain
+            day_time_domains[v] = time_slots
+
+    if (verbose):
+        print('day_time_domains:')
+        for dt in day_time_domains:
+            print(dt, day_time_domains[dt])
+
+    return time_slots, room_domains, day_time_domains
+
+# -------------------------------------------------------------------------------------
+class CompactProblem():
+    """Integer-encoded Timetabling problem
+    The problem is described by the following (read-only) slots:
+        course_names, room_names, curriculum_names    lists mapping an integer id to the name from the ITC file
+        course_index, room_index, curriculum_index    dicts mapping a name to its integer id
+        time_slots, slot_index                        the TimeSlot instances used by the problem and their ids
+        n_courses, n_rooms, n_slots, n_values         sizes; n_values = n_rooms * n_slots
+        capacity                                      int array (n_rooms,) of room capacities
+        enrollment                                    int array (n_courses,) of course enrollments
+        curriculum_members                            list of int arrays, the course ids in each curriculum
+        curriculum_pairs                              two int arrays (i, j), every pair of courses i < j that appear
+                                                      together in a curriculum (once per curriculum)
+        slot_overlap                                  bool array (n_slots, n_slots), True if two slots overlap
+        overlapping_slots                             list (per slot id) of the slot ids it overlaps, itself included
+        course_curricula                              list (per course id) of the curriculum ids it belongs to
+        room_mask, slot_mask                          bool arrays (n_courses, n_rooms) and (n_courses, n_slots) with
+                                                      the per-attribute domains left after the unary constraints
+        domain_mask                                   bool array (n_courses, n_values), the combined domains
+    """
+
+    def __init__(self, courses, rooms, curricula, time_slots, room_domains, day_time_domains):
+        """ Construct a CompactProblem from the (name based) output of read_itc_data_file/set_up_attribute_domains"""
+        self.courses = courses
+        self.rooms = rooms
+        self.curricula = curricula
+
+        self.course_names = list(courses.keys())
+        self.course_index = {c: i for i, c in enumerate(self.course_names)}
+        self.room_names = list(rooms.keys())
+        self.room_index = {r: i for i, r in enumerate(self.room_names)}
+        self.curriculum_names = list(curricula.keys())
+        self.curriculum_index = {q: i for i, q in enumerate(self.curriculum_names)}
+        self.time_slots = list(time_slots)
+        self.slot_index = {ts: i for i, ts in enumerate(self.time_slots)}
+
+        self.n_courses = len(self.course_names)
+        self.n_rooms = len(self.room_names)
+        self.n_slots = len(self.time_slots)
+        self.n_values = self.n_rooms * self.n_slots
+
+        self.capacity = np.array([rooms[r] for r in self.room_names], dtype=np.int64)
+        self.enrollment = np.array([courses[c][3] for c in self.course_names], dtype=np.int64)
+
+        # curriculum membership, plus all the within-curriculum course pairs flattened into two index arrays
+        self.curriculum_members = []
+        pairs_i = []
+        pairs_j = []
+        for q in self.curriculum_names:
+            members = np.array([self.course_index[c] for c in curricula[q]], dtype=np.int64)
+            self.curriculum_members.append(members)
+            i, j = np.triu_indices(len(members), 1)
+            pairs_i.append(members[i])
+            pairs_j.append(members[j])
+        empty = np.zeros(0, dtype=np.int64)
+        self.curriculum_pairs = (np.concatenate(pairs_i) if pairs_i else empty,
+                                 np.concatenate(pairs_j) if pairs_j else empty)
+
+        # timeslot overlap table (built once per problem); the nested list copy is for fast scalar lookups from plain
+        # python code
+        self.slot_overlap = overlap_matrix(self.time_slots)
+        self.slot_overlap_rows = self.slot_overlap.tolist()
+        self.overlapping_slots = [np.flatnonzero(row).tolist() for row in self.slot_overlap]
+
+        # the curricula (ids) each course belongs to
+        self.course_curricula = [[] for _ in range(self.n_courses)]
+        for q, members in enumerate(self.curriculum_members):
+            for c in members.tolist():
+                self.course_curricula[c].append(q)
+
+        # domains as masks
+        self.room_mask = np.zeros((self.n_courses, self.n_rooms), dtype=bool)
+        self.slot_mask = np.zeros((self.n_courses, self.n_slots), dtype=bool)
+        for c, i in self.course_index.items():
+            self.room_mask[i, [self.room_index[r] for r in room_domains[c]]] = True
+            self.slot_mask[i, [self.slot_index[ts] for ts in day_time_domains[c]]] = True
+        self.domain_mask = (self.room_mask[:, :, None] & self.slot_mask[:, None, :]).reshape(self.n_courses,
+                                                                                            self.n_values)
+        self._domain_flat = None
+        self._course_pairs = None
+
+    # ---------------------------------------------------------------------------------
+    # encoding / decoding of values and solutions
+
+    def encode(self, room, ts):
+        """Return the int value for assigning (room name, TimeSlot)."""
+        return self.room_index[room] * self.n_slots + self.slot_index[ts]
+
+    def decode(self, value):
+        """Return the (room name, TimeSlot) tuple for an int value."""
+        room_id, slot_id = divmod(int(value), self.n_slots)
+        return self.room_names[room_id], self.time_slots[slot_id]
+
+    def encode_solution(self, solution):
+        """Convert a {course: (room, TimeSlot)} solution into an int array indexed by course id."""
+        values = np.full(self.n_courses, UNASSIGNED, dtype=np.int64)
+        for c, (room, ts) in solution.items():
+            values[self.course_index[c]] = self.encode(room, ts)
+        return values
+
+    def decode_solution(self, assignment):
+        """Convert an encoded assignment (dict or array, see assignment_array) into a {course: (room, TimeSlot)} dict;
+        unassigned courses are left out."""
+        values = self.assignment_array(assignment)
+        return {c: self.decode(v) for c, v in zip(self.course_names, values.tolist()) if v != UNASSIGNED}
+
+    def assignment_array(self, assignment):
+        """Return an encoded assignment as an int array indexed by course id. The assignment can be a dict of
+        {course name: int value} (missing courses are UNASSIGNED) or any sequence of values in course id order."""
+        if isinstance(assignment, dict):
+            return np.array([assignment.get(c, UNASSIGNED) for c in self.course_names], dtype=np.int64)
+        return np.asarray(assignment, dtype=np.int64)
+
+    # ---------------------------------------------------------------------------------
+    # domains
+
+    def domain_values(self, course):
+        """Return the int values in the domain of a course (by name) as an array, in the same order that set_up_csp
+        builds the (room, TimeSlot) list."""
+        return np.flatnonzero(self.domain_mask[self.course_index[course]])
+
+    def random_assignments(self, n, rng=None):
+        """Return n random complete assignments as an (n, n_courses) int array, each course's value drawn uniformly
+        from its domain (rng: a numpy Generator, np.random's global state if None)"""
+        if self._domain_flat is None:
+            # the domain values of all the courses one after the other, and where each course's values start
+            self._domain_sizes = self.domain_mask.sum(axis=1)
+            if not self._domain_sizes.all():
+                empty = self.course_names[int(np.argmin(self._domain_sizes))]
+                raise ValueError('course %s has an empty domain' % empty)
+            self._domain_starts = np.concatenate(([0], np.cumsum(self._domain_sizes)[:-1]))
+            self._domain_flat = np.flatnonzero(self.domain_mask) % self.n_values
+        u = rng.random((n, self.n_courses)) if rng is not None else np.random.random_sample((n, self.n_courses))
+        index = self._domain_starts + (u * self._domain_sizes).astype(np.int64)
+        return self._domain_flat[index]
+
+    def course_pairs(self):
+        """Return every pair of courses i < j as two int arrays (i, j), and a bool array that is True for the pairs
+        that share a curriculum (built on the first call)"""
+        if self._course_pairs is None:
+            pair_i, pair_j = np.triu_indices(self.n_courses, 1)
+            shares = np.zeros((self.n_courses, self.n_courses), dtype=bool)
+            # (the curriculum pairs are in curriculum order, not course id order)
+            shares[self.curriculum_pairs] = True
+            shares[self.curriculum_pairs[::-1]] = True
+            self._course_pairs = (pair_i, pair_j, shares[pair_i, pair_j])
+        return self._course_pairs
+
+    def domain_lists(self):
+        """Return a {course: [int value, ...]} dict, for code that wants CSP-style domains."""
+        return {c: self.domain_values(c).tolist() for c in self.course_names}
+
+    # ---------------------------------------------------------------------------------
+    # constraint functions over int values, same signature and meaning as the ones in csp_utils.py
+
+    def constraint_different_values(self, A, a, B, b, curricula):
+        if (a // self.n_slots) != (b // self.n_slots): # room assignment
+            return True
+        return not self.slot_overlap_rows[a % self.n_slots][b % self.n_slots]
+
+    def constraint_different_timeslots(self, A, a, B, b, curricula):
+        for c in curricula:
+            if A in curricula[c] and B in curricula[c]:
+                if self.slot_overlap_rows[a % self.n_slots][b % self.n_slots]:
+                    return False
+        return True
+
+# -------------------------------------------------------------------------------------
+def build_compact_problem(file_name, verbose=False):
+    """ Reads an ITC data file and returns the CompactProblem for it (without building any (room, TimeSlot) lists)"""
+    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = read_itc_data_file(file_name)
+    time_slots, room_domains, day_time_domains = set_up_attribute_domains(courses, rooms, num_days, periods_per_day,
+                                                                          unavail_constraints, verbose)
+    return CompactProblem(courses, rooms, curricula, time_slots, room_domains, day_time_domains)
@@ -0,0 +1,307 @@
+# conflict_directed.py: conflict-directed variable ordering and restarts for backtracking on a TimetablingCSP.
+#
+#                       DomWdeg         the dom/wdeg variable ordering (or plain MRV, weighted=False) kept up to date
+#                                       in a heap instead of recomputing every domain size at every node like
+#                                       AIMA csp.mrv; the weights are bumped whenever forward checking wipes out a
+#                                       domain (or a course is left with no value), so the search goes after the
+#                                       courses that keep failing
+#                       occupancy_lcv   a cheap least-constraining-value order that uses the room occupancy index
+#                       restart_search  backtracking with a fail limit that grows by the Luby or a geometric
+#                                       sequence; the weights carry over from one run to the next, and the values
+#                                       each run refuted are recorded as nogoods so no run repeats them
+
+# import standard packages
+import heapq
+import random
+from timeit import default_timer as timer
+
+# import our code (in the same directory as this file)
+import instrumentation
+from csp_utils import forward_checking
+
+# -------------------------------------------------------------------------------------
+def changed_vars(problem, removals, mark):
+    """The variables whose domains were pruned since mark (the trail length, or the length of the removals list)"""
+    if isinstance(removals, int):
+        # TimetablingCSP: the removals are a checkpoint on csp.trail
+        return [var for var, undo in problem.trail[mark:]]
+    names = getattr(problem, 'var_names', None)
+    if names is not None:
+        # BitsetTimetablingCSP: (course id, old word) entries
+        return [names[i] for i, word in removals[mark:]]
+    return [var for var, value in removals[mark:]]
+
+# -------------------------------------------------------------------------------------
+class DomWdeg():
+    """The dom/wdeg variable ordering: choose the unassigned variable with the smallest
+    (current domain size) / (1 + number of neighbors + weight), where the weight of a variable goes up by one each time
+    it takes part in a failure. Use it as the select_unassigned_variable of backtracking_search, with the inference
+    wrapped by DomWdeg.inference() so it sees the prunings and the failures:
+        ordering = DomWdeg(my_csp)
+        backtracking_search(my_csp, ordering, inference=ordering.inference(forward_checking))
+
+    The heap is lazy: an entry is (key, rank, var), pushed whenever var's key goes down (its domain was pruned or its
+    weight bumped); an entry whose key is out of date is pushed again with the current key when it reaches the top.
+    Restoring domains only makes keys go up, so the smallest key that is up to date is the right choice.
+
+    weighted=False gives MRV (ties by the number of neighbors).
+    """
+
+    def __init__(self, problem, weighted=True, seed=None):
+        self.csp = problem
+        self.weighted = weighted
+        self.rng = random.Random(seed)
+        self.weight = {v: 0 for v in problem.variables}
+        self.degree = {v: len(problem.neighbors[v]) for v in problem.variables}
+        self.rank = {v: i for i, v in enumerate(problem.variables)}
+        self.reset()
+
+    def reset(self, shuffle=False):
+        """Start over (for a new search, or a restart); shuffle=True breaks ties in a new random order"""
+        if shuffle:
+            order = list(self.rank)
+            self.rng.shuffle(order)
+            self.rank = {v: i for i, v in enumerate(order)}
+        self.heap = None
+        # the variables returned so far, in order: backtracking unassigns them last first
+        self.selected = []
+
+    def key(self, var):
+        problem = self.csp
+        size = len((problem.curr_domains or problem.domains)[var])
+        if self.weighted:
+            return size / (1 + self.degree[var] + self.weight[var])
+        return size - self.degree[var] / (1 + len(problem.variables))
+
+    def push(self, var):
+        if self.heap is not None:
+            heapq.heappush(self.heap, (self.key(var), self.rank[var], var))
+
+    def bump(self, var, amount=1):
+        """var took part in a failure"""
+        if self.weighted:
+            self.weight[var] += amount
+            self.push(var)
+
+    def __call__(self, assignment, problem):
+        problem.support_pruning()
+        selected = self.selected
+        heap = self.heap
+        if heap is None or len(heap) > 8 * len(problem.variables):
+            # build (or compact) the heap: one entry per unassigned variable
+            heap = [(self.key(v), self.rank[v], v) for v in problem.variables if v not in assignment]
+            heapq.heapify(heap)
+            self.heap = heap
+            selected[:] = [v for v in selected if v in assignment]
+        # variables backtracking has unassigned since the last call go back in
+        while selected and selected[-1] not in assignment:
+            self.push(selected.pop())
+        while heap:
+            key, rank, var = heapq.heappop(heap)
+            if var in assignment:
+                # an old entry of a variable we chose before (it goes back in from selected when unassigned)
+                continue
+            current = self.key(var)
+            if current != key:
+                heapq.heappush(heap, (current, rank, var))
+                continue
+            selected.append(var)
+            return var
+        return None
+
+    def inference(self, inference=forward_checking):
+        """Wrap an inference function so the ordering sees the domains it prunes, and bumps the weights of var and
+        the variable it wiped out when it fails"""
+        def wrapped(problem, var, value, assignment, removals):
+            mark = removals if isinstance(removals, int) else len(removals)
+            consistent = inference(problem, var, value, assignment, removals)
+            domains = problem.curr_domains
+            for B in changed_vars(problem, removals, mark):
+                if B != var and B not in assignment:
+                    if not consistent and not domains[B]:
+                        self.bump(B)
+                        self.bump(var)
+                    else:
+                        self.push(B)
+            return consistent
+        return wrapped
+
+# -------------------------------------------------------------------------------------
+def occupancy_lcv(var, assignment, problem):
+    """A cheap least-constraining-value order: drop the values whose room is already taken at an overlapping time
+    (found in the room occupancy index, nconflicts would reject them anyway), then try first the values that are
+    still possible for the fewest unassigned neighbors of var."""
+    problem._index_assignment(assignment)
+    occupancy = problem.room_occupancy
+    domains = problem.curr_domains or problem.domains
+    neighbors = [domains[B] for B in problem.neighbors[var] if B not in assignment]
+    scored = []
+    for value in problem.choices(var):
+        if next(occupancy.clashes(value), None) is not None:
+            continue
+        scored.append((sum(1 for dom in neighbors if value in dom), len(scored), value))
+    scored.sort()
+    return [value for n, i, value in scored]
+
+# -------------------------------------------------------------------------------------
+# restart sequences: the fail limit of run i (counting from 0) is scale * sequence(i)
+
+def luby(i):
+    """The Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ... (i counts from 0)"""
+    i += 1
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while (1 << k) - 1 != i:
+        # i is in the second copy of the sequence before 2^(k-1)
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+def geometric(i, growth=1.5):
+    """growth^i"""
+    return growth ** i
+
+class NogoodStore():
+    """Nogoods: sets of (var, value) that can't all hold in a solution, indexed by each of their (var, value)"""
+
+    def __init__(self):
+        self.index = {}
+        self.count = 0
+
+    def add(self, nogood):
+        nogood = tuple(nogood)
+        for literal in nogood:
+            self.index.setdefault(literal, []).append(nogood)
+        self.count += 1
+
+    def blocked(self, var, value, assignment):
+        """True if var=value would complete a nogood with the assignment"""
+        for nogood in self.index.get((var, value), ()):
+            if all(x == var or assignment.get(x, _NONE) == a for x, a in nogood):
+                return True
+        return False
+
+_NONE = object()
+
+# -------------------------------------------------------------------------------------
+def _run(problem, select, order_domain_values, inference, nogoods, fail_limit, deadline, stop):
+    # one run of iterative backtracking (as csp_utils.backtracking_search) that gives up after fail_limit failures;
+    # frames are [var, values left to try, removals of the current value, current value, values refuted]
+    # returns (status, assignment, fails): status 'solved', 'exhausted' or 'limit'
+    n = len(problem.variables)
+    assignment = {}
+    stack = []
+    fails = 0
+    if n > 0:
+        var = select(assignment, problem)
+        stack.append([var, iter(order_domain_values(var, assignment, problem)), None, None, []])
+    while stack and len(assignment) < n:
+        frame = stack[-1]
+        var = frame[0]
+        if frame[2] is not None:
+            # back from a dead end below: the current value is refuted
+            problem.restore(frame[2])
+            frame[2] = None
+            frame[4].append(frame[3])
+        out_of_time = deadline is not None and timer() > deadline
+        if fails >= fail_limit or out_of_time or (stop is not None and stop.is_set()):
+            # out of budget: record the refuted values of the branch as nogoods, undo it and stop
+            prefix = []
+            for var, values, removals, value, refuted in stack:
+                for b in refuted:
+                    nogoods.add(prefix + [(var, b)])
+                if removals is not None:
+                    prefix.append((var, value))
+            for var, values, removals, value, refuted in reversed(stack):
+                if removals is not None:
+                    problem.restore(removals)
+                problem.unassign(var, assignment)
+            return 'limit', None, fails
+        for value in frame[1]:
+            if nogoods.blocked(var, value, assignment):
+                continue
+            if 0 == problem.nconflicts(var, value, assignment):
+                problem.assign(var, value, assignment)
+                removals = problem.suppose(var, value)
+                if inference(problem, var, value, assignment, removals):
+                    frame[2] = removals
+                    frame[3] = value
+                    break
+                problem.restore(removals)
+                frame[4].append(value)
+                fails += 1
+        else:
+            # no value left for var (a failure forward checking didn't see, e.g. every room taken)
+            select.bump(var)
+            problem.unassign(var, assignment)
+            stack.pop()
+            fails += 1
+            continue
+        if len(assignment) < n:
+            var = select(assignment, problem)
+            stack.append([var, iter(order_domain_values(var, assignment, problem)), None, None, []])
+
+    if len(assignment) == n:
+        return 'solved', assignment, fails
+    return 'exhausted', None, fails
+
+def restart_search(problem, ordering=None, order_domain_values=occupancy_lcv, inference=forward_checking,
+                   restarts='luby', scale=100, growth=1.5, max_restarts=None, max_time=None, seed=None, stop=None):
+    """ Backtracking search with restarts: run i gives up after scale * luby(i) (or scale * growth^i) failures
+        (values that fail forward checking, or variables left with no value), records the values it refuted as
+        nogoods and starts over, keeping the dom/wdeg weights and breaking ties in a new random order
+
+    :param problem:  the TimetablingCSP (or BitsetTimetablingCSP)
+    :param ordering:  the DomWdeg ordering to use (a new one if None)
+    :param order_domain_values:  the value order (occupancy_lcv or csp.unordered_domain_values)
+    :param inference:  the inference (forward_checking, or bitset_forward_checking / bitset_mac for the bitset csp)
+    :param restarts:  'luby', 'geometric' or None (a single run without a fail limit)
+    :param scale:  fail limit of the first run
+    :param growth:  growth of the fail limit for geometric restarts
+    :param max_restarts:  optional limit on the number of restarts
+    :param max_time:  optional wall-clock budget in seconds
+    :param seed:  random seed for the tie-breaks
+    :param stop:  optional event (e.g. multiprocessing.Event) that ends the search when it is set
+    :return:  (assignment, or None if there is no solution or the budget ran out, stats dict)
+    """
+    if restarts not in ('luby', 'geometric', None):
+        raise ValueError('unknown restarts %r, use luby, geometric or None' % (restarts,))
+    start = timer()
+    deadline = None if max_time is None else start + max_time
+    problem.support_pruning()
+    if ordering is None:
+        ordering = DomWdeg(problem, seed=seed)
+    inference = ordering.inference(inference)
+    nogoods = NogoodStore()
+
+    run = 0
+    total_fails = 0
+    result = None
+    while True:
+        if restarts is None:
+            fail_limit = float('inf')
+        elif restarts == 'luby':
+            fail_limit = scale * luby(run)
+        else:
+            fail_limit = scale * geometric(run, growth)
+        ordering.reset(shuffle=run > 0)
+        status, result, fails = _run(problem, ordering, order_domain_values, inference, nogoods, fail_limit,
+                                     deadline, stop)
+        total_fails += fails
+        instrumentation.count('fails', fails)
+        if status != 'limit':
+            break
+        if (max_restarts is not None and run >= max_restarts) or (deadline is not None and timer() > deadline):
+            break
+        if stop is not None and stop.is_set():
+            break
+        run += 1
+        instrumentation.count('restarts')
+
+    assert result is None or problem.goal_test(result)
+    stats = {'restarts': run, 'fails': total_fails, 'nogoods': nogoods.count, 'time': timer() - start,
+             'proved_unsat': result is None and status == 'exhausted'}
+    return result, stats
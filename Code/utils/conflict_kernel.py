@@ -0,0 +1,125 @@
+# conflict_kernel.py: the constraints of the timetabling CSP compiled into a single pairwise conflict check.
+#
+#                     TimetablingCSP.fail_constraints() calls each constraint function in turn, and
+#                     constraint_different_timeslots() scans every curriculum for the pair of courses. Together the two
+#                     constraints say that A=a and B=b conflict if the time slots of a and b overlap and either the
+#                     rooms are the same or A and B share a curriculum, so with a "shares a curriculum" bitmatrix and
+#                     the slot overlap table a pair check is two lookups. The batched form checks a value against all
+#                     the assigned neighbors of a course at once with numpy.
+
+# import standard packages
+import numpy as np
+
+# import our code (in the same directory as this file)
+from compact_problem import CompactProblem
+from csp_utils import constraint_different_values, constraint_different_timeslots
+from timeslot_csp import overlap_table
+
+# -------------------------------------------------------------------------------------
+def compile_constraints(constraints, variables, curricula, neighbors, problem=None):
+    """ Returns a ConflictKernel for the constraints, or None if they aren't (exactly) the two constraints of the
+        timetabling CSP (constraint_different_values and constraint_different_timeslots, or the CompactProblem
+        versions of them if problem is given), in which case they have to be called one by one
+    """
+    if problem is None:
+        known = {constraint_different_values, constraint_different_timeslots}
+        found = set(constraints)
+    else:
+        known = {CompactProblem.constraint_different_values, CompactProblem.constraint_different_timeslots}
+        found = {getattr(c, '__func__', None) for c in constraints if getattr(c, '__self__', None) is problem}
+        if len(found) != len(set(constraints)):
+            return None
+    if found != known:
+        return None
+    return ConflictKernel(variables, curricula, neighbors, problem)
+
+# -------------------------------------------------------------------------------------
+class ConflictKernel():
+    """The timetabling constraints as one conflict check
+        conflict(A, a, B, b)            True if A=a and B=b violate a constraint (same as fail_constraints)
+        set_value(A, a), clear_value(A) keep track of the assigned values, for the batched form
+        count_neighbor_conflicts(A, a)  the number of assigned neighbors A=a conflicts with
+    Values are (room, TimeSlot) tuples, or the ints of the CompactProblem if problem is given.
+    """
+
+    def __init__(self, variables, curricula, neighbors, problem=None):
+        self.problem = problem
+        self.course_id = {v: i for i, v in enumerate(variables)}
+        n = len(self.course_id)
+
+        # shares a curriculum: bit j of shares[i] is set if courses i and j are in a curriculum together
+        self.shares = [0] * n
+        for members in curricula.values():
+            ids = [self.course_id[c] for c in members if c in self.course_id]
+            bits = 0
+            for i in ids:
+                bits |= 1 << i
+            for i in ids:
+                self.shares[i] |= bits
+
+        if problem is None:
+            self.overlap = overlap_table()
+            self.room_id = {}
+            self.conflict = self._conflict_tuples
+        else:
+            self.overlap = problem.slot_overlap_rows
+            self.n_slots = problem.n_slots
+            self.conflict = self._conflict_ints
+        self._overlap_array = None
+
+        # for the batched form: the neighbors of each course as an id array, with whether they share a curriculum,
+        # and the room / slot ids of the assigned courses (-1 if unassigned)
+        self.neighbor_ids = {}
+        self.neighbor_shares = {}
+        for v, nbrs in neighbors.items():
+            ids = np.array([self.course_id[u] for u in nbrs], dtype=np.int64)
+            self.neighbor_ids[v] = ids
+            self.neighbor_shares[v] = np.array([(self.shares[self.course_id[v]] >> j) & 1 for j in ids.tolist()],
+                                               dtype=bool)
+        self.assigned_room = np.full(n, -1, dtype=np.int64)
+        self.assigned_slot = np.full(n, -1, dtype=np.int64)
+
+    def _conflict_tuples(self, A, a, B, b):
+        if not self.overlap[a[1].index][b[1].index]:
+            return False
+        return a[0] == b[0] or bool((self.shares[self.course_id[A]] >> self.course_id[B]) & 1)
+
+    def _conflict_ints(self, A, a, B, b):
+        n_slots = self.n_slots
+        if not self.overlap[a % n_slots][b % n_slots]:
+            return False
+        return a // n_slots == b // n_slots or bool((self.shares[self.course_id[A]] >> self.course_id[B]) & 1)
+
+    def _ids(self, value):
+        # (room id, slot id) of a value
+        if self.problem is not None:
+            return divmod(value, self.n_slots)
+        room = self.room_id.get(value[0])
+        if room is None:
+            room = self.room_id[value[0]] = len(self.room_id)
+        return room, value[1].index
+
+    def set_value(self, A, a):
+        i = self.course_id[A]
+        self.assigned_room[i], self.assigned_slot[i] = self._ids(a)
+
+    def clear_value(self, A):
+        i = self.course_id[A]
+        self.assigned_room[i] = -1
+        self.assigned_slot[i] = -1
+
+    def clear(self):
+        self.assigned_room.fill(-1)
+        self.assigned_slot.fill(-1)
+
+    def count_neighbor_conflicts(self, A, a):
+        ids = self.neighbor_ids[A]
+        if self._overlap_array is None or len(self._overlap_array) != len(self.overlap):
+            # (the TimeSlot table grows as new slots are made)
+            self._overlap_array = np.array(self.overlap, dtype=bool)
+        room, slot = self._ids(a)
+        slots = self.assigned_slot[ids]
+        # slots of -1 look at the last column, but those are masked out anyway
+        hits = (slots >= 0) & self._overlap_array[slot][slots] & ((self.assigned_room[ids] == room) |
+                                                                  self.neighbor_shares[A])
+        return int(np.count_nonzero(hits))
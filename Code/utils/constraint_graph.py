@@ -0,0 +1,86 @@
+# constraint_graph.py: the sparse constraint graph of the timetabling CSP.
+#
+#                      Any two courses conflict if they are in the same room at overlapping times, so the original
+#                      TimetablingCSP made every course a neighbor of every other one. But only courses that share a
+#                      curriculum can conflict without sharing a room, so those are the only explicit edges we need:
+#                      build_neighbors() finds them. The room conflicts are found with a RoomOccupancy index of the
+#                      assigned courses by (room, time slot) instead, which only has to look at the time slots
+#                      overlapping a value in its room.
+
+# import our code (in the same directory as this file)
+from timeslot_csp import overlapping_timeslots
+
+# -------------------------------------------------------------------------------------
+def build_neighbors(variables, curricula):
+    """ Returns the neighbors of each variable: the variables it shares a curriculum with
+
+    :param variables:  the variables (courses), anything that iterates over them
+    :param curricula:  dict; key = curriculum, value = list of courses
+    :return:  dict; key = variable, value = list of its neighbors (in the same order as variables)
+    """
+    order = {v: i for i, v in enumerate(variables)}
+    groups = [[c for c in members if c in order] for members in curricula.values()]
+
+    neighbor_sets = {v: set() for v in order}
+    for group in groups:
+        for c in group:
+            neighbor_sets[c].update(group)
+    neighbors = {}
+    for v, s in neighbor_sets.items():
+        s.discard(v)
+        neighbors[v] = sorted(s, key=order.__getitem__)
+    return neighbors
+
+# -------------------------------------------------------------------------------------
+class RoomOccupancy():
+    """Index of the assigned variables by room and time slot, to find the ones a value clashes with by room
+        add(var, value), remove(var, value)
+        clashes(value)      the variables in the same room as value at a time slot overlapping it
+    Values are (room, TimeSlot) tuples, or with a CompactProblem the ints room_id * n_slots + slot_id.
+    """
+
+    def __init__(self, problem=None):
+        self.problem = problem
+        self.occupants = {}     # key = (room, slot), value = set of variables
+        self._overlapping = {}  # cache of the slots overlapping a slot
+
+    def _split(self, value):
+        if self.problem is None:
+            return value[0], value[1]
+        return divmod(value, self.problem.n_slots)
+
+    def _slots_overlapping(self, slot):
+        slots = self._overlapping.get(slot)
+        if slots is None:
+            if self.problem is None:
+                slots = overlapping_timeslots(slot)
+            else:
+                slots = self.problem.overlapping_slots[slot]
+            self._overlapping[slot] = slots
+        return slots
+
+    def clear(self):
+        self.occupants.clear()
+
+    def add(self, var, value):
+        key = self._split(value)
+        occupants = self.occupants.get(key)
+        if occupants is None:
+            self.occupants[key] = {var}
+        else:
+            occupants.add(var)
+
+    def remove(self, var, value):
+        key = self._split(value)
+        occupants = self.occupants[key]
+        occupants.discard(var)
+        if not occupants:
+            del self.occupants[key]
+
+    def clashes(self, value):
+        room, slot = self._split(value)
+        occupants = self.occupants
+        for s in self._slots_overlapping(slot):
+            found = occupants.get((room, s))
+            if found:
+                yield from found
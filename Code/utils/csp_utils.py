@@ -5,6 +5,7 @@
 from tabulate import tabulate
 
 import csp
+import instrumentation
 # -------------------------------------------------------------------------------------
 # in general: a constraint function f(A, a, B, b) that returns true if two variables
 #             A, B satisfy the constraint when they have values A=a, B=b
@@ -53,45 +54,68 @@ def forward_checking(csp, var, value, assignment, removals):
 
 # -------------------------------------------------------------------------------------
 # backtracking_search: so I can mess with the function and try to assess how well it does ...
+#     iterative, with an explicit stack of frames [var, values left to try, removals of the current value], so it
+#     doesn't hit the recursion limit on big instances
 def backtracking_search(csp, select_unassigned_variable=csp.first_unassigned_variable,
                         order_domain_values=csp.unordered_domain_values, inference=csp.no_inference):
     """[Figure 6.5]"""
 
-    def backtrack(assignment, count=0):
-        if len(assignment) == len(csp.variables):
-            print('count:', count)
-            return assignment
+    assignment = {}
+    stack = []
+    if len(csp.variables) > 0:
         var = select_unassigned_variable(assignment, csp)
-        for value in order_domain_values(var, assignment, csp):
+        stack.append([var, iter(order_domain_values(var, assignment, csp)), None])
+    while stack:
+        if len(assignment) == len(csp.variables):
+            break
+        frame = stack[-1]
+        var = frame[0]
+        if frame[2] is not None:
+            # back from a dead end below: undo the value we tried
+            csp.restore(frame[2])
+            frame[2] = None
+        for value in frame[1]:
             if 0 == csp.nconflicts(var, value, assignment):
                 csp.assign(var, value, assignment)
                 removals = csp.suppose(var, value)
                 if inference(csp, var, value, assignment, removals):
-                    result = backtrack(assignment, count+1)
-                    if result is not None:
-                        return result
+                    frame[2] = removals
+                    break
                 csp.restore(removals)
-        csp.unassign(var, assignment)
-        return None
-
-    result = backtrack({})
+        else:
+            # no value left for var
+            csp.unassign(var, assignment)
+            stack.pop()
+            continue
+        if len(assignment) < len(csp.variables):
+            var = select_unassigned_variable(assignment, csp)
+            stack.append([var, iter(order_domain_values(var, assignment, csp)), None])
+
+    result = None
+    if len(assignment) == len(csp.variables):
+        instrumentation.record('search_depth', len(stack))
+        result = assignment
     assert result is None or csp.goal_test(result)
     return result
 
 # -------------------------------------------------------------------------------------
+def write_solution(solution, file_name):
+    # write the solution as csv: one line per course with the room, days, start and end time
+    file = open(file_name,'w')
+    file.write('Course Code, Room, Days, Start Time, End Time\n')
+    for s in solution:
+        room = solution[s][0]
+        ts = solution[s][1]
+        start = ts.start
+        stop = ts.stop
+        days = ''.join(ts.days)
+        file.write('%s,%s,%s,%04d,%04d\n' % (s, room, days, start, stop))
+    file.close()
+
 def display_solution(solution, file_name=None):
 
     if file_name:
-        file = open(file_name,'w')
-        file.write('Course Code, Room, Days, Start Time, End Time\n')
-        for s in solution:
-            room = solution[s][0]
-            ts = solution[s][1]
-            start = ts.start
-            stop = ts.stop
-            days = ''.join(ts.days)
-            file.write('%s,%s,%s,%04d,%04d\n' % (s, room, days, start, stop))
-        file.close()
+        write_solution(solution, file_name)
 
 
     # for a first cut, let's just print it out day by day ...
@@ -0,0 +1,148 @@
+# incremental_scorer.py: incremental (delta) evaluation of the fitness_function() / verify_solution() score for an
+#                        integer-encoded assignment (see compact_problem.py).
+#
+#                        Rescoring a whole assignment costs O(courses + curriculum pairs). When only one course
+#                        changes (a GA mutation, a local search or min-conflicts move) the change in score only
+#                        depends on the courses that share the old / new room-timeslot and on the curricula of the
+#                        moved course, so we keep occupancy counts and update the score in O(degree):
+#
+#                            occupancy[value]           number of courses assigned to a room-timeslot value
+#                            curriculum_counts[q][value] the same, restricted to the courses in curriculum q
+#
+#                        and running counts of the 3 kinds of failures scored by verify_solution().
+
+# import our code (in the same directory as this file)
+from compact_problem import UNASSIGNED
+from verify_solution import HARD_CONSTRAINT_PENALTY, SOFT_CONSTRAINT_PENALTY
+
+# -------------------------------------------------------------------------------------
+class IncrementalScorer():
+    """Keeps the score of a complete integer-encoded assignment up to date as courses are moved
+        score_move(course, new_value)   Return the change in score if course is moved to new_value (no change made)
+        apply_move(course, new_value)   Move course to new_value, return the change in score
+        score_swap(course1, course2)    Return the change in score if the two courses exchange values
+        apply_swap(course1, course2)    Exchange the values of the two courses, return the change in score
+        score                           The current score, same as fitness_function_encoded(problem, values)
+        values                          The current assignment, a list of int values indexed by course id
+    A course can be given by id or by name.
+    """
+
+    def __init__(self, problem, assignment):
+        """ Construct an IncrementalScorer from a CompactProblem and a complete assignment"""
+        self.problem = problem
+        self.n_slots = problem.n_slots
+        self.capacity = problem.capacity.tolist()
+        self.enrollment = problem.enrollment.tolist()
+        self.overlapping_slots = problem.overlapping_slots
+        self.course_curricula = problem.course_curricula
+
+        self.values = problem.assignment_array(assignment).tolist()
+        if len(self.values) != problem.n_courses or UNASSIGNED in self.values:
+            raise ValueError('IncrementalScorer needs a complete assignment')
+
+        self.occupancy = [0] * problem.n_values
+        self.curriculum_counts = [[0] * problem.n_values for _ in range(len(problem.curriculum_members))]
+        for c, v in enumerate(self.values):
+            self.occupancy[v] += 1
+            for q in self.course_curricula[c]:
+                self.curriculum_counts[q][v] += 1
+
+        # running failure counts
+        self.capacity_fails = sum(1 for c, v in enumerate(self.values)
+                                  if self.enrollment[c] > self.capacity[v // self.n_slots])
+        self.room_slot_fails = sum(n - 1 for n in self.occupancy if n > 1)
+        self.curricula_fails = 0
+        for c, v in enumerate(self.values):
+            for q in self.course_curricula[c]:
+                # every clashing pair is seen from both ends
+                self.curricula_fails += self._curriculum_clashes(q, v) - 1
+        self.curricula_fails //= 2
+
+    @property
+    def score(self):
+        total_score = 0
+        total_score -= HARD_CONSTRAINT_PENALTY * (self.capacity_fails + self.room_slot_fails)
+        if self.curricula_fails > 0:
+            total_score -= SOFT_CONSTRAINT_PENALTY * self.curricula_fails
+        return total_score
+
+    def _course_id(self, course):
+        if isinstance(course, str):
+            return self.problem.course_index[course]
+        return course
+
+    def _curriculum_clashes(self, q, value):
+        # number of courses in curriculum q in the same room as value at a timeslot overlapping it
+        room_base = value - value % self.n_slots
+        counts = self.curriculum_counts[q]
+        return sum(counts[room_base + s] for s in self.overlapping_slots[value % self.n_slots])
+
+    def _move_deltas(self, c, new_value):
+        # change in each of the failure counts if course c moves to new_value
+        old_value = self.values[c]
+        if new_value == old_value:
+            return 0, 0, 0
+
+        room_old = old_value // self.n_slots
+        room_new = new_value // self.n_slots
+        d_capacity = ((self.enrollment[c] > self.capacity[room_new]) -
+                      (self.enrollment[c] > self.capacity[room_old]))
+
+        # leaving the old value frees a duplicate if someone else is still there, the new one adds a duplicate if it
+        # is already occupied
+        d_room_slot = (self.occupancy[new_value] > 0) - (self.occupancy[old_value] > 1)
+
+        d_curricula = 0
+        for q in self.course_curricula[c]:
+            # the old count includes c itself; for the new count c must be taken out first in case the old and new
+            # values are in the same room and overlap
+            old_clashes = self._curriculum_clashes(q, old_value) - 1
+            new_clashes = self._curriculum_clashes(q, new_value)
+            if room_old == room_new and self.problem.slot_overlap_rows[old_value % self.n_slots][new_value % self.n_slots]:
+                new_clashes -= 1
+            d_curricula += new_clashes - old_clashes
+
+        return d_capacity, d_room_slot, d_curricula
+
+    def score_move(self, course, new_value):
+        """Return the change in score if course is moved to new_value (the assignment is not changed)."""
+        d_capacity, d_room_slot, d_curricula = self._move_deltas(self._course_id(course), new_value)
+        return -(HARD_CONSTRAINT_PENALTY * (d_capacity + d_room_slot) + SOFT_CONSTRAINT_PENALTY * d_curricula)
+
+    def apply_move(self, course, new_value):
+        """Move course to new_value and return the change in score."""
+        c = self._course_id(course)
+        d_capacity, d_room_slot, d_curricula = self._move_deltas(c, new_value)
+        old_value = self.values[c]
+        if new_value != old_value:
+            self.occupancy[old_value] -= 1
+            self.occupancy[new_value] += 1
+            for q in self.course_curricula[c]:
+                counts = self.curriculum_counts[q]
+                counts[old_value] -= 1
+                counts[new_value] += 1
+            self.values[c] = new_value
+            self.capacity_fails += d_capacity
+            self.room_slot_fails += d_room_slot
+            self.curricula_fails += d_curricula
+        return -(HARD_CONSTRAINT_PENALTY * (d_capacity + d_room_slot) + SOFT_CONSTRAINT_PENALTY * d_curricula)
+
+    def apply_swap(self, course1, course2):
+        """Exchange the values of course1 and course2 and return the change in score."""
+        c1 = self._course_id(course1)
+        c2 = self._course_id(course2)
+        v1 = self.values[c1]
+        v2 = self.values[c2]
+        return self.apply_move(c1, v2) + self.apply_move(c2, v1)
+
+    def score_swap(self, course1, course2):
+        """Return the change in score if course1 and course2 exchange values (the assignment is not changed)."""
+        # the second move depends on the first, so make the first, score the second and undo the first; each step
+        # is O(degree)
+        c1 = self._course_id(course1)
+        c2 = self._course_id(course2)
+        v1 = self.values[c1]
+        delta = self.apply_move(c1, self.values[c2])
+        delta += self.score_move(c2, v1)
+        self.apply_move(c1, v1)
+        return delta
@@ -0,0 +1,180 @@
+# instance_features.py: static difficulty features of an ITC-2007 instance, computed from the parsed data and the
+#                       domains (no sampling or search), to pick a solver before running anything:
+#
+#                           supply / demand     lectures per room-period (ITC model) and courses per value of the
+#                                               course-level domains (set_up_csp), domain sizes as a share of the
+#                                               values
+#                           conflict graph      courses that share a curriculum or a teacher: density and degree
+#                                               statistics, by course and weighted by lectures
+#                           colouring bounds    the periods a timetable needs at least (the largest curriculum or
+#                                               teacher load, a clique) and at most by a greedy colouring of the
+#                                               lectures (largest degree first), both also over the number of periods
+#                           unavailability      the share of (course, period) pairs blocked, and the tightest course
+#                                               (available periods over lectures)
+#                           capacity            the share of rooms big enough for a course, and the worst ratio of the
+#                                               lectures needing at least s seats to the room-periods with s seats
+#
+#                       The graph features are matrix operations on the curriculum membership matrix; only the greedy
+#                       colouring loops (over the courses, with a bool array of the colours taken). Each instance is
+#                       reported with the time to load it (parse it and build its CompactProblem, setup_ms) and, apart
+#                       from that, the time to compute its features (features_ms).
+#
+#                       usage: python instance_features.py [csv] [data file or directory ...]
+#                              (default ../../Data/ITC-2007; csv prints comma separated values rather than a table)
+
+# import standard packages
+import glob
+import os
+import sys
+from timeit import default_timer as timer
+import numpy as np
+
+# import our code (in the same directory as this file)
+from itc_instance import get_instance
+
+# -------------------------------------------------------------------------------------
+def conflict_matrix(instance):
+    """ The course conflict graph of an instance as a bool adjacency matrix (courses in the order of the file): two
+        courses are adjacent if they share a curriculum or a teacher"""
+    courses = instance.courses
+    course_index = {c: i for i, c in enumerate(courses)}
+    membership = np.zeros((len(instance.curricula), len(courses)), dtype=np.float64)
+    for q, members in enumerate(instance.curricula.values()):
+        membership[q, [course_index[c] for c in members]] = 1
+    teacher_ids = {}
+    teacher = np.array([teacher_ids.setdefault(courses[c][0], len(teacher_ids)) for c in courses])
+    adjacent = (membership.T @ membership > 0) | (teacher[:, None] == teacher[None, :])
+    np.fill_diagonal(adjacent, False)
+    return adjacent, membership, teacher
+
+def greedy_colouring_bound(adjacent, lectures):
+    """ The number of colours (periods) a greedy colouring of the lecture graph uses: course c needs lectures[c]
+        colours of its own, none of them used by a neighbor; the courses are coloured largest (lecture weighted)
+        degree first, each with the lowest free colours"""
+    degree = adjacent @ lectures + lectures
+    total = int(lectures.sum())
+    taken = np.zeros((len(lectures), total + 1), dtype=bool)
+    colours_used = 0
+    for c in np.argsort(-degree, kind='stable'):
+        free = np.flatnonzero(~taken[c])[:lectures[c]]
+        if len(free):
+            colours_used = max(colours_used, int(free[-1]) + 1)
+            # the neighbors can't have these colours
+            taken[np.ix_(adjacent[c], free)] = True
+    return colours_used
+
+def instance_features(file_name):
+    """ The static features of an instance
+
+    :param file_name:  path to the ITC data file (or its ITCInstance)
+    :return:  dict of feature name: value (ints and floats)
+    """
+    instance = get_instance(file_name)
+    problem = instance.problem
+    courses = instance.courses
+    n_courses = len(courses)
+    n_rooms = len(instance.rooms)
+    n_periods = instance.num_days * instance.periods_per_day
+    lectures = np.array([courses[c][1] for c in courses], dtype=np.int64)
+    students = np.array([courses[c][3] for c in courses], dtype=np.int64)
+    capacity = np.array(list(instance.rooms.values()), dtype=np.int64)
+    n_lectures = int(lectures.sum())
+
+    features = {'courses': n_courses, 'lectures': n_lectures, 'rooms': n_rooms, 'periods': n_periods,
+                'curricula': len(instance.curricula)}
+
+    # supply / demand
+    features['room_period_load'] = n_lectures / (n_rooms * n_periods)
+    domain_sizes = problem.domain_mask.sum(axis=1)
+    features['course_value_load'] = n_courses / problem.n_values
+    features['domain_fraction_mean'] = float(domain_sizes.mean()) / problem.n_values
+    features['domain_fraction_min'] = float(domain_sizes.min()) / problem.n_values
+
+    # conflict graph
+    adjacent, membership, teacher = conflict_matrix(instance)
+    degree = adjacent.sum(axis=1)
+    features['teachers'] = len(set(teacher.tolist()))
+    features['conflict_density'] = float(degree.sum()) / max(1, n_courses * (n_courses - 1))
+    features['degree_mean'] = float(degree.mean())
+    features['degree_std'] = float(degree.std())
+    features['degree_max'] = int(degree.max())
+    features['degree_median'] = float(np.median(degree))
+    lecture_degree = adjacent @ lectures
+    features['lecture_degree_mean'] = float(lecture_degree.mean())
+    features['lecture_degree_max'] = int(lecture_degree.max())
+
+    # colouring bounds: the lectures of a curriculum (or a teacher) all need different periods
+    teacher_load = np.bincount(teacher, weights=lectures)
+    clique = int(max((membership @ lectures).max(initial=0), teacher_load.max(), lectures.max()))
+    colours = greedy_colouring_bound(adjacent, lectures)
+    features['clique_bound'] = clique
+    features['greedy_colours'] = colours
+    features['clique_bound_ratio'] = clique / n_periods
+    features['greedy_colour_ratio'] = colours / n_periods
+
+    # unavailability
+    blocked = np.zeros((n_courses, n_periods), dtype=bool)
+    course_index = {c: i for i, c in enumerate(courses)}
+    for c, periods in instance.unavail_constraints.items():
+        for day, period in periods:
+            if day < instance.num_days and period < instance.periods_per_day:
+                blocked[course_index[c], day * instance.periods_per_day + period] = True
+    available = n_periods - blocked.sum(axis=1)
+    features['unavailability_density'] = float(blocked.mean())
+    features['availability_tightness'] = float((lectures / np.maximum(available, 1)).max())
+
+    # capacity: for each size s (a course's number of students), the lectures that need s seats over the
+    # room-periods that have them
+    fits = capacity[None, :] >= students[:, None]
+    features['rooms_fitting_mean'] = float(fits.mean())
+    features['courses_without_room'] = int((~fits.any(axis=1)).sum())
+    sizes = np.unique(students)
+    demand = np.array([lectures[students >= s].sum() for s in sizes])
+    supply = n_periods * (capacity[None, :] >= sizes[:, None]).sum(axis=1)
+    features['capacity_tightness'] = float((demand / np.maximum(supply, 1)).max())
+
+    return features
+
+# -------------------------------------------------------------------------------------
+def main_func(paths, csv=False):
+
+    file_names = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_names.extend(sorted(glob.glob(os.path.join(path, '*.ctt.txt'))))
+        else:
+            file_names.append(path)
+
+    rows = []
+    for file_name in file_names:
+        start = timer()
+        instance = get_instance(file_name)
+        instance.problem
+        loaded = timer()
+        features = instance_features(instance)
+        features['setup_ms'] = 1000 * (loaded - start)
+        features['features_ms'] = 1000 * (timer() - loaded)
+        rows.append((os.path.basename(file_name).replace('.ctt.txt', ''), features))
+    if not rows:
+        return rows
+
+    names = list(rows[0][1])
+    if csv:
+        print(','.join(['file'] + names))
+        for file, features in rows:
+            print(','.join([file] + ['%g' % features[k] for k in names]))
+    else:
+        # one column per instance (as wide as the longest name), one row per feature
+        width = max(10, max(len(file) for file, features in rows) + 1)
+        print('%-24s' % 'feature' + ''.join('%*s' % (width, file) for file, features in rows))
+        for k in names:
+            print('%-24s' % k + ''.join('%*.4g' % (width, features[k]) for file, features in rows))
+    return rows
+
+# -------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    csv = bool(args) and args[0] == 'csv'
+    if csv:
+        args = args[1:]
+    main_func(args or ['../../Data/ITC-2007'], csv)
@@ -0,0 +1,258 @@
+# instrumentation.py: counters, timers, a periodic progress callback and an optional cProfile run for the solvers.
+#
+#                     An Instrumentation is switched on for one run with "with instrument:". While it is active
+#                         count(name, n), record(name, value)   add to a counter, or set a value (e.g. a search depth)
+#                         timer(name)                           a with block adding its time (perf_counter_ns)
+#                         count_calls(obj, method, counter)     count the calls of a method of one object (e.g. the
+#                                                               prune() of a TimetablingCSP), by wrapping it on the
+#                                                               instance until the run ends
+#                         counted(func, counter)                a function that counts its calls (e.g. a fitness
+#                                                               function)
+#                     and, if asked for, a background thread passes a snapshot of the counters to a progress callback
+#                     every interval seconds, and the run is profiled with cProfile.
+#
+#                     The hot loops are never touched to do this: the per-call counts come from wrapping methods and
+#                     functions when the instrumentation is on, so a disabled Instrumentation (see get_instrumentation)
+#                     wraps nothing and the solvers run exactly as they do without it. The module level count() and
+#                     record() go to the innermost active Instrumentation (and do nothing if there is none); they are
+#                     for the events that are rare enough to count in place (restarts, instance cache hits, ...).
+#
+#                     The command line scripts take these words anywhere in their arguments (see from_args):
+#                         stats                      print the counters and timers at the end
+#                         progress[=seconds]         print the counters every few seconds (default 1) as well
+#                         profile[=file]             profile the run with cProfile: print the top functions, or save
+#                                                    the stats to file (for pstats / snakeviz)
+
+# import standard packages
+import cProfile
+import io
+import pstats
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter_ns
+
+# the active Instrumentations, innermost last
+_ACTIVE = []
+
+# -------------------------------------------------------------------------------------
+class Instrumentation():
+    """Counters and timers for one solver run
+        enabled     False makes every method a no-op (and wraps nothing)
+        progress    optional function(snapshot) called every interval seconds while the run is active (from a
+                    background thread), see snapshot()
+        interval    seconds between progress calls
+        profile     True to run the active part under cProfile, or a file name to also save the stats to
+    """
+
+    def __init__(self, enabled=True, progress=None, interval=1.0, profile=False):
+        """ Construct an Instrumentation."""
+        self.enabled = enabled
+        self.progress = progress
+        self.interval = interval
+        self.profile = profile
+        self.counters = {}
+        self.values = {}
+        self.timers = {}
+        self.profiler = None
+        self._wrapped = []
+        self._start = None
+        self._elapsed = 0
+        self._stop = None
+        self._thread = None
+        # with blocks can nest (e.g. a script around the calls of a function that also uses the instrumentation):
+        # only the outermost one starts and stops anything
+        self._depth = 0
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self._depth += 1
+        if self._depth > 1:
+            return self
+        _ACTIVE.append(self)
+        self._start = perf_counter_ns()
+        if self.progress is not None:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._progress_loop, daemon=True)
+            self._thread.start()
+        if self.profile:
+            self.profiler = self.profiler or cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.enabled:
+            return False
+        self._depth -= 1
+        if self._depth > 0:
+            return False
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        # put the wrapped methods back, last wrapped first
+        for obj, name, had_attribute, old in reversed(self._wrapped):
+            if had_attribute:
+                setattr(obj, name, old)
+            else:
+                delattr(obj, name)
+        self._wrapped = []
+        self._elapsed += perf_counter_ns() - self._start
+        self._start = None
+        _ACTIVE.remove(self)
+        return False
+
+    def _progress_loop(self):
+        while not self._stop.wait(self.interval):
+            self.progress(self.snapshot())
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, value):
+        if self.enabled:
+            self.values[name] = value
+
+    @contextmanager
+    def timer(self, name):
+        """ Add the time spent in the with block to timer name"""
+        if not self.enabled:
+            yield
+            return
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0) + perf_counter_ns() - start
+
+    def count_calls(self, obj, method, counter=None):
+        """ Count the calls of obj.method (on this object only) as counter (method by default) until the run ends"""
+        if not self.enabled:
+            return
+        counter = counter or method
+        counters = self.counters
+        counters.setdefault(counter, 0)
+        inner = getattr(obj, method)
+
+        def counted_method(*args, **kwargs):
+            counters[counter] += 1
+            return inner(*args, **kwargs)
+
+        attributes = getattr(obj, '__dict__', {})
+        self._wrapped.append((obj, method, method in attributes, attributes.get(method)))
+        setattr(obj, method, counted_method)
+
+    def counted(self, func, counter, weight=None):
+        """ func, counting its calls as counter (each call counts weight(*args) if weight is given, e.g. len for a
+            function that scores a whole population); func itself if the instrumentation is disabled"""
+        if not self.enabled:
+            return func
+        counters = self.counters
+        counters.setdefault(counter, 0)
+
+        def counted_func(*args, **kwargs):
+            counters[counter] += 1 if weight is None else weight(*args)
+            return func(*args, **kwargs)
+
+        return counted_func
+
+    def elapsed(self):
+        """Seconds spent active so far"""
+        running = perf_counter_ns() - self._start if self._start is not None else 0
+        return (self._elapsed + running) / 1e9
+
+    def snapshot(self):
+        """ {'elapsed': seconds, 'counters': {...}, 'values': {...}, 'timers': {name: seconds}} (copies)"""
+        return {'elapsed': self.elapsed(), 'counters': self.counters.copy(), 'values': self.values.copy(),
+                'timers': {k: v / 1e9 for k, v in self.timers.copy().items()}}
+
+    def report(self, file=None, top=25):
+        """ Print the counters, values and timers (and the top functions of the profile, if there is one)"""
+        if not self.enabled:
+            return
+        file = file or sys.stdout
+        snapshot = self.snapshot()
+        print('instrumentation: %.3fs' % snapshot['elapsed'], file=file)
+        for name, value in sorted(snapshot['counters'].items()):
+            rate = value / snapshot['elapsed'] if snapshot['elapsed'] > 0 else 0.0
+            print('    %-28s %14d  (%.0f / s)' % (name, value, rate), file=file)
+        for name, value in sorted(snapshot['values'].items()):
+            print('    %-28s %14s' % (name, value), file=file)
+        for name, seconds in sorted(snapshot['timers'].items()):
+            print('    %-28s %13.3fs' % ('time in ' + name, seconds), file=file)
+        if self.profiler is not None:
+            if isinstance(self.profile, str):
+                self.profiler.dump_stats(self.profile)
+                print('profile saved to', self.profile, file=file)
+            else:
+                text = io.StringIO()
+                pstats.Stats(self.profiler, stream=text).sort_stats('cumulative').print_stats(top)
+                print(text.getvalue(), file=file)
+
+# a shared, disabled Instrumentation for the runs that don't ask for one
+DISABLED = Instrumentation(enabled=False)
+
+def get_instrumentation(instrument):
+    """Return instrument, or the disabled Instrumentation if it is None"""
+    return DISABLED if instrument is None else instrument
+
+# -------------------------------------------------------------------------------------
+# the module level forms report to the innermost active Instrumentation
+
+def count(name, n=1):
+    if _ACTIVE:
+        _ACTIVE[-1].count(name, n)
+
+def record(name, value):
+    if _ACTIVE:
+        _ACTIVE[-1].record(name, value)
+
+def active():
+    """The innermost active Instrumentation, or None"""
+    return _ACTIVE[-1] if _ACTIVE else None
+
+# -------------------------------------------------------------------------------------
+def count_csp_calls(instrument, csp):
+    """ Count the calls that make up a backtracking search on a TimetablingCSP: constraint checks (the pairwise
+        check of the ConflictKernel, or fail_constraints if the constraints weren't compiled), batched constraint
+        checks, nconflicts, assignments, backtracks (unassign) and prunings"""
+    kernel = getattr(csp, 'kernel', None)
+    if kernel is not None:
+        instrument.count_calls(kernel, 'conflict', 'constraint_checks')
+        instrument.count_calls(kernel, 'count_neighbor_conflicts', 'batched_constraint_checks')
+    else:
+        instrument.count_calls(csp, 'fail_constraints', 'constraint_checks')
+    instrument.count_calls(csp, 'nconflicts')
+    instrument.count_calls(csp, 'assign', 'assignments')
+    instrument.count_calls(csp, 'unassign', 'backtracks')
+    instrument.count_calls(csp, 'prune', 'prunings')
+
+def print_progress(snapshot):
+    """ A progress callback: one line with the time and the counters"""
+    counters = ', '.join('%s %d' % item for item in sorted(snapshot['counters'].items()))
+    print('[%7.1fs] %s' % (snapshot['elapsed'], counters), file=sys.stderr, flush=True)
+
+def from_args(args):
+    """ Take the instrumentation words (stats, progress[=seconds], profile[=file]) out of a list of command line
+        arguments
+
+    :return:  (the other arguments, an Instrumentation if any of the words were there or else None)
+    """
+    rest = []
+    options = {}
+    for arg in args:
+        word, _, value = arg.partition('=')
+        if word in ('stats', 'progress', 'profile'):
+            options[word] = value
+        else:
+            rest.append(arg)
+    if not options:
+        return rest, None
+    progress = print_progress if 'progress' in options else None
+    interval = float(options['progress']) if options.get('progress') else 1.0
+    profile = (options['profile'] or True) if 'profile' in options else False
+    return rest, Instrumentation(progress=progress, interval=interval, profile=profile)
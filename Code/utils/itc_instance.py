@@ -0,0 +1,142 @@
+# itc_instance.py: parse-once access to ITC-2007 data files. load_instance() parses a file into an immutable
+#                  ITCInstance and memoizes it by (path, modification time), so the verifier, the GA and the CSP set up
+#                  can all ask for the same file over and over without re-reading it. The derived CompactProblem
+#                  (domains etc.) is built on first use and can also be kept in an on-disk pickle cache.
+
+# import standard packages
+import os
+import pickle
+from types import MappingProxyType
+
+# import our code (in the same directory as this file)
+import instrumentation
+from compact_problem import CompactProblem, set_up_attribute_domains
+from read_itc_data_file import read_itc_data_file
+
+# in-memory cache; key = absolute path, value = ((mtime_ns, size), ITCInstance)
+_INSTANCES = {}
+
+# bump this if the pickled content changes so old cache files are ignored
+CACHE_VERSION = 2
+
+# -------------------------------------------------------------------------------------
+class ITCInstance():
+    """An immutable, parsed ITC-2007 instance
+    The slots hold the same data as the output of read_itc_data_file, but read-only:
+        courses                 {course: (teacher, num lectures, min working days, num students)}
+        rooms                   {room: capacity}
+        num_days, periods_per_day
+        unavail_constraints     {course: ((day, period), ...)}
+        curricula               {curriculum: (course, ...)}
+    and
+        file_name               the file the instance was read from
+        problem                 the CompactProblem for the instance, built on first use
+    """
+    __slots__ = ('file_name', 'courses', 'rooms', 'num_days', 'periods_per_day', 'unavail_constraints', 'curricula',
+                 '_problem')
+
+    def __init__(self, file_name, courses, rooms, num_days, periods_per_day, unavail_constraints, curricula,
+                 problem=None):
+        """ Construct an ITCInstance from the output of read_itc_data_file"""
+        object.__setattr__(self, 'file_name', file_name)
+        object.__setattr__(self, 'courses', MappingProxyType({c: tuple(v) for c, v in courses.items()}))
+        object.__setattr__(self, 'rooms', MappingProxyType(dict(rooms)))
+        object.__setattr__(self, 'num_days', num_days)
+        object.__setattr__(self, 'periods_per_day', periods_per_day)
+        object.__setattr__(self, 'unavail_constraints',
+                           MappingProxyType({c: tuple(v) for c, v in unavail_constraints.items()}))
+        object.__setattr__(self, 'curricula', MappingProxyType({q: tuple(v) for q, v in curricula.items()}))
+        object.__setattr__(self, '_problem', problem)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ITCInstance is immutable')
+
+    def __reduce__(self):
+        return (ITCInstance, (self.file_name, dict(self.courses), dict(self.rooms), self.num_days,
+                              self.periods_per_day, dict(self.unavail_constraints), dict(self.curricula),
+                              self._problem))
+
+    def __repr__(self):
+        return 'ITCInstance(%s: %d courses, %d rooms, %d curricula)' % (self.file_name, len(self.courses),
+                                                                      len(self.rooms), len(self.curricula))
+
+    def as_tuple(self):
+        """Return the data in the same order as read_itc_data_file does"""
+        return (self.courses, self.rooms, self.num_days, self.periods_per_day, self.unavail_constraints,
+                self.curricula)
+
+    @property
+    def problem(self):
+        if self._problem is None:
+            time_slots, room_domains, day_time_domains = set_up_attribute_domains(self.courses, self.rooms,
+                                                                                  self.num_days, self.periods_per_day,
+                                                                                  self.unavail_constraints)
+            # (plain dict copies, so the problem can be pickled)
+            object.__setattr__(self, '_problem', CompactProblem(dict(self.courses), dict(self.rooms),
+                                                                dict(self.curricula), time_slots, room_domains,
+                                                                day_time_domains))
+        return self._problem
+
+# -------------------------------------------------------------------------------------
+def _cache_file(cache_dir, path):
+    return os.path.join(cache_dir, os.path.basename(path) + '.pkl')
+
+def load_instance(file_name, cache_dir=None):
+    """ Returns the ITCInstance for an ITC data file, parsing the file only if it has not been seen before or has
+        changed since (by modification time and size)
+
+    :param file_name:  path to the ITC data file
+    :param cache_dir:  optional directory for an on-disk cache of the instance and its CompactProblem (domains), so
+                       other runs / processes don't have to redo the work either
+    :return:  the ITCInstance
+    """
+    path = os.path.abspath(file_name)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _INSTANCES.get(path)
+    if cached is not None and cached[0] == key:
+        instrumentation.count('instance_cache_hits')
+        return cached[1]
+    instrumentation.count('instance_cache_misses')
+
+    instance = None
+    if cache_dir is not None:
+        try:
+            with open(_cache_file(cache_dir, path), 'rb') as f:
+                version, source, source_key, instance = pickle.load(f)
+            if (version, source, source_key) != (CACHE_VERSION, path, key):
+                instance = None
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            instance = None
+        if instance is not None:
+            instrumentation.count('instance_disk_cache_hits')
+
+    if instance is None:
+        instance = ITCInstance(file_name, *read_itc_data_file(file_name))
+        if cache_dir is not None:
+            # build the domains so they go in the cache too; write to a temporary file first so a reader never sees a
+            # partial file
+            instance.problem
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_file = _cache_file(cache_dir, path)
+            tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+            with open(tmp_file, 'wb') as f:
+                pickle.dump((CACHE_VERSION, path, key, instance), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+
+    _INSTANCES[path] = (key, instance)
+    return instance
+
+def get_instance(instance):
+    """Return instance if it already is an ITCInstance, otherwise treat it as a file name and load it"""
+    if isinstance(instance, ITCInstance):
+        return instance
+    return load_instance(instance)
+
+def get_problem(problem):
+    """Return the CompactProblem for problem, which can be a CompactProblem (or anything else that looks like one),
+    an ITCInstance or a file name"""
+    if isinstance(problem, (ITCInstance, str, os.PathLike)):
+        return get_instance(problem).problem
+    return problem
@@ -0,0 +1,404 @@
+# itc_scorer.py: the full ITC-2007 objective for the lecture-level model (see lectures.py), over an integer-encoded
+#                assignment:
+#
+#                    lecture ids   the lectures of the first course, then those of the second, ... (course order of
+#                                  the ITC file); lecture_course[l] is the course id of lecture l
+#                    value         room_id * n_periods + period, where period = day * periods_per_day + p is an ITC
+#                                  period (see timeslot_csp.itc_timeslot), or UNASSIGNED
+#
+#                The components, as the ITC-2007 validator counts them:
+#                    hard  Lectures               lectures not assigned
+#                          Conflicts              pairs of lectures at the same period of one course, or of two
+#                                                 courses with the same teacher or a curriculum in common
+#                          RoomOccupancy          lectures beyond the first in a room at a period
+#                          Availability           lectures at a period their course is unavailable
+#                    soft  RoomCapacity           students over the room capacity, for each lecture
+#                          MinWorkingDays         5 for each day below a course's minimum number of working days
+#                          CurriculumCompactness  2 for each lecture of a curriculum with no lecture of the curriculum
+#                                                 in the period before or after it on the same day
+#                          RoomStability          1 for each room beyond the first a course uses
+#
+#                ITCScorer.evaluate() computes them all with array operations, for one assignment or a population (one
+#                assignment per row); ITCDeltaScorer keeps the counts behind them up to date as lectures move, so a
+#                move or a swap is scored in O(degree) like incremental_scorer.py does for the course-level score.
+
+# import standard packages
+import numpy as np
+
+# import our code (in the same directory as this file)
+from compact_problem import UNASSIGNED
+from itc_instance import get_instance
+from lectures import Lecture
+from timeslot_csp import itc_day_period, itc_timeslot
+
+HARD_COMPONENTS = ('Lectures', 'Conflicts', 'RoomOccupancy', 'Availability')
+SOFT_COMPONENTS = ('RoomCapacity', 'MinWorkingDays', 'CurriculumCompactness', 'RoomStability')
+COMPONENTS = HARD_COMPONENTS + SOFT_COMPONENTS
+
+# ITC-2007 weights of the soft components
+MIN_WORKING_DAYS_WEIGHT = 5
+CURRICULUM_COMPACTNESS_WEIGHT = 2
+ROOM_STABILITY_WEIGHT = 1
+
+# fitness() counts each hard violation as this much soft cost, so any feasible timetable beats any infeasible one
+# with the soft costs of the ITC instances
+HARD_WEIGHT = 10000
+
+# -------------------------------------------------------------------------------------
+class ITCScorer():
+    """Scores lecture-level ITC-2007 timetables
+        evaluate(values)        {component: penalty} for an int array of values by lecture id (one row per
+                                assignment for a 2D array, and then each penalty is an array)
+        hard(values)            the number of hard violations
+        soft(values)            the soft cost (the ITC objective of a feasible timetable)
+        fitness(values)         -(HARD_WEIGHT * hard + soft): higher is better and 0 is perfect, like the other
+                                fitness functions
+        encode_solution / decode_solution   to and from {Lecture: (room, TimeSlot)} (see set_up_lecture_csp)
+    The instance data is in the slots:
+        lecture_names, lecture_course           the Lecture of each lecture id and its course id
+        course_names, room_names, curriculum_names
+        n_lectures, n_courses, n_rooms, n_days, periods_per_day, n_periods, n_values
+        capacity, students, min_working_days    int arrays by room / course id
+        unavailable                             bool array (n_courses, n_periods)
+        conflicting                             int 0/1 array (n_courses, n_courses), courses with the same teacher or
+                                                a curriculum in common (not a course with itself)
+        membership                              int 0/1 array (n_curricula, n_courses)
+        overflow                                int array (n_courses, n_rooms), the students over capacity
+    """
+
+    def __init__(self, instance):
+        """ Construct an ITCScorer for an ITC data file (or its ITCInstance)"""
+        instance = get_instance(instance)
+        courses = instance.courses
+        rooms = instance.rooms
+        self.instance = instance
+
+        self.course_names = list(courses.keys())
+        self.course_index = {c: i for i, c in enumerate(self.course_names)}
+        self.room_names = list(rooms.keys())
+        self.room_index = {r: i for i, r in enumerate(self.room_names)}
+        self.curriculum_names = list(instance.curricula.keys())
+
+        self.lecture_names = [Lecture(c, k) for c in self.course_names for k in range(courses[c][1])]
+        self.lecture_index = {lecture: i for i, lecture in enumerate(self.lecture_names)}
+        self.lecture_course = np.array([self.course_index[lecture.course] for lecture in self.lecture_names],
+                                       dtype=np.int64)
+
+        self.n_lectures = len(self.lecture_names)
+        self.n_courses = len(self.course_names)
+        self.n_rooms = len(self.room_names)
+        self.n_days = instance.num_days
+        self.periods_per_day = instance.periods_per_day
+        self.n_periods = self.n_days * self.periods_per_day
+        self.n_values = self.n_rooms * self.n_periods
+
+        self.capacity = np.array([rooms[r] for r in self.room_names], dtype=np.int64)
+        self.students = np.array([courses[c][3] for c in self.course_names], dtype=np.int64)
+        self.min_working_days = np.array([courses[c][2] for c in self.course_names], dtype=np.int64)
+        self.overflow = np.maximum(0, self.students[:, None] - self.capacity[None, :])
+
+        self.unavailable = np.zeros((self.n_courses, self.n_periods), dtype=bool)
+        for c, periods in instance.unavail_constraints.items():
+            for day, period in periods:
+                if day < self.n_days and period < self.periods_per_day:
+                    self.unavailable[self.course_index[c], day * self.periods_per_day + period] = True
+
+        self.membership = np.zeros((len(self.curriculum_names), self.n_courses), dtype=np.int64)
+        for q, members in enumerate(instance.curricula.values()):
+            self.membership[q, [self.course_index[c] for c in members]] = 1
+        teacher = [courses[c][0] for c in self.course_names]
+        same_teacher = np.array([[a == b for b in teacher] for a in teacher], dtype=bool)
+        conflicting = same_teacher | (self.membership.T @ self.membership > 0)
+        np.fill_diagonal(conflicting, False)
+        self.conflicting = conflicting.astype(np.int64)
+        self._conflicting_f = self.conflicting.astype(np.float64)
+        self._membership_f = self.membership.astype(np.float64)
+
+    # ---------------------------------------------------------------------------------
+    # encoding / decoding
+
+    def encode(self, room, ts):
+        """Return the int value for (room name, TimeSlot of an ITC period)"""
+        day, period = itc_day_period(ts)
+        return self.room_index[room] * self.n_periods + day * self.periods_per_day + period
+
+    def decode(self, value):
+        """Return the (room name, TimeSlot) of an int value"""
+        room_id, period = divmod(int(value), self.n_periods)
+        return self.room_names[room_id], itc_timeslot(*divmod(period, self.periods_per_day))
+
+    def encode_solution(self, solution):
+        """Convert a {Lecture: (room, TimeSlot)} solution into an int array by lecture id (UNASSIGNED for the lectures
+        it leaves out)"""
+        values = np.full(self.n_lectures, UNASSIGNED, dtype=np.int64)
+        for lecture, (room, ts) in solution.items():
+            values[self.lecture_index[lecture]] = self.encode(room, ts)
+        return values
+
+    def decode_solution(self, values):
+        """Convert an int array by lecture id back to {Lecture: (room, TimeSlot)}, leaving out unassigned lectures"""
+        return {lecture: self.decode(v) for lecture, v in zip(self.lecture_names, np.asarray(values).tolist())
+                if v != UNASSIGNED}
+
+    # ---------------------------------------------------------------------------------
+    # full evaluation
+
+    def _counts(self, values, n_rows, columns, n_columns):
+        # counts[row, lecture's course, column] of the assigned lectures, as one bincount
+        assigned = values >= 0
+        rows = np.broadcast_to(np.arange(n_rows)[:, None], values.shape)[assigned]
+        courses = np.broadcast_to(self.lecture_course[None, :], values.shape)[assigned]
+        index = (rows * self.n_courses + courses) * n_columns + columns[assigned]
+        counts = np.bincount(index, minlength=n_rows * self.n_courses * n_columns)
+        return counts.reshape(n_rows, self.n_courses, n_columns)
+
+    def evaluate(self, values):
+        """ The penalty of each component (see COMPONENTS)
+
+        :param values:  int array (n_lectures,) of values by lecture id, or (n, n_lectures) for n assignments
+        :return:  {component: penalty}, ints for a single assignment or int arrays (n,) for several
+        """
+        values = np.asarray(values, dtype=np.int64)
+        single = values.ndim == 1
+        values = np.atleast_2d(values)
+        n_rows = values.shape[0]
+        assigned = values >= 0
+        room = np.where(assigned, values // self.n_periods, 0)
+        period = np.where(assigned, values % self.n_periods, 0)
+
+        # lectures of each course at each period, and in each room
+        at_period = self._counts(values, n_rows, period, self.n_periods)
+        in_room = self._counts(values, n_rows, room, self.n_rooms)
+
+        # lectures of each room at each period
+        index = (np.arange(n_rows)[:, None] * self.n_rooms + room) * self.n_periods + period
+        occupancy = np.bincount(index[assigned], minlength=n_rows * self.n_values)
+
+        breakdown = {}
+        breakdown['Lectures'] = (~assigned).sum(axis=1)
+        same_course = (at_period * (at_period - 1) // 2).sum(axis=(1, 2))
+        # (the matmuls are in floats, which numpy hands to BLAS; the counts are small enough to be exact)
+        at_period_f = at_period.astype(np.float64)
+        other_courses = np.rint((np.matmul(self._conflicting_f, at_period_f) * at_period_f).sum(axis=(1, 2)) / 2)
+        other_courses = other_courses.astype(np.int64)
+        breakdown['Conflicts'] = same_course + other_courses
+        breakdown['RoomOccupancy'] = np.maximum(occupancy - 1, 0).reshape(n_rows, -1).sum(axis=1)
+        breakdown['Availability'] = (at_period * self.unavailable[None, :, :]).sum(axis=(1, 2))
+
+        over = self.overflow[self.lecture_course[None, :], room]
+        breakdown['RoomCapacity'] = np.where(assigned, over, 0).sum(axis=1)
+
+        by_day = at_period.reshape(n_rows, self.n_courses, self.n_days, self.periods_per_day).sum(axis=3)
+        working_days = (by_day > 0).sum(axis=2)
+        breakdown['MinWorkingDays'] = MIN_WORKING_DAYS_WEIGHT * np.maximum(
+            self.min_working_days[None, :] - working_days, 0).sum(axis=1)
+
+        # lectures of each curriculum at each period of each day, with an empty period on both sides of the day
+        curriculum = np.rint(np.matmul(self._membership_f, at_period_f)).astype(np.int64)
+        curriculum = curriculum.reshape(n_rows, len(self.curriculum_names), self.n_days, self.periods_per_day)
+        padded = np.pad(curriculum, ((0, 0), (0, 0), (0, 0), (1, 1)))
+        isolated = (padded[..., :-2] == 0) & (padded[..., 2:] == 0)
+        breakdown['CurriculumCompactness'] = CURRICULUM_COMPACTNESS_WEIGHT * (curriculum * isolated).sum(axis=(1, 2, 3))
+
+        rooms_used = (in_room > 0).sum(axis=2)
+        breakdown['RoomStability'] = ROOM_STABILITY_WEIGHT * np.maximum(rooms_used - 1, 0).sum(axis=1)
+
+        if single:
+            return {k: int(v[0]) for k, v in breakdown.items()}
+        return breakdown
+
+    def hard(self, values, breakdown=None):
+        """The number of hard violations (of values, or of an evaluate() breakdown if given)"""
+        breakdown = breakdown or self.evaluate(values)
+        return sum(breakdown[k] for k in HARD_COMPONENTS)
+
+    def soft(self, values, breakdown=None):
+        """The soft cost (of values, or of an evaluate() breakdown if given)"""
+        breakdown = breakdown or self.evaluate(values)
+        return sum(breakdown[k] for k in SOFT_COMPONENTS)
+
+    def fitness(self, values, breakdown=None):
+        """-(HARD_WEIGHT * hard + soft): 0 is a perfect timetable"""
+        breakdown = breakdown or self.evaluate(values)
+        return -(HARD_WEIGHT * self.hard(None, breakdown) + self.soft(None, breakdown))
+
+# -------------------------------------------------------------------------------------
+class ITCDeltaScorer():
+    """Keeps the ITC penalties of an assignment up to date as lectures are moved
+        score_move(lecture, new_value)  {component: change} if lecture is moved to new_value (no change made)
+        apply_move(lecture, new_value)  move lecture to new_value (UNASSIGNED takes it out), return the changes
+        score_swap(lecture1, lecture2)  {component: change} if the two lectures exchange values (no change made)
+        apply_swap(lecture1, lecture2)  exchange the values of the two lectures, return the changes
+        breakdown                       {component: penalty} now, same as scorer.evaluate(values)
+        fitness                         scorer.fitness(values) now
+        values                          the current assignment, a list of int values by lecture id
+    A lecture can be given by id or by Lecture. The counts are plain lists: the moves touch a few entries each, and
+    numpy is slower than lists for that.
+    """
+
+    def __init__(self, scorer, values):
+        """ Construct an ITCDeltaScorer from an ITCScorer and an assignment (int values by lecture id)"""
+        self.scorer = scorer
+        self.n_periods = scorer.n_periods
+        self.periods_per_day = scorer.periods_per_day
+        self.lecture_course = scorer.lecture_course.tolist()
+        self.overflow = scorer.overflow.tolist()
+        self.unavailable = scorer.unavailable.tolist()
+        self.min_working_days = scorer.min_working_days.tolist()
+        self.conflicting = [np.flatnonzero(row).tolist() for row in scorer.conflicting]
+        self.course_curricula = [np.flatnonzero(column).tolist() for column in scorer.membership.T]
+
+        values = np.asarray(values, dtype=np.int64)
+        if values.shape != (scorer.n_lectures,):
+            raise ValueError('ITCDeltaScorer needs one value per lecture')
+        self.penalty = scorer.evaluate(values)
+        self.values = [UNASSIGNED] * scorer.n_lectures
+
+        # the counts behind the penalties; _add() keeps them (and would keep the penalties, which are already right)
+        self.at_period = [[0] * self.n_periods for _ in range(scorer.n_courses)]
+        self.occupancy = [0] * scorer.n_values
+        self.in_room = [[0] * scorer.n_rooms for _ in range(scorer.n_courses)]
+        self.rooms_used = [0] * scorer.n_courses
+        self.by_day = [[0] * scorer.n_days for _ in range(scorer.n_courses)]
+        self.working_days = [0] * scorer.n_courses
+        self.curriculum = [[0] * self.n_periods for _ in range(len(scorer.curriculum_names))]
+        delta = dict.fromkeys(COMPONENTS, 0)
+        for lecture, value in enumerate(values.tolist()):
+            if value != UNASSIGNED:
+                self._add(lecture, value, delta)
+
+    @property
+    def breakdown(self):
+        return dict(self.penalty)
+
+    @property
+    def fitness(self):
+        return self.scorer.fitness(None, self.penalty)
+
+    def _lecture_id(self, lecture):
+        if isinstance(lecture, str):
+            return self.scorer.lecture_index[lecture]
+        return lecture
+
+    def _isolated(self, counts, base, p):
+        # the compactness count of periods p - 1 .. p + 1 of the day that starts at base (what changes when the count
+        # at p does)
+        ppd = self.periods_per_day
+        total = 0
+        for k in range(max(0, p - 1), min(ppd, p + 2)):
+            n = counts[base + k]
+            if n and (k == 0 or not counts[base + k - 1]) and (k == ppd - 1 or not counts[base + k + 1]):
+                total += n
+        return total
+
+    def _remove(self, lecture, delta):
+        # take lecture out of its value, adding the changes in the penalties to delta
+        value = self.values[lecture]
+        if value == UNASSIGNED:
+            return
+        c = self.lecture_course[lecture]
+        room, t = divmod(value, self.n_periods)
+        day, p = divmod(t, self.periods_per_day)
+        self.values[lecture] = UNASSIGNED
+        delta['Lectures'] += 1
+
+        self.occupancy[value] -= 1
+        if self.occupancy[value] > 0:
+            delta['RoomOccupancy'] -= 1
+        at_period = self.at_period
+        at_period[c][t] -= 1
+        delta['Conflicts'] -= at_period[c][t] + sum(at_period[other][t] for other in self.conflicting[c])
+        if self.unavailable[c][t]:
+            delta['Availability'] -= 1
+        delta['RoomCapacity'] -= self.overflow[c][room]
+
+        self.by_day[c][day] -= 1
+        if self.by_day[c][day] == 0:
+            if self.working_days[c] <= self.min_working_days[c]:
+                delta['MinWorkingDays'] += MIN_WORKING_DAYS_WEIGHT
+            self.working_days[c] -= 1
+        base = day * self.periods_per_day
+        for q in self.course_curricula[c]:
+            counts = self.curriculum[q]
+            before = self._isolated(counts, base, p)
+            counts[t] -= 1
+            delta['CurriculumCompactness'] += CURRICULUM_COMPACTNESS_WEIGHT * (self._isolated(counts, base, p) - before)
+        self.in_room[c][room] -= 1
+        if self.in_room[c][room] == 0:
+            self.rooms_used[c] -= 1
+            if self.rooms_used[c] >= 1:
+                delta['RoomStability'] -= ROOM_STABILITY_WEIGHT
+
+    def _add(self, lecture, value, delta):
+        # put an unassigned lecture at value, adding the changes in the penalties to delta
+        c = self.lecture_course[lecture]
+        room, t = divmod(value, self.n_periods)
+        day, p = divmod(t, self.periods_per_day)
+        self.values[lecture] = value
+        delta['Lectures'] -= 1
+
+        if self.occupancy[value] > 0:
+            delta['RoomOccupancy'] += 1
+        self.occupancy[value] += 1
+        at_period = self.at_period
+        delta['Conflicts'] += at_period[c][t] + sum(at_period[other][t] for other in self.conflicting[c])
+        at_period[c][t] += 1
+        if self.unavailable[c][t]:
+            delta['Availability'] += 1
+        delta['RoomCapacity'] += self.overflow[c][room]
+
+        if self.by_day[c][day] == 0:
+            self.working_days[c] += 1
+            if self.working_days[c] <= self.min_working_days[c]:
+                delta['MinWorkingDays'] -= MIN_WORKING_DAYS_WEIGHT
+        self.by_day[c][day] += 1
+        base = day * self.periods_per_day
+        for q in self.course_curricula[c]:
+            counts = self.curriculum[q]
+            before = self._isolated(counts, base, p)
+            counts[t] += 1
+            delta['CurriculumCompactness'] += CURRICULUM_COMPACTNESS_WEIGHT * (self._isolated(counts, base, p) - before)
+        if self.in_room[c][room] == 0:
+            if self.rooms_used[c] >= 1:
+                delta['RoomStability'] += ROOM_STABILITY_WEIGHT
+            self.rooms_used[c] += 1
+        self.in_room[c][room] += 1
+
+    def apply_move(self, lecture, new_value):
+        """Move lecture to new_value (UNASSIGNED to take it out) and return {component: change}."""
+        lecture = self._lecture_id(lecture)
+        delta = dict.fromkeys(COMPONENTS, 0)
+        if new_value != self.values[lecture]:
+            self._remove(lecture, delta)
+            if new_value != UNASSIGNED:
+                self._add(lecture, new_value, delta)
+            for k, d in delta.items():
+                self.penalty[k] += d
+        return delta
+
+    def score_move(self, lecture, new_value):
+        """Return {component: change} if lecture is moved to new_value (the assignment is not changed)."""
+        lecture = self._lecture_id(lecture)
+        old_value = self.values[lecture]
+        delta = self.apply_move(lecture, new_value)
+        self.apply_move(lecture, old_value)
+        return delta
+
+    def apply_swap(self, lecture1, lecture2):
+        """Exchange the values of lecture1 and lecture2 and return {component: change}."""
+        l1 = self._lecture_id(lecture1)
+        l2 = self._lecture_id(lecture2)
+        v1 = self.values[l1]
+        v2 = self.values[l2]
+        delta = self.apply_move(l1, v2)
+        for k, d in self.apply_move(l2, v1).items():
+            delta[k] += d
+        return delta
+
+    def score_swap(self, lecture1, lecture2):
+        """Return {component: change} if lecture1 and lecture2 exchange values (the assignment is not changed)."""
+        l1 = self._lecture_id(lecture1)
+        l2 = self._lecture_id(lecture2)
+        delta = self.apply_swap(l1, l2)
+        self.apply_swap(l1, l2)
+        return delta
@@ -0,0 +1,212 @@
+# lectures.py: lecture-level variables for the timetabling CSP. A course with courses[c][1] lectures becomes that many
+#              variables, and each one needs its own room and timeslot.
+#
+#              The lectures of a course can be swapped with each other, and so can two rooms with the same capacity.
+#              Both symmetries multiply the search space, so LectureTimetablingCSP breaks them:
+#                  lecture order   the lectures of a course are in timeslot index order (lecture k goes before
+#                                  lecture k + 1)
+#                  room symmetry   if a lecture could take any of several identical rooms that are still free at a
+#                                  timeslot, choices() only offers the first of them
+#
+#              lecture_forward_checking is forward checking that only looks at the values that can conflict (the
+#              overlapping timeslots, and the wrong side of the timeslot for the other lectures of the course) rather
+#              than every (room, timeslot) of every neighbor.
+#
+#              Room capacity is soft in ITC-2007 (it costs one point per student over), so every room is in a
+#              lecture's domain and lecture_value_order tries the rooms that are big enough first. It also spreads the
+#              lectures of a course over the week (lecture k of n around day k * days / n): without that the lecture
+#              order makes restart_search run the later lectures of a course out of timeslots (comp07 went from
+#              unsolved in 60 seconds to about a second).
+#
+#              The ITC rule that lectures of one course, one curriculum or one teacher can't be at the same time is a
+#              "different timeslots within a group" constraint. So the groups (see lecture_groups) are passed to
+#              TimetablingCSP as its curricula, and constraint_different_timeslots (and its compiled kernel) handles
+#              all three.
+
+# import our code (in the same directory as this file)
+from conflict_directed import occupancy_lcv
+from timetabling_csp import TimetablingCSP
+from timeslot_csp import overlapping_timeslots
+
+# -------------------------------------------------------------------------------------
+class Lecture(str):
+    """The name of lecture number (0, 1, ...) of a course, e.g. 'c0001-2'. It is a str, so it can be used wherever
+    the course names are (display, output files), and it also has the course and number as attributes."""
+
+    def __new__(cls, course, number):
+        lecture = str.__new__(cls, '%s-%d' % (course, number))
+        lecture.course = course
+        lecture.number = number
+        return lecture
+
+    def __getnewargs__(self):
+        return (self.course, self.number)
+
+def lecture_variables(courses):
+    """ {Lecture: (None, None)} for every lecture of every course (courses as from read_itc_data_file)"""
+    variables = {}
+    for c in courses:
+        for k in range(courses[c][1]):
+            variables[Lecture(c, k)] = (None, None)
+    return variables
+
+def lecture_groups(courses, curricula, lectures):
+    """ The groups of lectures that must be at different timeslots: each curriculum (with the lectures of its
+        courses), and 'course:<course>' and 'teacher:<teacher>' for each course / teacher with more than one lecture
+
+    :param courses:  {course: (teacher, num lectures, min working days, num students)}
+    :param curricula:  {curriculum: [course, ...]}
+    :param lectures:  the lecture variables (see lecture_variables)
+    :return:  {group name: tuple of lectures}
+    """
+    by_course = {}
+    for lecture in lectures:
+        by_course.setdefault(lecture.course, []).append(lecture)
+
+    groups = {}
+    for q, members in curricula.items():
+        groups[q] = tuple(lecture for c in members for lecture in by_course.get(c, ()))
+    for c, members in by_course.items():
+        if len(members) > 1:
+            groups['course:' + c] = tuple(members)
+    by_teacher = {}
+    for c, members in by_course.items():
+        by_teacher.setdefault(courses[c][0], []).extend(members)
+    for t, members in by_teacher.items():
+        if len(members) > 1 and len({lecture.course for lecture in members}) > 1:
+            groups['teacher:' + t] = tuple(members)
+    return groups
+
+# -------------------------------------------------------------------------------------
+class LectureTimetablingCSP(TimetablingCSP):
+    """A TimetablingCSP over Lecture variables with (room, TimeSlot) values, with the symmetry breaking described
+    above
+        variables, domains, constraints   as for TimetablingCSP (see set_up_lecture_csp)
+        groups      the lecture groups (see lecture_groups), used as the curricula
+        rooms       {room: capacity}; rooms with the same capacity are interchangeable
+        students    {course: number of students} for lecture_value_order (None: all rooms are big enough)
+    choices() reads the room index, so it assumes the assignment is the one assign() / unassign() are following (as
+    in backtracking_search).
+    """
+
+    def __init__(self, variables, domains, constraints, groups, rooms, students=None):
+        """ Construct a LectureTimetablingCSP problem."""
+        super().__init__(variables, domains, constraints, groups)
+        self.rooms = rooms
+        self.students = students or {}
+
+        # the other lectures of the same course
+        by_course = {}
+        for lecture in self.variables:
+            by_course.setdefault(lecture.course, []).append(lecture)
+        self.siblings = {lecture: [other for other in by_course[lecture.course] if other != lecture]
+                         for lecture in self.variables}
+
+        # the identical rooms (same capacity) that come before each room
+        by_capacity = {}
+        for room in sorted(rooms, key=lambda r: (rooms[r], r)):
+            by_capacity.setdefault(rooms[room], []).append(room)
+        self.earlier_rooms = {}
+        for same in by_capacity.values():
+            for i, room in enumerate(same):
+                self.earlier_rooms[room] = same[:i]
+
+        # the timeslots of the domains, and {TimeSlot: True if it overlaps no other timeslot of the domains}: swapping
+        # two rooms at one timeslot only keeps the other timeslots as they were if it doesn't partly overlap one of
+        # them (the MW / TR style TimeSlots made elsewhere don't count, no lecture can take them)
+        slots = set()
+        for dom in self.domains.values():
+            slots.update(dom.slots if hasattr(dom, 'slots') else [value[1] for value in dom])
+        self._exact = {ts: all(other == ts or other not in slots for other in overlapping_timeslots(ts))
+                       for ts in slots}
+
+        # for lecture_value_order: the position of each timeslot in the week, the number of timeslots a day and the
+        # number of lectures of each course
+        slots = sorted(slots, key=lambda ts: ts.index)
+        self.slot_position = {ts: i for i, ts in enumerate(slots)}
+        self.slots_per_day = max(1, len(slots) // max(1, len({ts.days for ts in slots})))
+        self.num_lectures = {course: len(members) for course, members in by_course.items()}
+
+    def order_conflict(self, A, a, B, b):
+        """True if A=a, B=b break the timeslot order of two lectures of one course"""
+        if A.course != B.course:
+            return False
+        return (A.number < B.number) != (a[1].index < b[1].index)
+
+    def fail_constraints(self, var1, val1, var2, val2):
+        return super().fail_constraints(var1, val1, var2, val2) or self.order_conflict(var1, val1, var2, val2)
+
+    def nconflicts(self, var, val, assignment):
+        """Return the number of conflicts var=val has with other variables."""
+        num_conflicts = super().nconflicts(var, val, assignment)
+        for other in self.siblings[var]:
+            # lectures at the same timeslot are already counted (they are in a 'course:' group)
+            if other in assignment and assignment[other][1] != val[1]:
+                if self.order_conflict(var, val, other, assignment[other]):
+                    num_conflicts += 1
+        return num_conflicts
+
+    def choices(self, var):
+        """Return all values for var that aren't currently ruled out, leaving out a room if an identical one that
+        comes before it is free at the same timeslot."""
+        values = super().choices(var)
+        dom = (self.curr_domains or self.domains)[var]
+        occupancy = self.room_occupancy
+        exact = self._exact
+        kept = []
+        for value in values:
+            room, ts = value
+            if exact[ts] and any((earlier, ts) in dom and next(occupancy.clashes((earlier, ts)), None) is None
+                                 for earlier in self.earlier_rooms[room]):
+                continue
+            kept.append(value)
+        return kept
+
+    def overflow(self, var, value):
+        """The number of students of var's course that don't fit in the room of value"""
+        return max(0, self.students.get(var.course, 0) - self.rooms[value[0]])
+
+    def spread(self, var, value):
+        """How many days value's timeslot is from lecture var's share of the week: lecture k of n is expected around
+        (k + 1/2) / n of the way through it"""
+        expected = (var.number + 0.5) * len(self.slot_position) / self.num_lectures[var.course]
+        return int(abs(self.slot_position[value[1]] - expected)) // self.slots_per_day
+
+# -------------------------------------------------------------------------------------
+def lecture_forward_checking(csp, var, value, assignment, removals):
+    """forward_checking for a LectureTimetablingCSP over ProductDomains: prune the neighbor values at a timeslot
+    overlapping value's, and the values of the other lectures of the course that would break the timeslot order"""
+    csp.support_pruning()
+    domains = csp.curr_domains
+    ts = value[1]
+    overlapping = overlapping_timeslots(ts)
+    overlap_set = set(overlapping)
+    for B in csp.neighbors[var]:
+        if B in assignment:
+            continue
+        dom = domains[B]
+        if B.course == var.course:
+            # lecture B goes after var if its number is higher: prune its timeslots on the other side
+            if B.number > var.number:
+                slots = [t for t in dom.slots if t.index <= ts.index or t in overlap_set]
+            else:
+                slots = [t for t in dom.slots if t.index >= ts.index or t in overlap_set]
+        else:
+            slots = overlapping
+        for t in slots:
+            for room in dom.rooms:
+                b = (room, t)
+                if b in dom:
+                    csp.prune(B, b, removals)
+        if not dom:
+            return False
+    return True
+
+def lecture_value_order(var, assignment, problem):
+    """occupancy_lcv, but the values with a room big enough for the course come first, and then the ones on the day of
+    the week where the lecture's number puts it (see LectureTimetablingCSP.spread): the lecture order makes a lecture
+    that takes a late timeslot rule out the early ones for the lectures after it, so spreading them out keeps the
+    other lectures of the course from running out of timeslots"""
+    values = occupancy_lcv(var, assignment, problem)
+    values.sort(key=lambda value: (problem.overflow(var, value) > 0, problem.spread(var, value)))
+    return values
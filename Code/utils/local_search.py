@@ -0,0 +1,248 @@
+# local_search.py: simulated annealing and tabu search over the integer-encoded assignment of a CompactProblem,
+#                  maximizing the fitness_function_encoded() score (0 is a perfect timetable).
+#
+#                  Both search the same two neighbourhoods:
+#                      Move    a course goes to another value (room, timeslot) in its domain
+#                      Swap    two courses exchange their values (if each value is in the other's domain)
+#                  and evaluate them with the delta scoring of IncrementalScorer, so a step costs O(degree) instead
+#                  of rescoring the whole timetable.
+
+# import standard packages
+import random
+from bisect import bisect_left
+from timeit import default_timer as timer
+import numpy as np
+
+# import our code (in the same directory as this file and the AIMA code)
+from search import exp_schedule
+from incremental_scorer import IncrementalScorer
+
+# -------------------------------------------------------------------------------------
+# cooling schedules: functions of the step number t that return the temperature, 0 to stop
+
+def geometric_schedule(t0=2.0, alpha=0.999, steps_per_temp=10, t_min=1e-3):
+    """T = t0 * alpha^(t // steps_per_temp), until it drops below t_min"""
+    def schedule(t):
+        temp = t0 * alpha ** (t // steps_per_temp)
+        return temp if temp >= t_min else 0
+    return schedule
+
+def linear_schedule(t0=2.0, limit=100000):
+    """T goes down from t0 to 0 in limit steps"""
+    return lambda t: t0 * (1 - t / limit) if t < limit else 0
+
+def make_schedule(name='exp', **params):
+    """ Returns a cooling schedule by name: 'exp' (search.exp_schedule(k, lam, limit)), 'geometric' or 'linear'"""
+    schedules = {'exp': exp_schedule, 'geometric': geometric_schedule, 'linear': linear_schedule}
+    if name not in schedules:
+        raise ValueError('unknown schedule %r, use one of %s' % (name, ', '.join(sorted(schedules))))
+    return schedules[name](**params)
+
+# -------------------------------------------------------------------------------------
+class Neighbourhood():
+    """Random Move / Swap neighbours of the assignment held by an IncrementalScorer
+        sample(rng)         a random neighbour: ('move', course, value) or ('swap', course1, course2), None if
+                            there is none (no course has another value in its domain, and no swap was found)
+        delta(neighbour)    the change in score it would make
+        apply(neighbour)    make it, return the change in score
+    """
+
+    def __init__(self, problem, scorer, swap_prob=0.5):
+        self.scorer = scorer
+        self.swap_prob = swap_prob
+        self.allowed = problem.domain_mask
+        self.domains = [np.flatnonzero(m).tolist() for m in problem.domain_mask]
+        self.n_courses = problem.n_courses
+        # the courses that can move at all (a course with one value can only be swapped)
+        self.movable = [c for c, domain in enumerate(self.domains) if len(domain) > 1]
+
+    def sample(self, rng, max_tries=10):
+        values = self.scorer.values
+        if self.n_courses > 1 and rng.random() < self.swap_prob:
+            for _ in range(max_tries):
+                c1 = rng.randrange(self.n_courses)
+                c2 = rng.randrange(self.n_courses)
+                v1 = values[c1]
+                v2 = values[c2]
+                if v1 != v2 and self.allowed[c1, v2] and self.allowed[c2, v1]:
+                    return ('swap', c1, c2)
+        # a move (also when no swap was found), to any value of the domain but the current one: one of the other
+        # len - 1 positions, skipping the current value's (the domains are sorted)
+        if not self.movable:
+            return None
+        c = self.movable[rng.randrange(len(self.movable))]
+        domain = self.domains[c]
+        current = bisect_left(domain, values[c])
+        if current == len(domain) or domain[current] != values[c]:
+            return ('move', c, domain[rng.randrange(len(domain))])
+        k = rng.randrange(len(domain) - 1)
+        return ('move', c, domain[k + (k >= current)])
+
+    def delta(self, neighbour):
+        kind, a, b = neighbour
+        if kind == 'move':
+            return self.scorer.score_move(a, b)
+        return self.scorer.score_swap(a, b)
+
+    def apply(self, neighbour):
+        kind, a, b = neighbour
+        if kind == 'move':
+            return self.scorer.apply_move(a, b)
+        return self.scorer.apply_swap(a, b)
+
+    def changed(self, neighbour):
+        # the (course, value) pairs the neighbour gives up, for the tabu list
+        kind, a, b = neighbour
+        values = self.scorer.values
+        if kind == 'move':
+            return [(a, values[a])]
+        return [(a, values[a]), (b, values[b])]
+
+# -------------------------------------------------------------------------------------
+def random_assignment(problem, rng):
+    """A random value from its domain for each course"""
+    return [int(d[rng.randrange(len(d))]) for d in (np.flatnonzero(m) for m in problem.domain_mask)]
+
+class _Progress():
+    # best-so-far bookkeeping shared by the searches
+    def __init__(self, scorer, checkpoint, checkpoint_interval, start):
+        self.best_score = scorer.score
+        self.best_values = list(scorer.values)
+        self.best_step = 0
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.start = start
+        self.last_checkpoint = start
+        self.saved = False
+
+    def update(self, scorer, step):
+        if scorer.score > self.best_score:
+            self.best_score = scorer.score
+            self.best_values = list(scorer.values)
+            self.best_step = step
+            self.saved = False
+
+    def maybe_checkpoint(self, step, now, force=False):
+        # hand the best so far to the checkpoint function every checkpoint_interval seconds (if it has changed)
+        if self.checkpoint is None or self.saved:
+            return
+        if force or now - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint(np.array(self.best_values, dtype=np.int64), self.best_score, step, now - self.start)
+            self.last_checkpoint = now
+            self.saved = True
+
+    def result(self, step, now):
+        self.maybe_checkpoint(step, now, force=True)
+        stats = {'steps': step, 'time': now - self.start, 'best_step': self.best_step}
+        return np.array(self.best_values, dtype=np.int64), self.best_score, stats
+
+# -------------------------------------------------------------------------------------
+def simulated_annealing(problem, schedule=None, max_time=None, max_steps=None, swap_prob=0.5, seed=None,
+                        initial=None, checkpoint=None, checkpoint_interval=5.0):
+    """ Simulated annealing over the Move / Swap neighbourhoods (as AIMA search.simulated_annealing: a random
+        neighbour is taken if it is better, or with probability exp(delta / T) if not)
+
+    :param problem:  the CompactProblem
+    :param schedule:  cooling schedule, a function of the step returning the temperature (0 stops the search);
+                      default search.exp_schedule(k=2, lam=5e-5, limit=200000)
+    :param max_time:  optional wall-clock budget in seconds
+    :param max_steps:  optional step budget
+    :param swap_prob:  probability of trying a Swap rather than a Move
+    :param seed:  random seed
+    :param initial:  optional starting assignment (dict or array), random otherwise
+    :param checkpoint:  optional function(best_values, best_score, step, elapsed) called with the best so far every
+                        checkpoint_interval seconds (when it has improved) and at the end
+    :return:  (best assignment as an int array, its score, stats dict)
+    """
+    rng = random.Random(seed)
+    start = timer()
+    if schedule is None:
+        schedule = exp_schedule(k=2, lam=5e-5, limit=200000)
+    scorer = IncrementalScorer(problem, random_assignment(problem, rng) if initial is None else initial)
+    neighbourhood = Neighbourhood(problem, scorer, swap_prob)
+    progress = _Progress(scorer, checkpoint, checkpoint_interval, start)
+
+    step = 0
+    now = start
+    while progress.best_score < 0 and (max_steps is None or step < max_steps):
+        now = timer()
+        if max_time is not None and now - start > max_time:
+            break
+        temp = schedule(step)
+        if temp <= 0:
+            break
+        step += 1
+        neighbour = neighbourhood.sample(rng)
+        if neighbour is None:
+            continue
+        delta = neighbourhood.delta(neighbour)
+        if delta >= 0 or rng.random() < np.exp(delta / temp):
+            neighbourhood.apply(neighbour)
+            if delta > 0:
+                progress.update(scorer, step)
+        progress.maybe_checkpoint(step, now)
+
+    return progress.result(step, timer())
+
+# -------------------------------------------------------------------------------------
+def tabu_search(problem, tenure=20, n_candidates=50, max_time=None, max_steps=None, swap_prob=0.5, seed=None,
+                initial=None, checkpoint=None, checkpoint_interval=5.0):
+    """ Tabu search over the Move / Swap neighbourhoods: each step looks at n_candidates random neighbours and makes
+        the best one that is not tabu (or that beats the best so far); a course can't go back to a value it left for
+        tenure steps
+
+    :param problem:  the CompactProblem
+    :param tenure:  number of steps a (course, value) it just left stays tabu (the expired ones are dropped every
+                    tenure steps, so the tabu dict stays small however long the search runs)
+    :param n_candidates:  number of random neighbours looked at per step
+    (the other parameters and the result are as for simulated_annealing)
+    """
+    rng = random.Random(seed)
+    start = timer()
+    scorer = IncrementalScorer(problem, random_assignment(problem, rng) if initial is None else initial)
+    neighbourhood = Neighbourhood(problem, scorer, swap_prob)
+    progress = _Progress(scorer, checkpoint, checkpoint_interval, start)
+    tabu = {}
+
+    if max_time is None and max_steps is None:
+        max_steps = 100000
+    step = 0
+    now = start
+    while progress.best_score < 0 and (max_steps is None or step < max_steps):
+        now = timer()
+        if max_time is not None and now - start > max_time:
+            break
+        step += 1
+        if step % max(tenure, 1) == 0:
+            tabu = {x: until for x, until in tabu.items() if until >= step}
+
+        best = None
+        best_delta = None
+        for _ in range(n_candidates):
+            neighbour = neighbourhood.sample(rng)
+            if neighbour is None:
+                continue
+            delta = neighbourhood.delta(neighbour)
+            if best is not None and delta <= best_delta:
+                continue
+            # a neighbour is tabu if it puts a course back on a value it left recently
+            kind, a, b = neighbour
+            if kind == 'move':
+                arrivals = [(a, b)]
+            else:
+                arrivals = [(a, scorer.values[b]), (b, scorer.values[a])]
+            is_tabu = any(tabu.get(x, 0) >= step for x in arrivals)
+            if is_tabu and scorer.score + delta <= progress.best_score:
+                continue
+            best = neighbour
+            best_delta = delta
+        if best is None:
+            continue
+
+        for x in neighbourhood.changed(best):
+            tabu[x] = step + tenure
+        neighbourhood.apply(best)
+        progress.update(scorer, step)
+        progress.maybe_checkpoint(step, now)
+
+    return progress.result(step, timer())
@@ -0,0 +1,221 @@
+# min_conflicts.py: min-conflicts local search for the timetabling CSP over the integer values of a CompactProblem.
+#
+#                   The AIMA min_conflicts() recomputes the conflicted variables from scratch every step and calls
+#                   nconflicts() for every value of the chosen variable, which is O(n * |domain| * n) per step. Here
+#                   a ConflictCounts object keeps, for every course and every value, the number of courses it would
+#                   conflict with, and the set of courses that are currently in conflict, and both are updated
+#                   incrementally when a course moves.
+#
+#                   The constraints are the ones of the TimetablingCSP: two courses conflict if their time slots
+#                   overlap and they are in the same room or share a curriculum.
+
+# import standard packages
+import random
+from timeit import default_timer as timer
+import numpy as np
+
+# import our code (in the same directory as this file)
+from compact_problem import UNASSIGNED
+
+# -------------------------------------------------------------------------------------
+class ConflictCounts():
+    """Conflict bookkeeping for a (partial) integer-encoded assignment
+        counts[c, v]        number of assigned courses (other than c) that c conflicts with if c has value v
+        values[c]           the current value of course c (UNASSIGNED if none)
+        conflicted          the courses whose current value conflicts with another course (see random_conflicted())
+        total               the number of conflicting pairs
+        assign(c, v)        give course c value v (or move it)
+    """
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.n_slots = problem.n_slots
+        self.n_rooms = problem.n_rooms
+        n = problem.n_courses
+
+        # curriculum neighbors of each course (as an id array)
+        neighbor_sets = [set() for _ in range(n)]
+        for members in problem.curriculum_members:
+            members = members.tolist()
+            for c in members:
+                neighbor_sets[c].update(members)
+        for c in range(n):
+            neighbor_sets[c].discard(c)
+        self.neighbor_ids = [np.array(sorted(s), dtype=np.int64) for s in neighbor_sets]
+        self.neighbor_lists = [sorted(s) for s in neighbor_sets]
+
+        self.overlapping = [np.array(s, dtype=np.int64) for s in problem.overlapping_slots]
+        self.counts = np.zeros((n, self.n_rooms, self.n_slots), dtype=np.int32)
+        self.values = [UNASSIGNED] * n
+        # courses at each value, to find the ones whose conflicts change when a course moves
+        self.occupants = [set() for _ in range(problem.n_values)]
+        self.total = 0
+
+        # the conflicted courses, kept as a list + position so a random one can be picked in O(1)
+        self._conflicted = []
+        self._position = {}
+
+    # ---------------------------------------------------------------------------------
+    def cost(self, c, v):
+        """The number of courses c conflicts with if it has value v"""
+        room, slot = divmod(v, self.n_slots)
+        return int(self.counts[c, room, slot]) - self._self_count(c, room, slot)
+
+    def _self_count(self, c, room, slot):
+        # counts[c] includes c itself if it is in room at a slot overlapping slot
+        current = self.values[c]
+        if current == UNASSIGNED or current // self.n_slots != room:
+            return 0
+        return 1 if self.problem.slot_overlap_rows[current % self.n_slots][slot] else 0
+
+    def costs(self, c):
+        """The costs of all the values for course c, as a flat array indexed by value"""
+        row = self.counts[c].ravel().copy()
+        current = self.values[c]
+        if current != UNASSIGNED:
+            room, slot = divmod(current, self.n_slots)
+            row[room * self.n_slots + self.overlapping[slot]] -= 1
+        return row
+
+    def _update(self, c, value, delta):
+        # add (delta=1) or remove (delta=-1) the contribution of c=value to the counts of all the other courses
+        room, slot = divmod(value, self.n_slots)
+        ovl = self.overlapping[slot]
+        # same room at an overlapping slot: everyone
+        self.counts[:, room, ovl] += delta
+        # overlapping slot in any other room: the curriculum neighbors
+        nbrs = self.neighbor_ids[c]
+        if len(nbrs):
+            block = self.counts[nbrs[:, None], :, ovl[None, :]]
+            block += delta
+            block[:, :, room] -= delta
+            self.counts[nbrs[:, None], :, ovl[None, :]] = block
+
+    def _affected(self, c, value):
+        # the courses whose conflicts may change when c takes or leaves value
+        room, slot = divmod(value, self.n_slots)
+        base = room * self.n_slots
+        for s in self.problem.overlapping_slots[slot]:
+            yield from self.occupants[base + s]
+
+    def _refresh(self, c):
+        v = self.values[c]
+        in_conflict = v != UNASSIGNED and self.cost(c, v) > 0
+        if in_conflict and c not in self._position:
+            self._position[c] = len(self._conflicted)
+            self._conflicted.append(c)
+        elif not in_conflict and c in self._position:
+            i = self._position.pop(c)
+            last = self._conflicted.pop()
+            if last != c:
+                self._conflicted[i] = last
+                self._position[last] = i
+
+    def assign(self, c, v):
+        """Give course c the value v (UNASSIGNED to unassign it)"""
+        old = self.values[c]
+        if old == v:
+            return
+        affected = set(self.neighbor_lists[c])
+        affected.add(c)
+        if old != UNASSIGNED:
+            self.total -= self.cost(c, old)
+            self._update(c, old, -1)
+            self.occupants[old].discard(c)
+            affected.update(self._affected(c, old))
+            self.values[c] = UNASSIGNED
+        if v != UNASSIGNED:
+            # (with c unassigned, so the counts don't include c itself yet)
+            self.total += self.cost(c, v)
+            self._update(c, v, 1)
+            self.values[c] = v
+            affected.update(self._affected(c, v))
+            self.occupants[v].add(c)
+        for a in affected:
+            self._refresh(a)
+
+    @property
+    def conflicted(self):
+        return list(self._conflicted)
+
+    def random_conflicted(self, rng):
+        return self._conflicted[rng.randrange(len(self._conflicted))] if self._conflicted else None
+
+# -------------------------------------------------------------------------------------
+def min_conflicts(problem, max_steps=100000, max_time=None, tabu_tenure=10, random_walk=0.02, seed=None,
+                  initial=None, verbose=False, stop=None):
+    """ Min-conflicts local search with a tabu list and random walk
+
+    :param problem:  the CompactProblem
+    :param max_steps:  step budget
+    :param max_time:  optional wall-clock budget in seconds
+    :param tabu_tenure:  after a course leaves a value it can't go back to it for this many steps (unless that gives
+                         fewer conflicts than the best so far)
+    :param random_walk:  probability of moving the chosen course to a random value instead of its best one
+    :param seed:  random seed
+    :param initial:  optional starting assignment (dict or array); otherwise every course gets its min-conflicts
+                     value in turn
+    :param stop:  optional event (e.g. multiprocessing.Event) that ends the search when it is set
+    :return:  (best assignment as an int array, number of conflicting pairs in it, stats dict)
+    """
+    rng = random.Random(seed)
+    start = timer()
+    n = problem.n_courses
+    domains = [np.flatnonzero(m) for m in problem.domain_mask]
+    for c, d in enumerate(domains):
+        if len(d) == 0:
+            raise ValueError('course %s has an empty domain' % problem.course_names[c])
+    allowed = problem.domain_mask
+
+    counts = ConflictCounts(problem)
+    if initial is not None:
+        for c, v in enumerate(problem.assignment_array(initial).tolist()):
+            if v != UNASSIGNED:
+                counts.assign(c, v)
+    for c in range(n):
+        if counts.values[c] == UNASSIGNED:
+            costs = counts.costs(c)[domains[c]]
+            best = np.flatnonzero(costs == costs.min())
+            counts.assign(c, int(domains[c][best[rng.randrange(len(best))]]))
+
+    best_values = np.array(counts.values, dtype=np.int64)
+    best_total = counts.total
+    best_step = 0
+    tabu = np.zeros((n, problem.n_values), dtype=np.int64)
+    step = 0
+    while step < max_steps and best_total > 0:
+        if max_time is not None and timer() - start > max_time:
+            break
+        if stop is not None and stop.is_set():
+            break
+        step += 1
+        c = counts.random_conflicted(rng)
+        current = counts.values[c]
+
+        if rng.random() < random_walk:
+            v = int(domains[c][rng.randrange(len(domains[c]))])
+        else:
+            costs = counts.costs(c)
+            # tabu values are allowed if they would beat the best so far (aspiration)
+            ok = allowed[c] & ((tabu[c] < step) | (counts.total - costs[current] + costs < best_total))
+            ok[current] = False
+            candidates = np.flatnonzero(ok)
+            if len(candidates) == 0:
+                continue
+            costs = costs[candidates]
+            best = candidates[costs == costs.min()]
+            v = int(best[rng.randrange(len(best))])
+        if v == current:
+            continue
+
+        counts.assign(c, v)
+        tabu[c, current] = step + tabu_tenure
+        if counts.total < best_total:
+            best_total = counts.total
+            best_values = np.array(counts.values, dtype=np.int64)
+            best_step = step
+            if verbose:
+                print('step %d: %d conflicts' % (step, best_total))
+
+    stats = {'steps': step, 'time': timer() - start, 'best_step': best_step}
+    return best_values, best_total, stats
@@ -0,0 +1,126 @@
+# product_domain.py: a lazy view of the (room, TimeSlot) domain of a course. set_up_csp used to build the cartesian
+#                    product of the room and day-time domains as a list of tuples for every course, which takes
+#                    rooms x slots tuples per course. A ProductDomain only keeps the two sub-domains (plus whatever
+#                    has been pruned) and makes the (room, TimeSlot) values as they are asked for, so memory grows with
+#                    rooms + slots.
+#
+#                    It behaves enough like the domain lists the AIMA CSP code uses (len, in, iteration, indexing,
+#                    remove / append for prune / restore) that it can be used in their place.
+
+# -------------------------------------------------------------------------------------
+class _Fixed():
+    # what ProductDomain.fix() returns so that append() can undo it (the domain was fixed to previous before)
+    __slots__ = ('previous',)
+
+    def __init__(self, previous):
+        self.previous = previous
+
+    def __repr__(self):
+        return '<fixed, was %r>' % (self.previous,)
+
+class ProductDomain():
+    """The values (room, time slot) for room in rooms and time slot in slots, in that order (rooms outer), without
+    building them
+        len(d), value in d, iter(d), d[i]       as for the list of tuples
+        d.remove(value)                         prune a value (ValueError if it isn't there)
+        d.append(value)                         put a pruned value back
+        d.fix(value)                            reduce the domain to the single value; append() the returned object
+                                                to undo it
+        d.copy()                                a copy that can be pruned separately (the sub-domains are shared)
+    Iteration works on a snapshot of the pruned values, so the domain can be pruned / restored while iterating over it
+    (as forward checking does).
+    """
+    __slots__ = ('rooms', 'slots', '_room_set', '_slot_set', '_removed', '_fixed')
+
+    def __init__(self, rooms, slots, _room_set=None, _slot_set=None):
+        self.rooms = rooms
+        self.slots = slots
+        self._room_set = frozenset(rooms) if _room_set is None else _room_set
+        self._slot_set = frozenset(slots) if _slot_set is None else _slot_set
+        self._removed = set()
+        self._fixed = None
+
+    def copy(self):
+        d = ProductDomain(self.rooms, self.slots, self._room_set, self._slot_set)
+        d._removed = set(self._removed)
+        d._fixed = self._fixed
+        return d
+
+    def _in_product(self, value):
+        try:
+            room, slot = value
+        except (TypeError, ValueError):
+            return False
+        return room in self._room_set and slot in self._slot_set
+
+    def __contains__(self, value):
+        if self._fixed is not None:
+            return value == self._fixed and value not in self._removed
+        return self._in_product(value) and value not in self._removed
+
+    def __len__(self):
+        if self._fixed is not None:
+            return 0 if self._fixed in self._removed else 1
+        return len(self.rooms) * len(self.slots) - len(self._removed)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        # snapshot the state, the generator below only runs when it is first asked for a value
+        fixed = self._fixed
+        removed = frozenset(self._removed)
+        return self._values(fixed, removed)
+
+    def _values(self, fixed, removed):
+        if fixed is not None:
+            if fixed not in removed:
+                yield fixed
+            return
+        slots = self.slots
+        for room in self.rooms:
+            if removed:
+                for slot in slots:
+                    value = (room, slot)
+                    if value not in removed:
+                        yield value
+            else:
+                for slot in slots:
+                    yield (room, slot)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('ProductDomain index out of range')
+        if self._fixed is None and not self._removed:
+            # no pruning, so the index maps straight onto the sub-domains
+            n_slots = len(self.slots)
+            return self.rooms[index // n_slots], self.slots[index % n_slots]
+        for i, value in enumerate(self):
+            if i == index:
+                return value
+
+    def remove(self, value):
+        if value not in self:
+            raise ValueError('%r is not in the domain' % (value,))
+        self._removed.add(value)
+
+    def append(self, value):
+        if isinstance(value, _Fixed):
+            self._fixed = value.previous
+        elif value in self._removed:
+            self._removed.discard(value)
+        else:
+            raise ValueError('%r was not removed from the domain' % (value,))
+
+    def fix(self, value):
+        fixed = _Fixed(self._fixed)
+        self._fixed = value
+        return fixed
+
+    def __repr__(self):
+        return 'ProductDomain(%d rooms x %d slots, %d values)' % (len(self.rooms), len(self.slots), len(self))
@@ -1,152 +1,326 @@
 # read_itc_data_file.py: parse the ITC file format and return xxx#
+#
+#                        read_itc_data_file() streams the file a line at a time (the raw lines are never all held in
+#                        memory), finds the sections by their headers and builds the dicts the rest of the code uses as
+#                        it goes; anything malformed raises an ITCParseError that says where. parse_itc_data_file()
+#                        returns the same data with integer ids and arrays (an ITCData).
 
-import sys
+from itertools import chain
+import numpy as np
+
+# header fields (all but Name are ints) and section headers of the ITC-2007 .ctt format
+HEADER_FIELDS = ['Name:', 'Courses:', 'Rooms:', 'Days:', 'Periods_per_day:', 'Curricula:', 'Constraints:']
+SECTIONS = ['COURSES:', 'ROOMS:', 'CURRICULA:', 'UNAVAILABILITY_CONSTRAINTS:']
+
+# the numbers most fields hold, by their text: a dict lookup is several times cheaper than int(), and a field that
+# isn't found (a negative or big number, or not a number at all) is left to the careful path of the parser
+NUMBERS = {str(i): i for i in range(1000)}
 
 # -------------------------------------------------------------------------------------
-def read_itc_data_file(file_name):
+class ITCParseError(ValueError):
+    """Raised for a malformed ITC data file; file_name, line_number (1-based, None if the problem is not on one
+    line) and section (None in the header) say where"""
 
-    with open(file_name, 'r') as f:
-        all_lines = f.readlines()
-    # print(all_lines)
-
-    # Let's grab info from each section
-    # Header format:
-    #   Name: ToyExample
-    #   Courses: 4
-    #   Rooms: 2
-    #   Days: 5
-    #   Periods_per_day: 4
-    #   Curricula: 2
-    #   Constraints: 8
-
-    # Name
-    words = all_lines[0].split()
-    if words[0] == 'Name:':
-        data_name = words[1]
-
-    # Courses
-    words = all_lines[1].split()
-    if words[0] == 'Courses:':
-        num_courses = int(words[1])
-
-    # Rooms
-    words = all_lines[2].split()
-    if words[0] == 'Rooms:':
-        num_rooms = int(words[1])
-
-    # Days
-    words = all_lines[3].split()
-    if words[0] == 'Days:':
-        num_days = int(words[1])
-
-    # Periods_per_day
-    words = all_lines[4].split()
-    if words[0] == 'Periods_per_day:':
-        periods_per_day = int(words[1])
-
-    # Curricula
-    words = all_lines[5].split()
-    if words[0] == 'Curricula:':
-        num_curricula = int(words[1])
-
-    # Constraints
-    words = all_lines[6].split()
-    if words[0] == 'Constraints:':
-        num_constraints = int(words[1])
-
-    # print('name:', data_name)
-    # print('courses:', num_courses)
-    # print('rooms:', num_rooms)
-    # print('days:', num_days)
-    # print('periods_per_day:', periods_per_day)
-    # print('curricula:', num_curricula)
-    # print('constraints:', num_constraints)
-
-    # assume for now that the header section is static and the start lines for other sections is based on the
-    # numbers provided in the header
-    course_section_start = 8 # line 9 in a text editor, but the array indexing starts at 0
-    room_section_start = course_section_start + num_courses + 2
-    curricula_section_start = room_section_start + num_rooms + 2
-    unavail_section_start = curricula_section_start + num_curricula + 2
-
-    # Courses Section
-    # COURSES: course id, teacher id, (num days to schedule on, num lectures to be scheduled)?, max number of students
-    # SceCosC Ocra 3 3 30
-    # ArcTec Indaco 3 2 42
-    # TecCos Rosa 5 4 40
-    # Geotec Scarlatti 5 4 18
-
-    words = all_lines[course_section_start].split()
-    if words[0] != 'COURSES:':
-        print('Error parsing COURSES section')
-        sys.exit()
+    def __init__(self, message, file_name=None, line_number=None, section=None):
+        self.message = message
+        self.file_name = file_name
+        self.line_number = line_number
+        self.section = section
+        where = '%s:%s' % (file_name or '<input>', line_number if line_number is not None else '')
+        super().__init__('%s: %s%s' % (where.rstrip(':'), '[%s] ' % section if section else '', message))
 
-    courses = {}
-    for i in range(num_courses):
-        words = all_lines[course_section_start+i+1].split()
-        courses[words[0]] = [words[1], int(words[2]), int(words[3]), int(words[4])]
-    # print('courses:', courses)
+# -------------------------------------------------------------------------------------
+class ITCData():
+    """The content of an ITC data file with everything mapped to integer ids (position in the file)
+        name, num_days, periods_per_day
+        course_names, room_names, curriculum_names, teacher_names       id -> name lists
+        course_teacher, course_lectures, course_min_days, course_students   int arrays by course id
+        room_capacity                                                   int array by room id
+        curriculum_start, curriculum_courses    the curricula in compressed form: the course ids of curriculum q are
+                                                curriculum_courses[curriculum_start[q]:curriculum_start[q+1]]
+        unavailability                          int array (n, 3) of (course id, day, period)
+    """
 
-    # Rooms Section
-    # ROOMS: room name, capacity
-    # A 32
-    # B 50
+    def __init__(self, name, courses, rooms, num_days, periods_per_day, unavail_constraints, curricula):
+        """ Construct an ITCData from the dicts of read_itc_data_file (and the Name: of the header)"""
+        self.name = name
+        self.num_days = num_days
+        self.periods_per_day = periods_per_day
+        self._dicts = courses, rooms, num_days, periods_per_day, unavail_constraints, curricula
 
-    words = all_lines[room_section_start].split()
-    if words[0] != 'ROOMS:':
-        print('Error parsing ROOMS section')
-        sys.exit()
+        self.course_names = list(courses)
+        course_index = {c: i for i, c in enumerate(self.course_names)}
+        n = len(courses)
+        teachers, lectures, min_days, students = zip(*courses.values()) if n else ((),) * 4
+        teacher_index = {t: i for i, t in enumerate(dict.fromkeys(teachers))}
+        self.teacher_names = list(teacher_index)
+        self.course_teacher = np.fromiter(map(teacher_index.__getitem__, teachers), dtype=np.int64, count=n)
+        self.course_lectures = np.fromiter(lectures, dtype=np.int64, count=n)
+        self.course_min_days = np.fromiter(min_days, dtype=np.int64, count=n)
+        self.course_students = np.fromiter(students, dtype=np.int64, count=n)
 
-    rooms = {}
-    for i in range(num_rooms):
-        words = all_lines[room_section_start+i+1].split()
-        rooms[words[0]] = int(words[1])
-    # print('rooms:', rooms)
+        self.room_names = list(rooms)
+        self.room_capacity = np.fromiter(rooms.values(), dtype=np.int64, count=len(rooms))
 
-    # Curricula Section
-    # CURRICULA:
-    # Cur1 3 SceCosC ArcTec TecCos
-    # Cur2 2 TecCos Geotec
+        self.curriculum_names = list(curricula)
+        sizes = np.fromiter((len(members) for members in curricula.values()), dtype=np.int64, count=len(curricula))
+        self.curriculum_start = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        self.curriculum_courses = np.fromiter(map(course_index.__getitem__, chain.from_iterable(curricula.values())),
+                                              dtype=np.int64, count=int(self.curriculum_start[-1]))
 
-    words = all_lines[curricula_section_start].split()
-    if words[0] != 'CURRICULA:':
-        print('Error parsing CURRICULA section')
-        sys.exit()
+        # (no list of tuples for np.array to walk: the course of each constraint is repeated over its slots, and the
+        # days and periods are read off as one flat sequence)
+        counts = np.fromiter(map(len, unavail_constraints.values()), dtype=np.int64, count=len(unavail_constraints))
+        constrained = np.fromiter(map(course_index.__getitem__, unavail_constraints), dtype=np.int64,
+                                  count=len(unavail_constraints))
+        slots = np.fromiter(chain.from_iterable(chain.from_iterable(unavail_constraints.values())), dtype=np.int64,
+                            count=2 * int(counts.sum()))
+        self.unavailability = np.column_stack((np.repeat(constrained, counts), slots.reshape(-1, 2)))
 
-    curricula = {}
-    for i in range(num_curricula):
-        words = all_lines[curricula_section_start+i+1].split()
-        # num_courses_in_curricula = int(words[1])
-        the_courses = words[2:]
-        curricula[words[0]] = the_courses
-    # print('curricula:', curricula)
-
-    # Unavailability Constraints Section
-    # UNAVAILABILITY_CONSTRAINTS:
-    # TecCos 2 0
-    # TecCos 2 1
-    # TecCos 3 2
-    # TecCos 3 3
-    # ArcTec 4 0
-    # ArcTec 4 1
-    # ArcTec 4 2
-    # ArcTec 4 3
-
-    words = all_lines[unavail_section_start].split()
-    if words[0] != 'UNAVAILABILITY_CONSTRAINTS:':
-        print('Error parsing UNAVAILABILITY_CONSTRAINTS section')
-        sys.exit()
+    def curriculum(self, q):
+        """Return the course ids of curriculum q"""
+        return self.curriculum_courses[self.curriculum_start[q]:self.curriculum_start[q+1]]
+
+    def as_dicts(self):
+        """Return the data as read_itc_data_file does:
+        courses, rooms, num_days, periods_per_day, unavail_constraints, curricula"""
+        return self._dicts
 
+# -------------------------------------------------------------------------------------
+def parse_itc_dicts(lines, file_name=None, strict=False):
+    """ Single pass parser for the ITC format over any iterable of lines (e.g. an open file). Each section is read by
+        its own loop until the next section header, so the sections are found by their headers, in any order (but
+        the courses have to come before the unavailability constraints that refer to them). The entries go straight
+        into the dicts of read_itc_data_file: a new entry with the right number of fields and numbers that are
+        found in NUMBERS (or in range, for the days and periods) is stored straight away, anything else is checked
+        field by field (and stored if it is fine), and the counts and the courses of the curricula are checked at
+        the end.
+
+    :param lines:  iterable of the lines of the file
+    :param file_name:  only used in error messages
+    :param strict:  also check that unavailability days / periods are in range (some of our modified problem files
+                    block days or periods that don't exist, which set_up_csp ignores)
+    :return:  name (the Name: of the header) and the dicts of read_itc_data_file: courses, rooms, num_days,
+              periods_per_day, unavail_constraints, curricula
+    """
+    courses = {}
+    rooms = {}
+    curricula = {}
     unavail_contraints = {}
-    for i in range(num_constraints):
-        words = all_lines[unavail_section_start+i+1].split()
-        if words[0] not in unavail_contraints:
-            unavail_contraints[words[0]] = [(int(words[1]), int(words[2]))]
+    num_unavail = 0
+
+    stop = set(SECTIONS)
+    stop.add('END.')
+    numbered_lines = enumerate(lines, 1)
+    line_number = 0
+    words = None
+    section = None
+
+    try:
+        # header: "Field: value" lines up to the first section
+        header = {}
+        for line_number, line in numbered_lines:
+            words = line.split()
+            if not words:
+                continue
+            key = words[0]
+            if key in stop:
+                break
+            if key not in HEADER_FIELDS:
+                raise ITCParseError('unknown header field %r' % key, file_name, line_number)
+            if len(words) != 2:
+                raise ITCParseError('header field %s should have exactly one value' % key, file_name, line_number)
+            if key in header:
+                raise ITCParseError('duplicate header field %s' % key, file_name, line_number)
+            header[key] = words[1] if key == 'Name:' else int(words[1])
         else:
-            unavail_contraints[words[0]].append((int(words[1]), int(words[2])))
-    # print('unavail_contraints:', unavail_contraints)
+            words = None
+        missing = [f for f in HEADER_FIELDS if f not in header]
+        if missing:
+            raise ITCParseError('header is missing %s' % ', '.join(missing), file_name, line_number)
+        num_days = header['Days:']
+        periods_per_day = header['Periods_per_day:']
+
+        # words is the section header (or END.) that stopped the previous loop, None at the end of the file
+        seen_sections = []
+        while words is not None:
+            key = words[0]
+            if key == 'END.':
+                for line_number, line in numbered_lines:
+                    if line.strip():
+                        raise ITCParseError('unexpected data after END.', file_name, line_number)
+                break
+            if len(words) != 1:
+                raise ITCParseError('unexpected data after section header %s' % key, file_name, line_number)
+            if key in seen_sections:
+                raise ITCParseError('duplicate section %s' % key, file_name, line_number)
+            section = key
+            seen_sections.append(section)
+
+            if section == 'COURSES:':
+                # course id, teacher id, num lectures, min working days, num students
+                for line_number, line in numbered_lines:
+                    words = line.split()
+                    if len(words) != 5:
+                        if not words:
+                            continue
+                        if words[0] in stop:
+                            break
+                        raise ITCParseError('a course needs 5 fields (id, teacher, lectures, min days, students), '
+                                            'got %d' % len(words), file_name, line_number, section)
+                    key, teacher, lectures, min_days, students = words
+                    course = [teacher, NUMBERS.get(lectures), NUMBERS.get(min_days), NUMBERS.get(students)]
+                    if key not in courses and None not in course:
+                        courses[key] = course
+                        continue
+                    if key in courses:
+                        raise ITCParseError('duplicate course %s' % key, file_name, line_number, section)
+                    course = [teacher, int(lectures), int(min_days), int(students)]
+                    for what, value in zip(['lectures', 'min working days', 'students'], course[1:]):
+                        if value < 0:
+                            raise ITCParseError('%s has negative %s' % (key, what), file_name, line_number,
+                                                section)
+                    courses[key] = course
+                else:
+                    words = None
 
-    return courses, rooms, num_days, periods_per_day, unavail_contraints, curricula
+            elif section == 'ROOMS:':
+                # room name, capacity
+                for line_number, line in numbered_lines:
+                    words = line.split()
+                    if len(words) != 2:
+                        if not words:
+                            continue
+                        if words[0] in stop:
+                            break
+                        raise ITCParseError('a room needs 2 fields (name, capacity), got %d' % len(words),
+                                            file_name, line_number, section)
+                    key, capacity = words
+                    if key not in rooms and capacity in NUMBERS:
+                        rooms[key] = NUMBERS[capacity]
+                        continue
+                    if key in rooms:
+                        raise ITCParseError('duplicate room %s' % key, file_name, line_number, section)
+                    if int(capacity) < 0:
+                        raise ITCParseError('%s has negative capacity' % key, file_name, line_number, section)
+                    rooms[key] = int(capacity)
+                else:
+                    words = None
+
+            elif section == 'CURRICULA:':
+                # curriculum name, number of courses, course ids (the courses are checked at the end, all at once)
+                for line_number, line in numbered_lines:
+                    words = line.split()
+                    if len(words) < 2:
+                        if not words:
+                            continue
+                        if words[0] in stop:
+                            break
+                        raise ITCParseError('curriculum %s should be a name, a number of courses and that many '
+                                            'courses' % words[0], file_name, line_number, section)
+                    key = words[0]
+                    if key not in curricula and int(words[1]) == len(words) - 2:
+                        curricula[key] = words[2:]
+                        continue
+                    if key in curricula:
+                        raise ITCParseError('duplicate curriculum %s' % key, file_name, line_number, section)
+                    raise ITCParseError('curriculum %s should be a name, a number of courses and that many courses'
+                                        % key, file_name, line_number, section)
+                else:
+                    words = None
+
+            else:
+                # UNAVAILABILITY_CONSTRAINTS: course id, day, period; the days and periods in range are looked up as
+                # strings (a dict lookup is several times cheaper than int(), and there is one per number)
+                day_numbers = {str(day): day for day in range(num_days)}
+                period_numbers = {str(period): period for period in range(periods_per_day)}
+                for line_number, line in numbered_lines:
+                    words = line.split()
+                    if len(words) != 3:
+                        if not words:
+                            continue
+                        if words[0] in stop:
+                            break
+                        raise ITCParseError('an unavailability constraint needs 3 fields (course, day, period), '
+                                            'got %d' % len(words), file_name, line_number, section)
+                    key, day_text, period_text = words
+                    day = day_numbers.get(day_text)
+                    period = period_numbers.get(period_text)
+                    if day is not None and period is not None and key in courses:
+                        unavail_contraints.setdefault(key, []).append((day, period))
+                        continue
+                    if key not in courses:
+                        raise ITCParseError('unavailability constraint for unknown course %s' % key, file_name,
+                                            line_number, section)
+                    day = int(day_text)
+                    period = int(period_text)
+                    if day < 0 or period < 0:
+                        raise ITCParseError('negative day or period in the unavailability constraints', file_name,
+                                            line_number, section)
+                    if strict and not (day < num_days and period < periods_per_day):
+                        raise ITCParseError('day %d / period %d is outside the %d days x %d periods' %
+                                            (day, period, num_days, periods_per_day), file_name, line_number,
+                                            section)
+                    unavail_contraints.setdefault(key, []).append((day, period))
+                else:
+                    words = None
+
+    except ValueError as e:
+        # int() of something that is not a number (ITCParseError is a ValueError too, pass those on)
+        if isinstance(e, ITCParseError):
+            raise
+        raise ITCParseError('expected an integer: %s' % e, file_name, line_number, section) from None
+
+    # all the sections have to be there, with as many entries as the header says
+    num_unavail = sum(map(len, unavail_contraints.values()))
+    for name, found, field in [('COURSES:', len(courses), 'Courses:'), ('ROOMS:', len(rooms), 'Rooms:'),
+                               ('CURRICULA:', len(curricula), 'Curricula:'),
+                               ('UNAVAILABILITY_CONSTRAINTS:', num_unavail, 'Constraints:')]:
+        if name not in seen_sections and header[field] > 0:
+            raise ITCParseError('missing section %s' % name, file_name)
+        if found != header[field]:
+            raise ITCParseError('header says %s %d but the section has %d entries' % (field, header[field], found),
+                                file_name, None, name)
+
+    # the courses of the curricula
+    unknown = set().union(*curricula.values()).difference(courses)
+    if unknown:
+        key, course = next((q, c) for q, members in curricula.items() for c in members if c in unknown)
+        raise ITCParseError('curriculum %s refers to unknown course %s' % (key, course), file_name, None,
+                            'CURRICULA:')
+
+    for field in HEADER_FIELDS[1:]:
+        if header[field] < 0:
+            raise ITCParseError('negative %s in the header' % field, file_name)
+
+    return header['Name:'], (courses, rooms, num_days, periods_per_day, unavail_contraints, curricula)
+
+def parse_itc_lines(lines, file_name=None, strict=False):
+    """ parse_itc_dicts(), as an ITCData with integer ids and arrays
+
+    :return:  an ITCData
+    """
+    name, dicts = parse_itc_dicts(lines, file_name, strict)
+    return ITCData(name, *dicts)
+
+# -------------------------------------------------------------------------------------
+def parse_itc_data_file(file_name, strict=False):
+    """ Parses an ITC data file into an ITCData (see parse_itc_lines), raises ITCParseError if it is malformed"""
+    with open(file_name, 'r') as f:
+        return parse_itc_lines(f, file_name, strict)
+
+# -------------------------------------------------------------------------------------
+def read_itc_data_file(file_name):
+    """ Parses an ITC data file, raises ITCParseError if it is malformed
+
+    :return:  courses (dict): key = course, value = [teacher, num lectures, min working days, num students]
+              rooms (dict): key = room, value = capacity
+              num_days, periods_per_day (int)
+              unavail_constraints (dict): key = course, value = list of (day, period) tuples
+              curricula (dict): key = curriculum, value = list of courses
+    """
+    with open(file_name, 'r') as f:
+        return parse_itc_dicts(f, file_name)[1]
 
 # -------------------------------------------------------------------------------------
 if __name__ == "__main__":
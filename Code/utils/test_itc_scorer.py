@@ -0,0 +1,57 @@
+# test_itc_scorer.py: checks that ITCDeltaScorer keeps the same penalties as ITCScorer.evaluate() (see itc_scorer.py)
+#                     through random moves, swaps and unassigns.
+#
+#                     usage: python -m pytest test_itc_scorer.py
+
+# import standard packages
+import os
+import random
+import sys
+import pytest
+
+# set the path and import our code
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "../aima"))
+from compact_problem import UNASSIGNED
+from itc_scorer import ITCScorer, ITCDeltaScorer
+
+FILES = ['comp01', 'comp05', 'comp07', 'toy_prob']
+N_STEPS = 300
+
+# -------------------------------------------------------------------------------------
+def random_values(scorer, rng, unassigned=0.1):
+    # a random value (any room and period) for each lecture, a few of them left unassigned
+    return [UNASSIGNED if rng.random() < unassigned else rng.randrange(scorer.n_values)
+            for _ in range(scorer.n_lectures)]
+
+def assert_matches(scorer, delta_scorer):
+    values = delta_scorer.values
+    assert delta_scorer.breakdown == {k: int(v) for k, v in scorer.evaluate(values).items()}
+    assert delta_scorer.fitness == scorer.fitness(values)
+
+@pytest.mark.parametrize('name', FILES)
+def test_delta_scorer_matches_evaluate(name):
+    rng = random.Random(name)
+    scorer = ITCScorer(os.path.join(HERE, '../../Data/ITC-2007/%s.ctt.txt' % name))
+    delta_scorer = ITCDeltaScorer(scorer, random_values(scorer, rng))
+    assert_matches(scorer, delta_scorer)
+
+    for _ in range(N_STEPS):
+        before = delta_scorer.breakdown
+        kind = rng.choice(['move', 'swap', 'unassign'])
+        lecture = rng.randrange(scorer.n_lectures)
+        if kind == 'swap':
+            other = rng.randrange(scorer.n_lectures)
+            predicted = delta_scorer.score_swap(lecture, other)
+            assert delta_scorer.breakdown == before
+            changes = delta_scorer.apply_swap(lecture, other)
+        else:
+            value = rng.randrange(scorer.n_values) if kind == 'move' else UNASSIGNED
+            predicted = delta_scorer.score_move(lecture, value)
+            assert delta_scorer.breakdown == before
+            changes = delta_scorer.apply_move(lecture, value)
+        # the changes are the ones predicted, and they add up to the penalties evaluate() gives
+        assert changes == predicted
+        after = delta_scorer.breakdown
+        assert {k: after[k] - before[k] for k in after} == {k: changes.get(k, 0) for k in after}
+        assert_matches(scorer, delta_scorer)
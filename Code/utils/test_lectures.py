@@ -0,0 +1,49 @@
+# test_lectures.py: checks of the symmetry breaking of LectureTimetablingCSP (see lectures.py).
+#
+#                   usage: python -m pytest test_lectures.py
+
+# import standard packages
+import os
+import sys
+
+# set the path and import our code
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "../aima"))
+sys.path.append(os.path.join(HERE, "../csp"))
+from lectures import LectureTimetablingCSP
+from solve_itc_baseline_csp import set_up_lecture_csp
+
+# comp01 has two rooms of capacity 30 (F and S)
+FILE_NAME = os.path.join(HERE, '../../Data/ITC-2007/comp01.ctt.txt')
+
+# -------------------------------------------------------------------------------------
+def make_csp():
+    variables, domains, constraints, groups, time_slots, rooms, students = set_up_lecture_csp(FILE_NAME)
+    return LectureTimetablingCSP(variables, domains, constraints, groups, rooms, students)
+
+def test_itc_periods_are_exact():
+    # the ITC periods overlap none of each other (only the MW / TR style TimeSlots, which no lecture can take)
+    csp = make_csp()
+    assert csp._exact and all(csp._exact.values())
+
+def test_identical_rooms_are_dropped():
+    csp = make_csp()
+    var = next(iter(csp.variables))
+    choices = csp.choices(var)
+    assert len(choices) < len(list(csp.domains[var]))
+    # with nothing assigned only the first of the identical rooms is offered at each timeslot
+    offered = set(choices)
+    for room, ts in csp.domains[var]:
+        if csp.earlier_rooms[room]:
+            assert (room, ts) not in offered
+            assert (csp.earlier_rooms[room][0], ts) in offered
+
+def test_identical_room_is_offered_once_the_first_is_taken():
+    csp = make_csp()
+    var, other = list(csp.variables)[:2]
+    room = next(r for r in csp.earlier_rooms if csp.earlier_rooms[r])
+    first = csp.earlier_rooms[room][0]
+    ts = next(ts for r, ts in csp.domains[var] if r == first)
+    assignment = {}
+    csp.assign(other, (first, ts), assignment)
+    assert (room, ts) in csp.choices(var)
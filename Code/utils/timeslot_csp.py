@@ -1,68 +1,153 @@
 # time_slot.py: defines the TimeSlot class
 
+# import standard packages
+import numpy as np
+
+# -------------------------------------------------------------------------------------
+# every distinct TimeSlot is interned: the instances are kept in _ALL_TIMESLOTS (position == TimeSlot.index) and the
+# overlap between every pair of them is computed once, when a slot is first created, and kept in _OVERLAP
+_INTERNED = {}       # key = (days tuple, start, stop), value = TimeSlot
+_ALL_TIMESLOTS = []  # TimeSlot.index -> TimeSlot
+_OVERLAP = []        # _OVERLAP[i][j] is True if the timeslots with index i and j overlap
+
+def _compute_overlap(a, b):
+    # returns true if a overlaps with b
+
+    # does the day overlap?
+    this_set = set(a.days)
+    ts_set = set(b.days)
+    if not (this_set & ts_set):
+        return False
+
+    # these timeslots do not overlap if
+    #   the other stops before this starts OR
+    #   the other starts after this ends
+    if b.stop < a.start or b.start > a.stop:
+        return False
+    return True
+
 # -------------------------------------------------------------------------------------
 # create a class to represent a course time slot
 class TimeSlot():
-    def __init__(self, days, time_start, time_stop):
-        """ Construct a TimeSlot object"""
+    """ A course time slot. TimeSlot instances are interned and immutable: constructing a TimeSlot with the same
+    days, start and stop returns the same instance, so equality and hashing are identity based and overlaps() is a
+    lookup in a table that is filled in once per distinct slot. Each slot gets a stable integer index (the order in
+    which the slots were first created, so define_all_timeslots() always gives 0, 1, 2, ...)"""
+    __slots__ = ('days', 'start', 'stop', 'index', '_repr')
+
+    def __new__(cls, days, time_start, time_stop):
+        """ Construct (or look up) a TimeSlot object"""
         # days is a list of chars
         # times should be ints (4 digits using military time)
-        # if isinstance(days, list):
-        self.days = days
-        # else:
-        #     self.days = [days]
-        self.start = time_start
-        self.stop = time_stop
+        key = (tuple(days), time_start, time_stop)
+        ts = _INTERNED.get(key)
+        if ts is not None:
+            return ts
 
-    def __repr__(self):
-        if len(self.days) == 1:
-            return "%s-%04d-%04d" % (self.days, self.start, self.stop)
+        ts = object.__new__(cls)
+        if len(days) == 1:
+            ts_repr = "%s-%04d-%04d" % (days, time_start, time_stop)
         else:
-            days_str = ''.join(self.days)
-            return "%s-%04d-%04d" % (days_str, self.start, self.stop)
+            days_str = ''.join(days)
+            ts_repr = "%s-%04d-%04d" % (days_str, time_start, time_stop)
+        object.__setattr__(ts, 'days', days if isinstance(days, str) else key[0])
+        object.__setattr__(ts, 'start', time_start)
+        object.__setattr__(ts, 'stop', time_stop)
+        object.__setattr__(ts, 'index', len(_ALL_TIMESLOTS))
+        object.__setattr__(ts, '_repr', ts_repr)
+
+        # add a row and a column to the overlap table
+        row = [_compute_overlap(ts, other) for other in _ALL_TIMESLOTS]
+        for other, overlap in zip(_ALL_TIMESLOTS, row):
+            _OVERLAP[other.index].append(overlap)
+        row.append(_compute_overlap(ts, ts))
+        _OVERLAP.append(row)
+
+        _ALL_TIMESLOTS.append(ts)
+        _INTERNED[key] = ts
+        return ts
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TimeSlot instances are immutable')
+
+    def __reduce__(self):
+        # pickle / copy through the constructor so the copy is the interned instance
+        return (TimeSlot, (self.days, self.start, self.stop))
+
+    def __repr__(self):
+        return self._repr
 
     def __eq__(self, other):
-        return (self.days == other.days) and (self.start == other.start) and (self.stop == other.stop)
+        return self is other
 
     def __ne__(self, other):
-        return (self.days != other.days) or (self.start != other.start) or (self.stop != other.stop)
+        return self is not other
 
     def __lt__(self, other):
         # define < so we can sort a set of TimeSlot variables
-        # if self.start == other.start:
-        #     self.stop < other.stop
-        # else:
-        #     self.start < other.start
-        return self.__repr__() < other.__repr__()
+        return self._repr < other._repr
 
     def __hash__(self):
-        return hash(repr(self))
+        return self.index
 
     def overlaps(self, ts):
         # returns true if self overlaps with ts
+        return _OVERLAP[self.index][ts.index]
+
+# -------------------------------------------------------------------------------------
+def overlap_matrix(time_slots):
+    """ Returns the boolean overlap matrix for a list of TimeSlot instances: m[i, j] is True if time_slots[i]
+    overlaps time_slots[j] (so index with positions in the list, not with TimeSlot.index)"""
+    ids = np.array([ts.index for ts in time_slots], dtype=np.int64)
+    return np.array(_OVERLAP, dtype=bool)[np.ix_(ids, ids)]
+
+def overlap_table():
+    """ Returns the (live) overlap table: overlap_table()[i][j] is True if the TimeSlots with index i and j overlap;
+    it gets a row and a column for each new TimeSlot"""
+    return _OVERLAP
+
+def overlapping_timeslots(ts):
+    """ Returns the list of (interned) TimeSlots that overlap ts, including ts itself"""
+    return [other for other, overlap in zip(_ALL_TIMESLOTS, _OVERLAP[ts.index]) if overlap]
+
+# -------------------------------------------------------------------------------------
+def define_all_timeslots():
+    days2 = [['M', 'W'], ['T', 'R']]
+    days1 = ['M', 'T', 'W', 'R', 'F']
+    times2_start = [700, 830, 1000, 1130, 1300, 1430, 1600, 1730, 1900]  # these are 1:15 minute classes
+    times2_stop = [815, 945, 1115, 1245, 1415, 1545, 1715, 1845, 2015]
+    # start and stop for one-day classes, evening times first
+    times1_start = [1600, 1900, 700, 1000, 1300]  # these are 2:50 minute classes
+    times1_stop = [1850, 2150, 950, 1250, 1550]
+
+    # build a list of all the time periods we could use in this order:
+    # use all 2-day ones first, then add single-day evening, then add single day day-time) ???
+    all_timeslots = []
+    for d in days2:
+        for start, stop in zip(times2_start, times2_stop):
+            all_timeslots.append(TimeSlot(d, start, stop))
+    for d in days1:
+        for start, stop in zip(times1_start, times1_stop):
+            all_timeslots.append(TimeSlot(d, start, stop))
+
+    return all_timeslots
+
+# -------------------------------------------------------------------------------------
+# the ITC-2007 time model: num_days x periods_per_day periods, none of which overlap; period p of day d is the
+# TimeSlot on day ITC_DAYS[d] from 0800 + 100 * p to 0850 + 100 * p
+ITC_DAYS = ['M', 'T', 'W', 'R', 'F', 'S', 'U']
+
+def define_itc_timeslots(num_days, periods_per_day):
+    """ Returns the TimeSlots of the ITC periods, day by day"""
+    # make sure the usual slots are created (and numbered) first
+    define_all_timeslots()
+    return [itc_timeslot(d, p) for d in range(num_days) for p in range(periods_per_day)]
+
+def itc_timeslot(day, period):
+    """ The TimeSlot of ITC period (day, period)"""
+    start = 800 + 100 * period
+    return TimeSlot(ITC_DAYS[day], start, start + 50)
 
-        # does the day overlap?
-        this_set = set(self.days)
-        ts_set = set(ts.days)
-        if not (this_set & ts_set):
-            return False
-
-        # these timelots do not overlap if
-        #   the other stops before this starts OR
-        #   the other starts after this ends
-        if ts.stop < self.start or ts.start > self.stop:
-            return False
-        return True
-
-        # # does the time overlap? 3 cases to check
-        # # does end time of ts land in (self.start, self.stop)
-        # if ts.stop >= self.start and ts.stop <= self.stop:
-        #     return True
-        # # does start time of ts land in (self.start, self.stop)
-        # if ts.start >= self.start and ts.start <= self.stop:
-        #     return True
-        # # does ts completly cover  (self.start, self.stop)
-        # if ts.start <= self.start and ts.stop >= self.stop:
-        #     return True
-        #
-        # return False
+def itc_day_period(ts):
+    """ The (day, period) of a TimeSlot made by itc_timeslot"""
+    return ITC_DAYS.index(ts.days), (ts.start - 800) // 100
@@ -7,7 +7,13 @@
 # TODO:
 import csp
 
-from copy import deepcopy
+from conflict_kernel import compile_constraints
+from constraint_graph import build_neighbors, RoomOccupancy
+from product_domain import ProductDomain
+from trail_domain import TrailDomain
+
+# with at least this many neighbors nconflicts() checks them with one numpy call instead of a loop
+BATCH_MIN_NEIGHBORS = 64
 
 # -------------------------------------------------------------------------------------
 class TimetablingCSP(csp.CSP):
@@ -17,15 +23,26 @@ class TimetablingCSP(csp.CSP):
         attr_names  A list of the names of the attributes for each variable; this is only needed to parse the set of
                     unary constraints (and maybe for printing, output, solution verification)
         domains     A dict of {var:([possible_values for att1, ...], [att2],...)} entries.
+                    (either lists of values or ProductDomains, see product_domain.py)
         neighbors   A dict of {var:[var,...]} that for each variable lists
                     the other variables that participate in constraints
-                    ==> we will build this at init since for a TT problem all courses are neighbors of each other
+                    ==> we build this at init: every course can clash with every other one by room, but those clashes
+                        are found with a RoomOccupancy index (see constraint_graph.py), so the neighbors are only the
+                        courses sharing a curriculum (the only other constraint of the CSP)
         constraints:        A list of functions f(A, a, B, b) that returns true if two variables
                             A, B satisfy the constraint when they have values A=a, B=b
+                            (courses that are not neighbors are assumed to only conflict by room, as in
+                            constraint_different_values)
+        problem     the CompactProblem if the values are its ints rather than (room, TimeSlot) tuples
 
+    The room index follows assign() / unassign(); nconflicts() rebuilds it if it is given some other assignment.
+    Pruning is undone with a trail rather than removal lists: the current domains are TrailDomains (see
+    trail_domain.py), prune() / suppose() push (var, old size) on self.trail (or (var, value) for a ProductDomain),
+    and the "removals" they hand around is just the trail length to restore() back to (see checkpoint()).
+    If the constraints are the usual two, they are compiled into a single ConflictKernel (see conflict_kernel.py).
     """
 
-    def __init__(self, variables, domains, constraints, curricula):
+    def __init__(self, variables, domains, constraints, curricula, problem=None):
         """ Construct a TimetablingCSP problem."""
         self.variables = variables
         # self.attr_names = attr_names
@@ -33,41 +50,76 @@ class TimetablingCSP(csp.CSP):
         self.constraints = constraints
         self.curricula = curricula
         self.curr_domains = None
+        self.trail = []
         self.nassigns = 0
         self.num_unassigns = 0
 
-        # set up neighbors for all variables (it is all the other vars)
-        all_var_names = list(self.variables.keys())
-        self.neighbors = {}
-        for v in self.variables:
-            neighbors = deepcopy(all_var_names)
-            neighbors.remove(v)
-            self.neighbors[v] = neighbors
+        # set up the neighbors (curriculum sharing only) and the room index for the rest
+        self.neighbors = build_neighbors(self.variables, curricula)
+        self.neighbor_sets = {v: set(n) for v, n in self.neighbors.items()}
+        self.room_occupancy = RoomOccupancy(problem)
+        self._indexed_assignment = None
+        self._num_indexed = 0
+
+        # compile the constraints into one check if we can (None otherwise)
+        self.kernel = compile_constraints(constraints, self.variables, curricula, self.neighbors, problem)
 
     def fail_constraints(self, var1, val1, var2, val2):
+        if self.kernel is not None:
+            return self.kernel.conflict(var1, val1, var2, val2)
         for c in self.constraints:
             # constraint functions return true if two variables satisfy the constraint
             if not c(var1, val1, var2, val2, self.curricula):
                 return True
         return False
 
+    def _index_assignment(self, assignment):
+        # make the room index match assignment, if it isn't the one it has been following
+        if assignment is not self._indexed_assignment or len(assignment) != self._num_indexed:
+            self.room_occupancy.clear()
+            if self.kernel is not None:
+                self.kernel.clear()
+            for v, val in assignment.items():
+                self.room_occupancy.add(v, val)
+                if self.kernel is not None:
+                    self.kernel.set_value(v, val)
+            self._indexed_assignment = assignment
+            self._num_indexed = len(assignment)
+
     def nconflicts(self, var, val, assignment):
         """Return the number of conflicts var=val has with other variables."""
-
-        def conflict(var2):
-            # fail = fail_constraints(var, val, var2, assignment[var2])
-            return var2 in assignment and self.fail_constraints(var, val, var2, assignment[var2])
-
+        self._index_assignment(assignment)
         num_conflicts = 0
-        for v in self.neighbors[var]:
-            if conflict(v):
+        if self.kernel is None:
+            for v in self.neighbors[var]:
+                if v in assignment and self.fail_constraints(var, val, v, assignment[v]):
+                    num_conflicts += 1
+        elif len(self.neighbors[var]) < BATCH_MIN_NEIGHBORS:
+            conflict = self.kernel.conflict
+            for v in self.neighbors[var]:
+                if v in assignment and conflict(var, val, v, assignment[v]):
+                    num_conflicts += 1
+        else:
+            num_conflicts = self.kernel.count_neighbor_conflicts(var, val)
+
+        # everyone else can only clash by room
+        neighbor_set = self.neighbor_sets[var]
+        for v in self.room_occupancy.clashes(val):
+            if v != var and v not in neighbor_set:
                 num_conflicts += 1
         return num_conflicts
-        # return utils.count(conflict(v) for v in self.neighbors[var])
 
     def assign(self, var, val, assignment):
         """Add {var: val} to assignment; Discard the old value if any."""
+        self._index_assignment(assignment)
+        if var in assignment:
+            self.room_occupancy.remove(var, assignment[var])
+        else:
+            self._num_indexed += 1
         assignment[var] = val
+        self.room_occupancy.add(var, val)
+        if self.kernel is not None:
+            self.kernel.set_value(var, val)
         self.nassigns += 1
 
     def unassign(self, var, assignment):
@@ -75,6 +127,11 @@ class TimetablingCSP(csp.CSP):
         DO NOT call this if you are changing a variable to a new value;
         just call assign for that."""
         if var in assignment:
+            self._index_assignment(assignment)
+            self.room_occupancy.remove(var, assignment[var])
+            self._num_indexed -= 1
+            if self.kernel is not None:
+                self.kernel.clear_value(var)
             del assignment[var]
             self.num_unassigns += 1
 
@@ -83,18 +140,57 @@ class TimetablingCSP(csp.CSP):
         """Make sure we can prune values from domains. (We want to pay
         for this only if we use it.)"""
         if self.curr_domains is None:
-            self.curr_domains = {v: list(self.domains[v]) for v in self.variables}
+            self.curr_domains = {v: self.domains[v].copy() if isinstance(self.domains[v], ProductDomain)
+                                 else TrailDomain(self.domains[v]) for v in self.variables}
+            self.trail = []
 
-    def suppose(self, var, value):
-        """Start accumulating inferences from assuming var=value."""
+    def checkpoint(self):
+        """A mark to restore() back to: every prune / suppose after it is undone"""
         self.support_pruning()
-        removals = [(var, a) for a in self.curr_domains[var] if a != value]
-        self.curr_domains[var] = [value]
-        return removals
+        return len(self.trail)
+
+    def suppose(self, var, value):
+        """Start accumulating inferences from assuming var=value; returns the checkpoint before it."""
+        mark = self.checkpoint()
+        dom = self.curr_domains[var]
+        if isinstance(dom, ProductDomain):
+            # restore() undoes the fix through ProductDomain.append
+            self.trail.append((var, dom.fix(value)))
+        else:
+            self.trail.append((var, dom.size))
+            dom.fix(value)
+        return mark
+
+    def prune(self, var, value, removals):
+        """Rule out var=value (recorded on the trail; removals is the checkpoint of the current supposition)."""
+        dom = self.curr_domains[var]
+        if isinstance(dom, ProductDomain):
+            dom.remove(value)
+            self.trail.append((var, value))
+        else:
+            self.trail.append((var, dom.size))
+            dom.remove(value)
+
+    def restore(self, removals):
+        """Undo a supposition and all inferences from it: pop the trail back to the checkpoint removals."""
+        trail = self.trail
+        domains = self.curr_domains
+        while len(trail) > removals:
+            var, undo = trail.pop()
+            dom = domains[var]
+            if isinstance(dom, ProductDomain):
+                dom.append(undo)
+            else:
+                dom.size = undo
 
     def choices(self, var):
         """Return all values for var that aren't currently ruled out."""
         # This is tricky, we need to return a list of tuples with a value for each variable
         dom = (self.curr_domains or self.domains)
+        if isinstance(dom[var], ProductDomain):
+            # iterating a ProductDomain works on a snapshot, so it doesn't need copying
+            return dom[var]
+        if isinstance(dom[var], TrailDomain):
+            return dom[var].live_values()
         poss_vals = [i for i in dom[var]]
         return poss_vals
@@ -0,0 +1,83 @@
+# trail_domain.py: a domain list that can be pruned and restored without allocating, for the trail-based undo in
+#                  TimetablingCSP.
+#
+#                  The values are kept in one list with the live ones first: values[:size]. Pruning a value swaps it
+#                  with the last live value and shrinks size, and fixing the domain to one value swaps it to the front
+#                  and sets size to 1. Either way the pruned values stay in the list just past the live ones, so undoing
+#                  only needs the old size back: the trail holds (var, old size) entries and restoring pops them,
+#                  last first.
+
+# -------------------------------------------------------------------------------------
+class TrailDomain():
+    """A domain that prunes by swapping values out of the live prefix
+        len(d), value in d, d[i], d[a:b]    as for the list of live values
+        iter(d)                 the live values, last first (so values can be pruned while iterating)
+        d.remove(value)         prune a value (ValueError if it isn't live)
+        d.fix(value)            reduce the domain to value
+        d.size                  the number of live values; set it back to undo remove() / fix()
+    """
+    __slots__ = ('values', 'position', 'size')
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.position = {v: i for i, v in enumerate(self.values)}
+        self.size = len(self.values)
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __contains__(self, value):
+        i = self.position.get(value)
+        return i is not None and i < self.size
+
+    def __iter__(self):
+        # from the end down: a value pruned while iterating is swapped with one that has already been seen
+        values = self.values
+        for i in range(self.size - 1, -1, -1):
+            yield values[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.values[:self.size][index]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('TrailDomain index out of range')
+        return self.values[index]
+
+    def live_values(self):
+        """A list of the live values"""
+        return self.values[:self.size]
+
+    def _swap(self, i, j):
+        values = self.values
+        a = values[i]
+        b = values[j]
+        values[i] = b
+        values[j] = a
+        self.position[a] = j
+        self.position[b] = i
+
+    def remove(self, value):
+        i = self.position.get(value)
+        if i is None or i >= self.size:
+            raise ValueError('%r is not in the domain' % (value,))
+        self.size -= 1
+        if i != self.size:
+            self._swap(i, self.size)
+
+    def fix(self, value):
+        i = self.position.get(value)
+        if i is None or i >= self.size:
+            # not a live value: the domain becomes empty
+            self.size = 0
+            return
+        if i != 0:
+            self._swap(i, 0)
+        self.size = 1
+
+    def __repr__(self):
+        return 'TrailDomain(%r)' % self.live_values()
@@ -5,8 +5,13 @@
 # - to verify a solution of course
 # - to compute a score for each solution, under the assumption that it might be used as a fitness function for EA/GA
 
+# import standard packages
+import numpy as np
+
 # import our code (in the same directory as this file)
-from read_itc_data_file import read_itc_data_file
+from compact_problem import UNASSIGNED
+from itc_instance import get_instance, get_problem
+from timeslot_csp import itc_day_period
 
 HARD_FAIL_SCORE = 1e6
 HARD_CONSTRAINT_PENALTY = 1
@@ -17,15 +22,15 @@ def verify_solution(file_name, solution, verbose=False):
     """ Verifies / scores a solution to an Timetabling CSP problem
         Note: if the 'solution' is not complete (not all variables are assigned) the returned score will be HARD_FAIL_SCORE
 
-    :param file_name:  path to the ITC data file that specifies the problem
+    :param file_name:  path to the ITC data file that specifies the problem, or its ITCInstance
     :param solution:  a solution to the problem that is to be verified / scored
     :param verbose:  flag indicating you want to see a bunch of info printed out
     :return:  verified (bool): True indicates that the solution meets all contraints
               num_fails (int): The number of failures in the solution
     """
 
-    # Read in the ITC data file
-    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = read_itc_data_file(file_name)
+    # Get the ITC data (the file is only parsed the first time, see itc_instance.py)
+    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = get_instance(file_name).as_tuple()
 
     # Need to verify the provide solution based on the input data. These are done and mostly tested:
     # - check that all courses have an assignment
@@ -165,6 +170,84 @@ def verify_solution(file_name, solution, verbose=False):
 def score_solution(file_name, solution, verbose=False):
     passed, score = verify_solution(file_name, solution, verbose)
     return score
+
+# -------------------------------------------------------------------------------------
+def verify_lecture_solution(file_name, solution, verbose=False):
+    """ Verifies a lecture-level solution (see lectures.py) against the ITC hard constraints: every lecture of every
+        course is assigned, no room-timeslot is used twice, and the lectures of one course, one
+        curriculum or one teacher are at different timeslots, none of them at a period the course is unavailable (the
+        TimeSlots are the ITC periods, see timeslot_csp.define_itc_timeslots)
+        Note: if the 'solution' is not complete the returned score will be HARD_FAIL_SCORE
+
+    :param file_name:  path to the ITC data file that specifies the problem, or its ITCInstance
+    :param solution:  {Lecture: (room, TimeSlot)}
+    :param verbose:  flag indicating you want to see a bunch of info printed out
+    :return:  verified (bool): True indicates that the solution meets all contraints
+              score (float): the (negative) penalty score of the solution
+    """
+    courses, rooms, num_days, periods_per_day, unavail_constraints, curricula = get_instance(file_name).as_tuple()
+
+    # the (room, TimeSlot) of each lecture, by course
+    by_course = {}
+    for lecture, value in solution.items():
+        by_course.setdefault(lecture.course, []).append(value)
+
+    if verbose:
+        print('checking for complete assignment ...',)
+    if any(len(by_course.get(c, ())) != courses[c][1] for c in courses) or len(by_course) != len(courses):
+        if verbose:
+            print('HARD FAIL: not all lectures are assigned ...', )
+        return False, HARD_FAIL_SCORE
+
+    def report(message, num_fails):
+        if verbose:
+            print(message,)
+            if num_fails > 0:
+                print('FAIL(', num_fails, ')')
+            else:
+                print('PASS')
+        return num_fails
+
+    # room capacity is soft in ITC-2007: report the students over capacity, they aren't hard fails
+    if verbose:
+        over = sum(max(0, courses[c][3] - rooms[room]) for c, values in by_course.items() for room, ts in values)
+        print('room capacity vs course enrollment (soft): %d students over' % over)
+
+    total_fails = 0
+
+    def overlaps(values):
+        # the number of pairs of values at overlapping timeslots
+        return sum(1 for i in range(len(values)) for j in range(i + 1, len(values))
+                   if values[i][1].overlaps(values[j][1]))
+
+    by_room = {}
+    for values in by_course.values():
+        for value in values:
+            by_room.setdefault(value[0], []).append(value)
+    num_fails = sum(overlaps(values) for values in by_room.values())
+    total_fails += report('checking that no room-timeslot is multiply occupied ...', num_fails)
+
+    num_fails = sum(overlaps(values) for values in by_course.values())
+    total_fails += report('checking that the lectures of a course are at different timeslots ...', num_fails)
+
+    num_fails = sum(overlaps([v for c in members for v in by_course[c]]) for members in curricula.values())
+    total_fails += report('checking curricula constraints ...', num_fails)
+
+    by_teacher = {}
+    for c in courses:
+        by_teacher.setdefault(courses[c][0], []).extend(by_course[c])
+    num_fails = sum(overlaps(values) for values in by_teacher.values())
+    total_fails += report('checking teacher constraints ...', num_fails)
+
+    # unavailability: the lectures are at ITC periods (see timeslot_csp.itc_timeslot)
+    num_fails = 0
+    for c, values in by_course.items():
+        unavailable = set(tuple(x) for x in unavail_constraints.get(c, ()))
+        num_fails += sum(1 for room, ts in values if itc_day_period(ts) in unavailable)
+    total_fails += report('checking unavailability constraints ...', num_fails)
+
+    total_score = -HARD_CONSTRAINT_PENALTY * total_fails
+    return total_score == 0, total_score
     
 def fitness_function (courses, rooms, curricula, solution, verbose=False):
     """ Verifies / scores a solution to an Timetabling CSP problem
@@ -240,4 +323,162 @@ def fitness_function (courses, rooms, curricula, solution, verbose=False):
 #                times.add(time)
         
      
-    return total_score
\ No newline at end of file
+    return total_score
+
+# -------------------------------------------------------------------------------------
+def score_encoded_components(problem, assignment):
+    """ Counts the constraint failures of an integer-encoded assignment (see compact_problem.py)
+
+    :param problem:  the CompactProblem the assignment is encoded against (or its ITCInstance / file name)
+    :param assignment:  dict of {course: int value} or a sequence of int values indexed by course id
+    :return:  None if the assignment is not complete, otherwise a tuple of
+              capacity_fails (int): courses assigned to a room that is too small
+              room_slot_fails (int): extra courses in an already occupied room-timeslot
+              curricula_fails (int): curriculum course pairs in the same room at overlapping timeslots
+    """
+    problem = get_problem(problem)
+    if isinstance(assignment, dict) and len(assignment) != problem.n_courses:
+        return None
+    values = problem.assignment_array(assignment)
+    if len(values) != problem.n_courses or (values == UNASSIGNED).any():
+        return None
+
+    room_ids = values // problem.n_slots
+    slot_ids = values % problem.n_slots
+
+    capacity_fails = int(np.count_nonzero(problem.enrollment > problem.capacity[room_ids]))
+    room_slot_fails = problem.n_courses - len(np.unique(values))
+
+    pair_i, pair_j = problem.curriculum_pairs
+    clash = (room_ids[pair_i] == room_ids[pair_j]) & problem.slot_overlap[slot_ids[pair_i], slot_ids[pair_j]]
+    curricula_fails = int(np.count_nonzero(clash))
+
+    return capacity_fails, room_slot_fails, curricula_fails
+
+# -------------------------------------------------------------------------------------
+def verify_encoded_solution(problem, assignment, verbose=False):
+    """ Verifies / scores an integer-encoded solution, gives the same result as verify_solution() gives for the
+        decoded solution but without re-reading the ITC data file
+
+    :param problem:  the CompactProblem the assignment is encoded against (or its ITCInstance / file name)
+    :param assignment:  dict of {course: int value} or a sequence of int values indexed by course id
+    :param verbose:  flag indicating you want to see a bunch of info printed out
+    :return:  verified (bool): True indicates that the solution meets all contraints
+              score (float): the (negative) penalty score of the solution
+    """
+    fails = score_encoded_components(problem, assignment)
+    if fails is None:
+        if verbose:
+            print('HARD FAIL: not all variables are assigned ...', )
+        return False, HARD_FAIL_SCORE
+
+    capacity_fails, room_slot_fails, curricula_fails = fails
+    if verbose:
+        checks = [('checking room capacity vs course enrollment ...', capacity_fails),
+                  ('checking that no room-timeslot is multiply occupied ...', room_slot_fails),
+                  ('checking curricula constraints ...', curricula_fails)]
+        for message, num_fails in checks:
+            print(message,)
+            if num_fails > 0:
+                print('FAIL(', num_fails, ')')
+            else:
+                print('PASS')
+
+    total_score = 0
+    total_score -= HARD_CONSTRAINT_PENALTY * (capacity_fails + room_slot_fails)
+    if curricula_fails > 0:
+        total_score -= SOFT_CONSTRAINT_PENALTY * curricula_fails
+    return total_score == 0, total_score
+
+def fitness_function_encoded(problem, solution):
+    """ Integer-encoded version of fitness_function(), see verify_encoded_solution() """
+    passed, score = verify_encoded_solution(problem, solution)
+    return score
+
+# -------------------------------------------------------------------------------------
+def population_components(problem, population):
+    """ Vectorized score_encoded_components() for a whole population at once (see population_fitness for the
+        arguments)
+
+    :return:  int arrays capacity_fails, room_slot_fails, curricula_fails with one count per individual, and a bool
+              array incomplete (True for the individuals that don't assign every course; their counts mean nothing)
+    """
+    problem = get_problem(problem)
+    if isinstance(population, np.ndarray):
+        values = population.astype(np.int64, copy=False)
+    else:
+        values = np.array([problem.assignment_array(x) for x in population], dtype=np.int64)
+    values = values.reshape(-1, problem.n_courses)
+
+    room_ids = values // problem.n_slots
+    slot_ids = values % problem.n_slots
+
+    # capacity failures
+    capacity_fails = np.count_nonzero(problem.enrollment > problem.capacity[room_ids], axis=1)
+
+    # multiply occupied room-timeslots: every repeat of a value in the sorted row is one extra course
+    sorted_values = np.sort(values, axis=1)
+    room_slot_fails = np.count_nonzero(sorted_values[:, 1:] == sorted_values[:, :-1], axis=1)
+
+    # curriculum pairs in the same room at overlapping timeslots
+    pair_i, pair_j = problem.curriculum_pairs
+    clash = ((room_ids[:, pair_i] == room_ids[:, pair_j]) &
+             problem.slot_overlap[slot_ids[:, pair_i], slot_ids[:, pair_j]])
+    curricula_fails = np.count_nonzero(clash, axis=1)
+
+    incomplete = (values == UNASSIGNED).any(axis=1)
+    if not isinstance(population, np.ndarray):
+        incomplete |= np.array([isinstance(x, dict) and len(x) != problem.n_courses for x in population], dtype=bool)
+    return capacity_fails, room_slot_fails, curricula_fails, incomplete
+
+def population_fitness(problem, population):
+    """ Vectorized fitness_function_encoded() for a whole population at once
+
+    :param problem:  the CompactProblem the individuals are encoded against (or its ITCInstance / file name)
+    :param population:  a 2-D int array (individuals x courses, columns in course id order), or a list of individuals
+                        in any form accepted by problem.assignment_array()
+    :return:  a float array with the score of each individual
+    """
+    capacity_fails, room_slot_fails, curricula_fails, incomplete = population_components(problem, population)
+    scores = 0.0 - (HARD_CONSTRAINT_PENALTY * (capacity_fails + room_slot_fails) +
+                    SOFT_CONSTRAINT_PENALTY * curricula_fails)
+
+    # individuals that are not complete get the hard fail score, like fitness_function()
+    scores[incomplete] = HARD_FAIL_SCORE
+    return scores
+
+# -------------------------------------------------------------------------------------
+def population_csp_conflicts(problem, population):
+    """ The hard constraints of the timetabling CSP (the ones the backtracking and min-conflicts solvers satisfy) for
+        a whole population of encoded assignments: the number of course pairs whose time slots overlap while they
+        are in the same room or share a curriculum, plus the number of courses given a value outside their domain
+        (a room that is too small or a blocked time slot). The fitness functions above only count some of these.
+
+    :param problem:  the CompactProblem the individuals are encoded against (or its ITCInstance / file name)
+    :param population:  a 2-D int array (individuals x courses), or a list of individuals (see population_fitness)
+    :return:  an int array with the number of violations of each individual (incomplete individuals count every
+              unassigned course as a violation)
+    """
+    problem = get_problem(problem)
+    if isinstance(population, np.ndarray):
+        values = population.astype(np.int64, copy=False)
+    else:
+        values = np.array([problem.assignment_array(x) for x in population], dtype=np.int64)
+    values = values.reshape(-1, problem.n_courses)
+    unassigned = values == UNASSIGNED
+    values = np.where(unassigned, 0, values)
+
+    room_ids = values // problem.n_slots
+    slot_ids = values % problem.n_slots
+    pair_i, pair_j, shares = problem.course_pairs()
+    clash = (problem.slot_overlap[slot_ids[:, pair_i], slot_ids[:, pair_j]] &
+             ((room_ids[:, pair_i] == room_ids[:, pair_j]) | shares) &
+             ~unassigned[:, pair_i] & ~unassigned[:, pair_j])
+    outside = ~problem.domain_mask[np.arange(problem.n_courses), values] & ~unassigned
+    return (np.count_nonzero(clash, axis=1) + np.count_nonzero(outside, axis=1) +
+            np.count_nonzero(unassigned, axis=1))
+
+def count_csp_conflicts(problem, assignment):
+    """ population_csp_conflicts() for one encoded assignment (dict or array): 0 if it is a valid timetable """
+    problem = get_problem(problem)
+    return int(population_csp_conflicts(problem, [problem.assignment_array(assignment)])[0])